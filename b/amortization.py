@@ -0,0 +1,136 @@
+# amortization.py - Principal and interest schedules for loans
+#
+# A loan is amortised as:
+#   - principal: LoanDetails.total_amount
+#   - installment: LoanDetails.monthly_payment
+#   - rate: LoanDetails.interest_rate_percent per year, compounded monthly
+#   - term: LoanDetails.total_installments
+# Balances come from the closed form
+#   B_k = P(1+r)^k - M((1+r)^k - 1)/r
+# evaluated for every period at once, so a 30-year loan costs the same as a
+# one-year one. If the installment clears the loan early, the schedule stops
+# there with a smaller last installment. If it does not clear the loan by the
+# last period, the last installment carries the remainder.
+#
+# Schedules depend only on the loan terms, so they are cached per loan and
+# rebuilt when the terms change. Installments paid only select how much of
+# the cached schedule is already behind the borrower.
+
+from collections import OrderedDict
+import threading
+import logging
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# loan_id -> (terms, schedule); least recently used first
+_schedules = OrderedDict()
+_schedules_lock = threading.Lock()
+
+
+def amortization_schedule(principal, monthly_payment, installments, annual_rate_percent=0.0):
+    """
+    Per-period arrays for a loan: payment, interest, principal and the
+    balance after each period. All arrays have one entry per period until
+    the loan is cleared.
+    """
+    installments = int(installments)
+    if installments < 1 or principal <= 0:
+        empty = np.zeros(0)
+        return {'payment': empty, 'interest': empty, 'principal': empty, 'balance': empty}
+
+    rate = (annual_rate_percent or 0.0) / 1200.0
+    periods = np.arange(1, installments + 1, dtype=np.float64)
+    if rate > 0:
+        growth = np.power(1.0 + rate, periods)
+        balance = principal * growth - monthly_payment * (growth - 1.0) / rate
+    else:
+        balance = principal - monthly_payment * periods
+
+    # Stop at the first period that clears the loan
+    cleared = np.flatnonzero(balance <= 0.005)
+    if cleared.size:
+        balance = balance[:cleared[0] + 1]
+    opening = np.concatenate(([float(principal)], balance[:-1]))
+    interest = opening * rate
+    payment = np.full(balance.size, float(monthly_payment))
+    # Last period: pay exactly what is left, whether that is less (early payoff) or more (shortfall)
+    payment[-1] = opening[-1] + interest[-1]
+    balance[-1] = 0.0
+    return {
+        'payment': payment,
+        'interest': interest,
+        'principal': payment - interest,
+        'balance': balance
+    }
+
+
+def _terms(loan):
+    return (loan.total_amount, loan.monthly_payment, loan.total_installments, loan.interest_rate_percent or 0.0)
+
+
+def loan_schedule(loan):
+    """Cached schedule for a LoanDetails row; rebuilt when the loan terms change"""
+    terms = _terms(loan)
+    with _schedules_lock:
+        cached = _schedules.get(loan.id)
+        if cached and cached[0] == terms:
+            _schedules.move_to_end(loan.id)
+            return cached[1]
+
+    schedule = amortization_schedule(*terms)
+    with _schedules_lock:
+        _schedules[loan.id] = (terms, schedule)
+        _schedules.move_to_end(loan.id)
+        while len(_schedules) > Config.AMORTIZATION_CACHE_SIZE:
+            _schedules.popitem(last=False)
+    logger.debug(f"[AMORTIZATION] Built {schedule['balance'].size}-period schedule for loan {loan.id}")
+    return schedule
+
+
+def schedule_position(loan, schedule=None):
+    """Principal outstanding and interest paid and still due, given installments paid so far"""
+    schedule = schedule if schedule is not None else loan_schedule(loan)
+    periods = schedule['balance'].size
+    paid = min(int(loan.installments_paid or 0), periods)
+    outstanding = float(schedule['balance'][paid - 1]) if paid else float(loan.total_amount)
+    return {
+        'installments_paid': paid,
+        'installments_left': periods - paid,
+        'outstanding_principal': round(outstanding, 2),
+        'interest_paid': round(float(schedule['interest'][:paid].sum()), 2),
+        'interest_remaining': round(float(schedule['interest'][paid:].sum()), 2),
+        'total_interest': round(float(schedule['interest'].sum()), 2),
+        'total_payable': round(float(schedule['payment'].sum()), 2)
+    }
+
+
+def schedule_rows(loan, next_due_date=None, schedule=None):
+    """
+    The schedule as JSON-ready rows. With `next_due_date` (the bill's due
+    date), each row also gets its due date: the first unpaid period falls on
+    it and the others are whole months before or after.
+    """
+    schedule = schedule if schedule is not None else loan_schedule(loan)
+    paid = int(loan.installments_paid or 0)
+    columns = [np.round(schedule[name], 2).tolist() for name in ('payment', 'interest', 'principal', 'balance')]
+    rows = []
+    for index, (payment, interest, principal, balance) in enumerate(zip(*columns)):
+        row = {
+            'period': index + 1,
+            'payment': payment,
+            'interest': interest,
+            'principal': principal,
+            'balance': balance,
+            'paid': index < paid
+        }
+        if next_due_date:
+            row['due_date'] = (next_due_date + relativedelta(months=index - paid)).date().isoformat()
+        rows.append(row)
+    return rows
@@ -11,8 +11,13 @@ from bills import bills_bp
 from reminders import reminders_bp
 from receipts import receipts_bp
 from loans import loans_bp
+from voice_bot import voice_bot_bp
 from scheduler import start_scheduler
 from local_storage_service import init_storage
+from provider_transport import start_warmup
+from provider_health import health_snapshot
+from voice_call_scheduler import voice_calls
+from migrations import run_migrations
 import os
 import logging
 from datetime import datetime
@@ -56,7 +61,7 @@ def create_app():
     db.init_app(app)
     
     logger.debug("[APP INIT] Initializing CORS")
-    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=['X-Next-Cursor', 'ETag', 'Idempotent-Replayed'])
     
     logger.debug("[APP INIT] Initializing JWT Manager")
     JWTManager(app)
@@ -77,6 +82,7 @@ def create_app():
         (reminders_bp, '/api/reminders', 'reminders'),
         (receipts_bp, '/api/receipts', 'receipts'),
         (loans_bp, '/api', 'loans'),
+        (voice_bot_bp, '/api/voice-bot', 'voice_bot'),
     ]
     
     for blueprint, prefix, name in blueprints:
@@ -87,7 +93,12 @@ def create_app():
     @app.route('/api/health', methods=['GET'])
     def health_check():
         logger.debug("[HEALTH CHECK] Health check endpoint called")
-        return jsonify({'status': 'healthy', 'message': 'Bills Reminder API is running'}), 200
+        return jsonify({
+            'status': 'healthy',
+            'message': 'Bills Reminder API is running',
+            'providers': health_snapshot(),
+            'voice_calls': voice_calls.snapshot()
+        }), 200
     
     # Error handlers
     @app.errorhandler(404)
@@ -132,6 +143,7 @@ if __name__ == '__main__':
             
             db.create_all()
             logger.info("[MAIN] Database tables created successfully")
+            run_migrations(db.engine)
             
             # Log table information
             tables = db.metadata.tables.keys()
@@ -149,6 +161,10 @@ if __name__ == '__main__':
         logger.error(f"[MAIN ERROR] Failed to start scheduler: {str(e)}", exc_info=True)
         raise
     
+    if Config.PROVIDER_WARM_ON_START:
+        logger.info("[MAIN] Warming provider connections in the background")
+        start_warmup()
+    
     logger.info("[MAIN] Starting Flask development server")
     logger.info(f"[MAIN] Server configuration - Debug: True, Port: 5000, Reloader: False")
     logger.info("[MAIN] Application ready to receive requests")
@@ -0,0 +1,197 @@
+# audio_cache.py - Content-addressed on-disk cache for generated TTS audio
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+
+from config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def audio_cache_key(text, voice_id, model_id, voice_settings, output_format='mp3'):
+    """sha256 of everything that determines the synthesised audio"""
+    payload = json.dumps({
+        'text': text,
+        'voice_id': voice_id,
+        'model_id': model_id,
+        'voice_settings': voice_settings,
+        'format': output_format,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AudioCache:
+    """
+    Audio files stored under their content key, with a sqlite index holding
+    size and last access time. When the total size passes `max_bytes` the
+    least recently used files are deleted.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def _connection(self):
+        # Caller holds self._lock
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._db = sqlite3.connect(os.path.join(self.directory, 'index.db'), check_same_thread=False)
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' key TEXT PRIMARY KEY,'
+                ' path TEXT NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' last_access REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access)')
+            self._db.commit()
+            logger.info(f"[AUDIO CACHE] Using {os.path.abspath(self.directory)} (limit {self.max_bytes} bytes)")
+        return self._db
+
+    def path_for(self, key, suffix='.mp3'):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def get(self, key):
+        """
+        Path of the cached file for `key`, or None. Once this returns, a
+        concurrent put() may evict the file; use open() to read it later.
+        """
+        return self._lookup(key, lambda path: path if os.path.exists(path) else None)
+
+    def open(self, key):
+        """
+        The cached file for `key` opened for reading, or None. It is opened
+        while the lock is held, so eviction cannot remove it first, and an
+        open file stays readable after it is removed.
+        """
+        def opener(path):
+            try:
+                return open(path, 'rb')
+            except FileNotFoundError:
+                return None
+        return self._lookup(key, opener)
+
+    def _lookup(self, key, resolve):
+        """resolve(path) of the entry for `key` under the lock; a None result counts as a miss"""
+        with self._lock:
+            db = self._connection()
+            row = db.execute('SELECT path FROM entries WHERE key = ?', (key,)).fetchone()
+            found = resolve(row[0]) if row else None
+            if found is not None:
+                db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (time.time(), key))
+                db.commit()
+                self.stats['hits'] += 1
+                return found
+            if row:
+                # The file was removed behind our back
+                db.execute('DELETE FROM entries WHERE key = ?', (key,))
+                db.commit()
+            self.stats['misses'] += 1
+            return None
+
+    def writer(self, key, suffix='.mp3'):
+        """Incremental writer for audio that arrives in chunks (e.g. a TTS stream)"""
+        return AudioCacheWriter(self, key, suffix)
+
+    def put(self, key, chunks, suffix='.mp3'):
+        """Store audio given as bytes or an iterable of byte chunks. Returns the final path."""
+        if isinstance(chunks, (bytes, bytearray)):
+            chunks = [chunks]
+
+        writer = self.writer(key, suffix)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def _index(self, key, path, size):
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute(
+                'INSERT OR REPLACE INTO entries (key, path, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, path, size, now, now)
+            )
+            db.commit()
+            self.stats['stores'] += 1
+            self._evict(db)
+        logger.debug(f"[AUDIO CACHE] Stored {key[:12]} ({size} bytes)")
+
+    def _evict(self, db):
+        # Caller holds self._lock
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, path, size in db.execute('SELECT key, path, size FROM entries ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            evicted.append((key,))
+            total -= size
+        db.executemany('DELETE FROM entries WHERE key = ?', evicted)
+        db.commit()
+        self.stats['evictions'] += len(evicted)
+        logger.info(f"[AUDIO CACHE] Evicted {len(evicted)} files, {total} bytes remain")
+
+    def snapshot(self):
+        with self._lock:
+            db = self._connection()
+            count, total = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'files': count, 'bytes': total, 'max_bytes': self.max_bytes, **self.stats}
+
+
+class AudioCacheWriter:
+    """
+    Writes under a temporary name and renames into place on commit(), so
+    readers never see a partial file. abort() discards what was written.
+    """
+
+    def __init__(self, cache, key, suffix):
+        self.cache = cache
+        self.key = key
+        self.path = cache.path_for(key, suffix)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._temp_path = f"{self.path}.{uuid.uuid4().hex}.part"
+        self._file = open(self._temp_path, 'wb')
+        self.size = 0
+
+    def write(self, chunk):
+        if chunk:
+            self._file.write(chunk)
+            self.size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+        self.cache._index(self.key, self.path, self.size)
+        return self.path
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+audio_cache = AudioCache(
+    directory=Config.AUDIO_CACHE_DIR,
+    max_bytes=int(Config.AUDIO_CACHE_MAX_MB * 1024 * 1024)
+)
@@ -0,0 +1,304 @@
+# batch_operations.py - Bulk create, update and payment operations for back-office work
+#
+# Each operation validates every item first, then applies the valid ones with
+# bulk statements in a single transaction. Invalid items do not stop the
+# batch; each item gets its own entry in the results:
+#   {"index": i, "id": ..., "status": "created" | "updated" | "paid" | "already_paid" | "error", "error": ...}
+# The ORM per-instance path (model __init__ logging, after_insert events) is
+# bypassed on purpose, so a batch of thousands costs a handful of statements.
+
+from contextlib import contextmanager
+from datetime import datetime
+import logging
+import uuid
+
+from sqlalchemy import func, insert, select, update
+
+from config import Config
+from models import db, Bill, LoanDetails, Payment
+from dashboard_summary import invalidate_summary
+from fee_calculation_service import FEE_CONFIG_DEFAULTS, parse_fee_config
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+BILL_REQUIRED_FIELDS = ('name', 'amount', 'due_date', 'account_name', 'loan_details')
+LOAN_REQUIRED_FIELDS = ('total_amount', 'monthly_payment', 'total_installments')
+BILL_UPDATE_FIELDS = ('name', 'account_name', 'amount', 'due_date', 'category', 'frequency', 'notes')
+REMINDER_PREFERENCE_FIELDS = ('enable_whatsapp', 'enable_call', 'enable_sms', 'enable_local_notification')
+
+
+def check_batch(items, name):
+    """Error message when `items` is not a usable batch, else None"""
+    if not isinstance(items, list) or not items:
+        return f'{name} must be a non-empty list'
+    if len(items) > Config.BATCH_MAX_ITEMS:
+        return f'At most {Config.BATCH_MAX_ITEMS} {name} per request'
+    return None
+
+
+def _error(index, message, item_id=None):
+    return {'index': index, 'id': item_id, 'status': 'error', 'error': message}
+
+
+def _parse_due_date(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _number(value, name, minimum=0):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f'{name} must be a number')
+    if value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    return value
+
+
+def _summarize(results):
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    return summary
+
+
+@contextmanager
+def _transaction(operation, user_id):
+    """One transaction for the batch; drops the user's cached summary after committing"""
+    try:
+        yield
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.error(f"[BATCH {operation} ERROR] Transaction rolled back", exc_info=True)
+        raise
+    invalidate_summary(user_id)
+
+
+def _apply(operation, user_id, statements):
+    """Run (statement, rows) executemany pairs in one transaction; empty row lists are skipped"""
+    with _transaction(operation, user_id):
+        for statement, rows in statements:
+            if rows:
+                db.session.execute(statement, rows)
+
+
+def create_bills(user_id, items):
+    """Create bills with their loan details, like POST /api/bills for each item"""
+    now = datetime.utcnow()
+    results, bill_rows, loan_rows = [], [], []
+
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict) or any(field not in item for field in BILL_REQUIRED_FIELDS):
+                raise ValueError('Missing required bill or loan fields')
+            loan = item['loan_details']
+            if not isinstance(loan, dict) or any(field not in loan for field in LOAN_REQUIRED_FIELDS):
+                raise ValueError('Missing required loan detail fields')
+            bill_id = str(uuid.uuid4())
+            bill_rows.append({
+                'id': bill_id,
+                'user_id': user_id,
+                'account_name': item['account_name'],
+                'name': item['name'],
+                'amount': _number(item['amount'], 'amount'),
+                'due_date': _parse_due_date(item['due_date']),
+                'category': 'loan',
+                'frequency': item.get('frequency', 'monthly'),
+                'notes': item.get('notes'),
+                'is_paid': False,
+                'created_at': now,
+                'updated_at': now,
+            })
+            loan_rows.append({
+                'id': str(uuid.uuid4()),
+                'bill_id': bill_id,
+                'total_amount': _number(loan['total_amount'], 'total_amount'),
+                'monthly_payment': _number(loan['monthly_payment'], 'monthly_payment'),
+                'total_installments': int(_number(loan['total_installments'], 'total_installments', 1)),
+                'installments_paid': int(_number(loan.get('installments_paid', 0), 'installments_paid')),
+                'interest_rate_percent': _number(loan.get('interest_rate_percent', 0), 'interest_rate_percent'),
+                **FEE_CONFIG_DEFAULTS,
+                **parse_fee_config(loan),
+                'is_active': True,
+                'updated_at': now,
+            })
+            results.append({'index': index, 'id': bill_id, 'status': 'created'})
+        except (ValueError, TypeError, AttributeError) as e:
+            results.append(_error(index, str(e)))
+
+    _apply('CREATE', user_id, [(insert(Bill), bill_rows), (insert(LoanDetails), loan_rows)])
+    logger.info(f"[BATCH CREATE] User {user_id}: {len(bill_rows)} bills created, {len(items) - len(bill_rows)} rejected")
+    return results
+
+
+def _item_id(item, key):
+    """The id under `key` when `item` is an object with a string id, else None"""
+    value = item.get(key) if isinstance(item, dict) else item
+    return value if isinstance(value, str) else None
+
+
+def _owned_bills(user_id, bill_ids, *columns):
+    """{bill_id: row} for the ids that exist and belong to the user"""
+    rows = db.session.execute(
+        select(Bill.id, *columns).where(Bill.user_id == user_id, Bill.id.in_({i for i in bill_ids if i}))
+    ).all()
+    return {row.id: row for row in rows}
+
+
+def update_bills(user_id, items):
+    """Apply partial updates; each item is {"id": ..., <fields of PUT /api/bills/<id>>}"""
+    now = datetime.utcnow()
+    owned = _owned_bills(user_id, [_item_id(item, 'id') for item in items])
+    results, rows = [], []
+
+    for index, item in enumerate(items):
+        bill_id = _item_id(item, 'id')
+        if bill_id not in owned:
+            results.append(_error(index, 'Bill not found', bill_id))
+            continue
+        try:
+            values = {field: item[field] for field in BILL_UPDATE_FIELDS if field in item}
+            if 'amount' in values:
+                _number(values['amount'], 'amount')
+            if 'due_date' in values:
+                values['due_date'] = _parse_due_date(values['due_date'])
+            prefs = item.get('reminder_preferences') or {}
+            values.update({field: bool(prefs[field]) for field in REMINDER_PREFERENCE_FIELDS if field in prefs})
+        except (ValueError, TypeError, AttributeError) as e:
+            results.append(_error(index, str(e), bill_id))
+            continue
+        if not values:
+            results.append(_error(index, 'No fields to update', bill_id))
+            continue
+        rows.append({'id': bill_id, 'updated_at': now, **values})
+        results.append({'index': index, 'id': bill_id, 'status': 'updated'})
+
+    # ORM bulk UPDATE by primary key; rows with different keys are grouped into separate executemany calls
+    _apply('UPDATE', user_id, [(update(Bill), rows)])
+    logger.info(f"[BATCH UPDATE] User {user_id}: {len(rows)} bills updated, {len(items) - len(rows)} rejected")
+    return results
+
+
+def mark_bills_paid(user_id, bill_ids, payment_method='manual'):
+    """
+    Mark bills paid and record a payment of the bill amount for each. Bills
+    that are already paid are reported as such and get no second payment.
+    """
+    now = datetime.utcnow()
+    bill_ids = [_item_id(bill_id, None) for bill_id in bill_ids]
+    owned = _owned_bills(user_id, bill_ids, Bill.amount, Bill.is_paid)
+    results, paid_ids, payment_rows, seen = [], [], [], set()
+
+    for index, bill_id in enumerate(bill_ids):
+        bill = owned.get(bill_id)
+        if bill is None:
+            results.append(_error(index, 'Bill not found', bill_id))
+        elif bill.is_paid or bill_id in seen:
+            results.append({'index': index, 'id': bill_id, 'status': 'already_paid'})
+        else:
+            seen.add(bill_id)
+            paid_ids.append(bill_id)
+            payment_rows.append({
+                'id': str(uuid.uuid4()),
+                'bill_id': bill_id,
+                'amount': bill.amount,
+                'payment_date': now,
+                'payment_method': payment_method,
+                'created_at': now,
+                'updated_at': now,
+            })
+            results.append({'index': index, 'id': bill_id, 'status': 'paid', 'payment_id': payment_rows[-1]['id']})
+
+    if paid_ids:
+        with _transaction('PAY', user_id):
+            # Only bills still unpaid at write time flip, so a concurrent request cannot pay one twice
+            flipped = set(db.session.execute(
+                update(Bill)
+                .where(Bill.id.in_(paid_ids), Bill.is_paid == False)
+                .values(is_paid=True, updated_at=now)
+                .returning(Bill.id),
+                execution_options={'synchronize_session': False}
+            ).scalars())
+            payment_rows = [row for row in payment_rows if row['bill_id'] in flipped]
+            if payment_rows:
+                db.session.execute(insert(Payment), payment_rows)
+        for result in results:
+            if result['status'] == 'paid' and result['id'] not in flipped:
+                result['status'] = 'already_paid'
+                del result['payment_id']
+    logger.info(f"[BATCH PAY] User {user_id}: {len(payment_rows)} bills marked paid")
+    return results
+
+
+def pay_loan_installments(user_id, items):
+    """
+    Record installments on loans; each item is {"loan_id": ..., "installments": n}
+    (n defaults to 1). Items for the same loan are added together and checked
+    against the installments left.
+    """
+    now = datetime.utcnow()
+    loan_ids = {_item_id(item, 'loan_id') for item in items} - {None}
+    loans = {
+        row.id: row for row in db.session.execute(
+            select(LoanDetails.id, LoanDetails.installments_paid, LoanDetails.total_installments)
+            .join(Bill, Bill.id == LoanDetails.bill_id)
+            .where(Bill.user_id == user_id, LoanDetails.id.in_(loan_ids))
+        ).all()
+    }
+    results, increments = [], {}
+
+    for index, item in enumerate(items):
+        loan_id = _item_id(item, 'loan_id')
+        loan = loans.get(loan_id)
+        if loan is None:
+            results.append(_error(index, 'Loan not found or access denied', loan_id))
+            continue
+        try:
+            count = int(_number(item.get('installments', 1), 'installments', 1))
+        except (ValueError, TypeError) as e:
+            results.append(_error(index, str(e), loan_id))
+            continue
+        paid = (loan.installments_paid or 0) + increments.get(loan_id, 0) + count
+        if paid > loan.total_installments:
+            results.append(_error(index, 'Installments exceed the loan total', loan_id))
+            continue
+        increments[loan_id] = increments.get(loan_id, 0) + count
+        results.append({'index': index, 'id': loan_id, 'status': 'paid', 'installments_paid': paid, 'count': count})
+
+    # One conditional UPDATE per loan: the total is checked against the row at write time, not the read above
+    paid = func.coalesce(LoanDetails.installments_paid, 0)
+    final = {}
+    with _transaction('LOAN PAY', user_id):
+        for loan_id, count in increments.items():
+            final[loan_id] = db.session.execute(
+                update(LoanDetails)
+                .where(LoanDetails.id == loan_id, paid + count <= LoanDetails.total_installments)
+                .values(installments_paid=paid + count, updated_at=now)
+                .returning(LoanDetails.installments_paid),
+                execution_options={'synchronize_session': False}
+            ).scalar()
+
+    # Report the running count per item from the value each loan ended at
+    running = {loan_id: value - increments[loan_id] for loan_id, value in final.items() if value is not None}
+    for result in results:
+        if result['status'] != 'paid':
+            continue
+        if result['id'] not in running:
+            result.update(status='error', error='Installments exceed the loan total')
+            del result['installments_paid']
+            del result['count']
+            continue
+        running[result['id']] += result.pop('count')
+        result['installments_paid'] = running[result['id']]
+    applied = sum(increments[loan_id] for loan_id, value in final.items() if value is not None)
+    logger.info(f"[BATCH LOAN PAY] User {user_id}: {applied} installments on {len(running)} loans")
+    return results
+
+
+def batch_response(results):
+    """Response body shared by the batch endpoints"""
+    return {
+        'success': all(result['status'] != 'error' for result in results),
+        'summary': _summarize(results),
+        'results': results
+    }
@@ -2,7 +2,15 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, Bill, Payment
 from datetime import datetime
+from sqlalchemy import update
 from models import db, Bill, Payment, LoanDetails
+from pagination import parse_page_args, parse_limit, apply_bill_filters, keyset_page
+from sync import collection_etag, not_modified, record_tombstones, parse_since, changes_since, decode_sync_cursor
+from serializers import BILL_COLUMNS, bill_row, loan_row, payment_row, json_response
+from batch_operations import check_batch, create_bills, update_bills, mark_bills_paid, batch_response
+from dashboard_summary import get_summary, invalidate_summary
+from idempotency import idempotent
+from fee_calculation_service import parse_fee_config
 import logging
 
 
@@ -16,41 +24,82 @@ bills_bp = Blueprint('bills', __name__)
 @bills_bp.route('', methods=['GET'])
 @jwt_required()
 def get_bills():
+    """
+    One page of the user's bills ordered by (due_date, id). Query parameters:
+    limit, cursor (from the X-Next-Cursor header of the previous page),
+    is_paid, due_from, due_to, category and frequency.
+    """
     user_id = get_jwt_identity()
-    logger.info(f"[GET BILLS] Request from user_id: {user_id}")
+    logger.info(f"[GET BILLS] Request from user_id: {user_id}, args: {dict(request.args)}")
     
-    bills = Bill.query.filter_by(user_id=user_id).all()
-    logger.debug(f"[GET BILLS] Found {len(bills)} bills for user {user_id}")
+    try:
+        limit, after = parse_page_args(request.args)
+        query = apply_bill_filters(
+            db.session.query(*BILL_COLUMNS).filter(Bill.user_id == user_id), request.args
+        )
+    except ValueError as e:
+        logger.warning(f"[GET BILLS] Bad query parameters: {str(e)}")
+        return jsonify({'message': str(e)}), 400
     
-    bills_data = []
-    for bill in bills:
-        logger.debug(f"[GET BILLS] Processing bill: {bill.id} - {bill.name}")
-        logger.debug(f"[GET BILLS] Bill details - Amount: {bill.amount}, Due: {bill.due_date}, Paid: {bill.is_paid}")
-        
-        bill_dict = {
-            'id': bill.id,
-            'name': bill.name,
-            'account_name': bill.account_name, 
-            'amount': bill.amount,
-            'due_date': bill.due_date.isoformat(),
-            'category': bill.category,
-            'frequency': bill.frequency,
-            'is_paid': bill.is_paid,
-            'notes': bill.notes,
-            'created_at': bill.created_at.isoformat(),
-            'reminder_preferences': {
-                'enable_whatsapp': bill.enable_whatsapp,
-                'enable_call': bill.enable_call,
-                'enable_sms': bill.enable_sms,
-                'enable_local_notification': bill.enable_local_notification
-            }
-        }
-        bills_data.append(bill_dict)
-        
-        logger.debug(f"[GET BILLS] Bill {bill.id} reminder prefs - WhatsApp: {bill.enable_whatsapp}, Call: {bill.enable_call}")
+    etag = collection_etag('bills', user_id, request.args)
+    if not_modified(request, etag):
+        logger.info(f"[GET BILLS] Not modified for user {user_id}")
+        return '', 304, {'ETag': f'W/"{etag}"'}
+    
+    bills, next_cursor = keyset_page(query, limit, after)
+    logger.debug(f"[GET BILLS] Found {len(bills)} bills for user {user_id} (more: {next_cursor is not None})")
+    
+    bills_data = [bill_row(row) for row in bills]
     
     logger.info(f"[GET BILLS] Returning {len(bills_data)} bills for user {user_id}")
-    return jsonify(bills_data), 200
+    response = json_response(bills_data)
+    response.set_etag(etag, weak=True)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
+@bills_bp.route('/changes', methods=['GET'])
+@jwt_required()
+def get_changes():
+    """
+    Bills, loans and payments changed since the `since` token of the previous
+    call, plus the ids deleted since then. Call without `since` for a full
+    snapshot; a response with "reset": true replaces the client's copy.
+    The change set is paged (`limit`); while X-Next-Cursor is set, pass it
+    back as `cursor` for the rest. Only the last page carries `deleted` and
+    the `since` token for the next refresh.
+    """
+    user_id = get_jwt_identity()
+    logger.info(f"[BILL CHANGES] Request from user_id: {user_id}, since: {request.args.get('since')}")
+
+    try:
+        limit = parse_limit(request.args)
+        cursor = decode_sync_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        since = parse_since(request.args['since']) if request.args.get('since') else None
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    changes = changes_since(user_id, since, limit, cursor)
+    response = json_response({
+        'since': changes['since'],
+        'reset': changes['reset'],
+        'bills': [bill_row(row) for row in changes['bills']],
+        'loans': [loan_row(row) for row in changes['loans']],
+        'payments': [payment_row(row) for row in changes['payments']],
+        'deleted': changes['deleted']
+    })
+    if changes['next_cursor']:
+        response.headers['X-Next-Cursor'] = changes['next_cursor']
+    return response
+
+@bills_bp.route('/summary', methods=['GET'])
+@jwt_required()
+def get_bills_summary():
+    """Dashboard totals: amount due, overdue bills, next due date and loan balance outstanding"""
+    user_id = get_jwt_identity()
+    summary, cached = get_summary(user_id)
+    logger.info(f"[BILLS SUMMARY] Summary for user {user_id} (cached: {cached})")
+    return jsonify(summary), 200
 
 @bills_bp.route('', methods=['POST'])
 @jwt_required()
@@ -67,6 +116,10 @@ def create_bill():
     required_loan = ['total_amount', 'monthly_payment', 'total_installments']
     if any(field not in loan_details_data for field in required_loan):
         return jsonify({'message': 'Missing required loan detail fields'}), 400
+    try:
+        fee_config = parse_fee_config(loan_details_data)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
     try:
         # --- Atomic Database Transaction ---
@@ -91,12 +144,14 @@ def create_bill():
             monthly_payment=loan_details_data['monthly_payment'],
             total_installments=loan_details_data['total_installments'],
             installments_paid=loan_details_data.get('installments_paid', 0),
-            interest_rate_percent=loan_details_data.get('interest_rate_percent', 0)
+            interest_rate_percent=loan_details_data.get('interest_rate_percent', 0),
+            **fee_config
         )
         db.session.add(new_loan_details)
 
         # 3. Commit both objects to the database together
         db.session.commit()
+        invalidate_summary(user_id)
 
         logger.info(f"Successfully created bill {new_bill.id} and loan details {new_loan_details.id}")
 
@@ -107,6 +162,62 @@ def create_bill():
         logger.error(f"[CREATE BILL/LOAN ERROR] Failed to save: {str(e)}", exc_info=True)
         return jsonify({'message': 'Failed to create bill and loan details'}), 500
 
+@bills_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def create_bills_batch():
+    """
+    Create many loan bills in one transaction. Body: {"bills": [<POST /api/bills body>, ...]}.
+    Invalid items are reported in `results` and the rest are still created.
+    """
+    user_id = get_jwt_identity()
+    items = (request.get_json(silent=True) or {}).get('bills')
+    error = check_batch(items, 'bills')
+    if error:
+        return jsonify({'message': error}), 400
+    logger.info(f"[BATCH CREATE] Request from user_id: {user_id} with {len(items)} bills")
+
+    try:
+        results = create_bills(user_id, items)
+    except Exception as e:
+        return jsonify({'message': 'Failed to create bills', 'error': str(e)}), 500
+    return jsonify(batch_response(results)), 200
+
+@bills_bp.route('/batch', methods=['PUT'])
+@jwt_required()
+def update_bills_batch():
+    """Partial updates of many bills. Body: {"bills": [{"id": ..., <PUT /api/bills/<id> fields>}, ...]}"""
+    user_id = get_jwt_identity()
+    items = (request.get_json(silent=True) or {}).get('bills')
+    error = check_batch(items, 'bills')
+    if error:
+        return jsonify({'message': error}), 400
+    logger.info(f"[BATCH UPDATE] Request from user_id: {user_id} with {len(items)} bills")
+
+    try:
+        results = update_bills(user_id, items)
+    except Exception as e:
+        return jsonify({'message': 'Failed to update bills', 'error': str(e)}), 500
+    return jsonify(batch_response(results)), 200
+
+@bills_bp.route('/batch/pay', methods=['POST'])
+@jwt_required()
+@idempotent
+def mark_bills_paid_batch():
+    """Mark many bills paid. Body: {"bill_ids": [...], "payment_method": "manual"}"""
+    user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    bill_ids = data.get('bill_ids')
+    error = check_batch(bill_ids, 'bill_ids')
+    if error:
+        return jsonify({'message': error}), 400
+    logger.info(f"[BATCH PAY] Request from user_id: {user_id} for {len(bill_ids)} bills")
+
+    try:
+        results = mark_bills_paid(user_id, bill_ids, data.get('payment_method') or 'manual')
+    except Exception as e:
+        return jsonify({'message': 'Failed to mark bills as paid', 'error': str(e)}), 500
+    return jsonify(batch_response(results)), 200
+
 @bills_bp.route('/<bill_id>', methods=['PUT'])
 @jwt_required()
 def update_bill(bill_id):
@@ -207,6 +318,7 @@ def update_bill(bill_id):
     
     try:
         db.session.commit()
+        invalidate_summary(user_id)
         logger.info(f"[UPDATE BILL] Bill {bill_id} updated successfully")
     except Exception as e:
         logger.error(f"[UPDATE BILL ERROR] Failed to update bill {bill_id}: {str(e)}", exc_info=True)
@@ -246,8 +358,10 @@ def delete_bill(bill_id):
     logger.info(f"[DELETE BILL] Deleting bill: {bill_name} (Amount: {bill_amount})")
     
     try:
+        record_tombstones(user_id, bill)
         db.session.delete(bill)
         db.session.commit()
+        invalidate_summary(user_id)
         logger.info(f"[DELETE BILL] Bill {bill_id} deleted successfully")
     except Exception as e:
         logger.error(f"[DELETE BILL ERROR] Failed to delete bill {bill_id}: {str(e)}", exc_info=True)
@@ -258,39 +372,46 @@ def delete_bill(bill_id):
 
 @bills_bp.route('/<bill_id>/pay', methods=['POST'])
 @jwt_required()
+@idempotent
 def mark_bill_paid(bill_id):
+    """
+    Mark a bill paid and record a payment of its amount. The flip from unpaid
+    to paid is a single conditional UPDATE, so a double tap or a concurrent
+    request records one payment, not two. Send an Idempotency-Key header to
+    get the original response back on a retry.
+    """
     user_id = get_jwt_identity()
     logger.info(f"[MARK PAID] Request from user_id: {user_id} for bill_id: {bill_id}")
     
-    bill = Bill.query.filter_by(id=bill_id, user_id=user_id).first()
-    
-    if not bill:
-        logger.warning(f"[MARK PAID] Bill {bill_id} not found for user {user_id}")
-        return jsonify({'message': 'Bill not found'}), 404
-    
-    logger.debug(f"[MARK PAID] Bill details - Name: {bill.name}, Amount: {bill.amount}, Was paid: {bill.is_paid}")
-    
-    if bill.is_paid:
-        logger.info(f"[MARK PAID] Bill {bill_id} is already marked as paid")
-    
-    bill.is_paid = True
-    
-    # Create payment record
-    logger.debug(f"[MARK PAID] Creating payment record for bill {bill_id}")
-    payment = Payment(
-        bill_id=bill.id,
-        amount=bill.amount,
-        payment_method='manual'
-    )
-    
     try:
+        amount = db.session.execute(
+            update(Bill)
+            .where(Bill.id == bill_id, Bill.user_id == user_id, Bill.is_paid == False)
+            .values(is_paid=True, updated_at=datetime.utcnow())
+            .returning(Bill.amount),
+            execution_options={'synchronize_session': False}
+        ).scalar()
+        
+        if amount is None:
+            db.session.rollback()
+            if not db.session.query(Bill.id).filter_by(id=bill_id, user_id=user_id).first():
+                logger.warning(f"[MARK PAID] Bill {bill_id} not found for user {user_id}")
+                return jsonify({'message': 'Bill not found'}), 404
+            logger.info(f"[MARK PAID] Bill {bill_id} is already marked as paid")
+            return jsonify({'message': 'Bill is already marked as paid', 'already_paid': True}), 200
+        
+        payment = Payment(
+            bill_id=bill_id,
+            amount=amount,
+            payment_method='manual'
+        )
         db.session.add(payment)
         db.session.commit()
+        invalidate_summary(user_id)
         logger.info(f"[MARK PAID] Bill {bill_id} marked as paid with payment ID: {payment.id}")
-        logger.debug(f"[MARK PAID] Payment details - Amount: {payment.amount}, Method: {payment.payment_method}")
     except Exception as e:
         logger.error(f"[MARK PAID ERROR] Failed to mark bill {bill_id} as paid: {str(e)}", exc_info=True)
         db.session.rollback()
         return jsonify({'message': 'Failed to mark bill as paid'}), 500
     
-    return jsonify({'message': 'Bill marked as paid'}), 200
\ No newline at end of file
+    return jsonify({'message': 'Bill marked as paid', 'payment_id': payment.id}), 200
@@ -0,0 +1,87 @@
+# circuit_breaker.py - Fast-fail protection for slow or failing remote calls
+
+import threading
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Classic three-state circuit breaker.
+
+    CLOSED: calls go through; `failure_threshold` consecutive failures open it.
+    OPEN: calls are rejected until `recovery_timeout` seconds have passed.
+    HALF_OPEN: up to `half_open_max_calls` trial calls are let through; one
+    success closes the circuit again, one failure re-opens it.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            logger.info(f"[CIRCUIT {self.name}] Recovery timeout elapsed, allowing trial requests")
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+
+    def allow_request(self):
+        """Return True if a call may be attempted right now"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"[CIRCUIT {self.name}] Trial request succeeded, closing circuit")
+            self._state = CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"[CIRCUIT {self.name}] Opening circuit after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def snapshot(self):
+        """State summary for health endpoints and logs"""
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                'name': self.name,
+                'state': self._state,
+                'consecutive_failures': self._failures,
+            }
@@ -24,6 +24,95 @@ class Config:
     TWILIO_WHATSAPP_FROM = os.getenv('TWILIO_WHATSAPP_FROM', 'whatsapp:+14155238886')
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
     
+    # SMS gateway (Textlocal-style bulk_json API)
+    SMS_API_KEY = os.getenv('SMS_API_KEY')
+    SMS_SENDER = os.getenv('SMS_SENDER', 'EMIREM')
+    SMS_BULK_MAX_MESSAGES = int(os.getenv('SMS_BULK_MAX_MESSAGES', 500))
+    
+    GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash-latest')
+    GEMINI_BATCH_SIZE = int(os.getenv('GEMINI_BATCH_SIZE', 25))
+    GEMINI_BATCH_RETRIES = int(os.getenv('GEMINI_BATCH_RETRIES', 1))
+    
+    # Message generation deadlines and circuit breaker
+    GENERATION_DEADLINE_SECONDS = float(os.getenv('GENERATION_DEADLINE_SECONDS', 8))
+    GENERATION_SLOW_CALL_SECONDS = float(os.getenv('GENERATION_SLOW_CALL_SECONDS', 5))
+    GENERATION_BUDGET_SECONDS = float(os.getenv('GENERATION_BUDGET_SECONDS', 20))
+    GENERATION_MAX_WORKERS = int(os.getenv('GENERATION_MAX_WORKERS', 4))
+    GENERATION_FAILURE_THRESHOLD = int(os.getenv('GENERATION_FAILURE_THRESHOLD', 3))
+    GENERATION_RECOVERY_SECONDS = float(os.getenv('GENERATION_RECOVERY_SECONDS', 60))
+    
+    # Provider base URLs; override to point at local fakes (see fake_providers.py)
+    TWILIO_BASE_URL = os.getenv('TWILIO_BASE_URL', 'https://api.twilio.com')
+    BLAND_AI_BASE_URL = os.getenv('BLAND_AI_BASE_URL', 'https://api.bland.ai')
+    GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com')
+    ELEVENLABS_BASE_URL = os.getenv('ELEVENLABS_BASE_URL', 'https://api.elevenlabs.io')
+    SMS_BASE_URL = os.getenv('SMS_BASE_URL', 'https://api.textlocal.in')
+    
+    # Pooled HTTP transport shared by all outbound providers
+    PROVIDER_POOL_CONNECTIONS = int(os.getenv('PROVIDER_POOL_CONNECTIONS', 4))
+    PROVIDER_POOL_MAXSIZE = int(os.getenv('PROVIDER_POOL_MAXSIZE', 20))
+    PROVIDER_CONNECT_TIMEOUT = float(os.getenv('PROVIDER_CONNECT_TIMEOUT', 3.05))
+    PROVIDER_READ_TIMEOUT = float(os.getenv('PROVIDER_READ_TIMEOUT', 15))
+    PROVIDER_KEEPALIVE_SECONDS = float(os.getenv('PROVIDER_KEEPALIVE_SECONDS', 60))
+    PROVIDER_WARM_ON_START = os.getenv('PROVIDER_WARM_ON_START', 'true').lower() == 'true'
+    
+    # Provider circuit breakers and channel failover
+    PROVIDER_FAILURE_THRESHOLD = int(os.getenv('PROVIDER_FAILURE_THRESHOLD', 5))
+    PROVIDER_RECOVERY_SECONDS = float(os.getenv('PROVIDER_RECOVERY_SECONDS', 30))
+    PROVIDER_HALF_OPEN_CALLS = int(os.getenv('PROVIDER_HALF_OPEN_CALLS', 1))
+    REMINDER_FAILOVER_ORDER = os.getenv('REMINDER_FAILOVER_ORDER', 'whatsapp,sms,call').split(',')
+    
+    # Background jobs for manual reminder endpoints
+    REMINDER_JOB_WORKERS = int(os.getenv('REMINDER_JOB_WORKERS', 8))
+    REMINDER_JOB_TTL_SECONDS = int(os.getenv('REMINDER_JOB_TTL_SECONDS', 900))
+    REMINDER_JOB_MAX_WAIT_SECONDS = float(os.getenv('REMINDER_JOB_MAX_WAIT_SECONDS', 30))
+    # How often a long-poll re-reads a job that is running in another worker process
+    REMINDER_JOB_POLL_SECONDS = float(os.getenv('REMINDER_JOB_POLL_SECONDS', 0.5))
+    
+    # Bland AI voice calls: concurrency cap, batching and completion tracking
+    BLAND_VOICE_ID = os.getenv('BLAND_VOICE_ID', 'e1289219-0ea2-4f22-a994-c542c2a48a0f')
+    BLAND_MAX_CONCURRENT_CALLS = int(os.getenv('BLAND_MAX_CONCURRENT_CALLS', 10))
+    BLAND_CALL_BATCH_SIZE = int(os.getenv('BLAND_CALL_BATCH_SIZE', 10))
+    BLAND_CALL_QUEUE_MAX = int(os.getenv('BLAND_CALL_QUEUE_MAX', 10000))
+    BLAND_CALL_POLL_SECONDS = float(os.getenv('BLAND_CALL_POLL_SECONDS', 15))
+    BLAND_CALL_MAX_SECONDS = float(os.getenv('BLAND_CALL_MAX_SECONDS', 900))
+    BLAND_CALL_MAX_ATTEMPTS = int(os.getenv('BLAND_CALL_MAX_ATTEMPTS', 3))
+    
+    # Off-peak pre-generation of next-day reminder content
+    PREGENERATION_HOUR = int(os.getenv('PREGENERATION_HOUR', 2))
+    PREGENERATION_MINUTE = int(os.getenv('PREGENERATION_MINUTE', 30))
+    PREGENERATE_AUDIO = os.getenv('PREGENERATE_AUDIO', 'false').lower() == 'true'
+    
+    # List endpoints (GET /api/bills, GET /api/loans)
+    PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', 100))
+    PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', 500))
+    
+    # Batch endpoints (/api/bills/batch, /api/loans/batch/pay)
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 5000))
+    
+    # Idempotency-Key handling on payment endpoints
+    IDEMPOTENCY_KEY_HOURS = int(os.getenv('IDEMPOTENCY_KEY_HOURS', 24))
+    IDEMPOTENCY_LOCK_SECONDS = float(os.getenv('IDEMPOTENCY_LOCK_SECONDS', 60))
+    
+    # Amortisation schedules cached in memory (GET /api/loans/<id>/schedule)
+    AMORTIZATION_CACHE_SIZE = int(os.getenv('AMORTIZATION_CACHE_SIZE', 10000))
+    
+    # Portfolio cash-flow forecast (portfolio_forecast.py)
+    FORECAST_DIR = os.getenv('FORECAST_DIR', 'cache/forecast')
+    FORECAST_HORIZON_MONTHS = int(os.getenv('FORECAST_HORIZON_MONTHS', 60))
+    FORECAST_HOUR = int(os.getenv('FORECAST_HOUR', 3))
+    
+    # Late fees and penal interest on overdue loans (fee_calculation_service.py)
+    FEE_CALCULATION_HOUR = int(os.getenv('FEE_CALCULATION_HOUR', 6))
+    FEE_CALCULATION_CHUNK = int(os.getenv('FEE_CALCULATION_CHUNK', 1000))
+    
+    # Dashboard summary cache (GET /api/bills/summary)
+    SUMMARY_CACHE_SECONDS = float(os.getenv('SUMMARY_CACHE_SECONDS', 300))
+    
+    # Delta sync (GET /api/bills/changes)
+    SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 30))
+    SYNC_OVERLAP_SECONDS = float(os.getenv('SYNC_OVERLAP_SECONDS', 5))
+    
     # Local Storage Settings
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads/receipts')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -32,6 +121,35 @@ class Config:
     # ElevenLabs (alternative voice service)
     ELEVENLABS_API_KEY = os.getenv('ELEVENLABS_API_KEY')
     ELEVENLABS_VOICE_ID = os.getenv('ELEVENLABS_VOICE_ID', 'rachel')
+    ELEVENLABS_MODEL_ID = os.getenv('ELEVENLABS_MODEL_ID', 'eleven_multilingual_v2')
+    VOICE_CATALOGUE_TTL_SECONDS = float(os.getenv('VOICE_CATALOGUE_TTL_SECONDS', 3600))
+    
+    # Content-addressed cache of generated TTS audio
+    AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR', 'cache/audio')
+    AUDIO_CACHE_MAX_MB = float(os.getenv('AUDIO_CACHE_MAX_MB', 500))
+    # Call audio of pre-generated reminders, kept outside the evictable cache
+    REMINDER_AUDIO_DIR = os.getenv('REMINDER_AUDIO_DIR', 'cache/reminder_audio')
+    TTS_STREAM_MAX_CHARS = int(os.getenv('TTS_STREAM_MAX_CHARS', 1000))
+    # Build pre-generated voice audio from cached phrase/number/date segments (see tts_segments.py)
+    TTS_SEGMENTED = os.getenv('TTS_SEGMENTED', 'true').lower() == 'true'
+    
+    # Telephony copies of call audio: ulaw, alaw or pcm at 8 kHz mono (empty disables)
+    TELEPHONY_AUDIO_FORMAT = os.getenv('TELEPHONY_AUDIO_FORMAT', 'ulaw')
+    TELEPHONY_SAMPLE_RATE = int(os.getenv('TELEPHONY_SAMPLE_RATE', 8000))
+    TELEPHONY_TRANSCODE_TIMEOUT = float(os.getenv('TELEPHONY_TRANSCODE_TIMEOUT', 30))
+    FFMPEG_BINARY = os.getenv('FFMPEG_BINARY', 'ffmpeg')
+    
+    # Calls with pre-generated audio are placed through Twilio, which fetches the
+    # file from PUBLIC_BASE_URL; without both settings calls use Bland AI text
+    PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL')
+    TWILIO_VOICE_FROM = os.getenv('TWILIO_VOICE_FROM')
+    
+    # Conversational voice bot: stage implementations ('local' stand-ins need no keys)
+    VOICE_BOT_STT = os.getenv('VOICE_BOT_STT', 'elevenlabs')
+    VOICE_BOT_LLM = os.getenv('VOICE_BOT_LLM', 'gemini')
+    VOICE_BOT_TTS = os.getenv('VOICE_BOT_TTS', 'elevenlabs')
+    VOICE_BOT_STT_MODEL = os.getenv('VOICE_BOT_STT_MODEL', 'scribe_v1')
+    VOICE_BOT_TURN_BUDGET_MS = float(os.getenv('VOICE_BOT_TURN_BUDGET_MS', 1000))
     
     # Add the missing ENCRYPTION_KEY
     ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY', 'your-encryption-key-here')
@@ -0,0 +1,135 @@
+# dashboard_summary.py - Per-user bill and loan totals computed in SQL and cached in memory
+#
+# The summary is cached per user until one of these happens:
+#   - a bill, loan or payment write calls invalidate_summary(user_id)
+#   - SUMMARY_CACHE_SECONDS pass
+#   - the earliest unpaid due date passes, which changes the overdue figures
+# Concurrent misses for the same user share one computation (single flight),
+# so a burst of dashboard loads after a write runs the aggregates once. The
+# cache is per process; with several workers the TTL bounds how stale a
+# worker that missed an invalidation can be.
+
+from datetime import datetime
+import threading
+import time
+import logging
+
+from sqlalchemy import case, func
+
+from config import Config
+from models import db, Bill, LoanDetails
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# user_id -> {'summary', 'expires_at' (monotonic)}
+_summaries = {}
+# user_id -> {'lock', 'users', 'generation'} while that user's summary is being computed.
+# 'users' counts the requests holding or waiting for the lock; the entry (and so the
+# lock) is dropped only when it reaches zero. 'generation' counts invalidations, so a
+# computation that started before one is not stored.
+_inflight = {}
+_lock = threading.Lock()
+
+
+def compute_summary(user_id):
+    """Bill and loan totals for the user, from two aggregate queries"""
+    now = datetime.utcnow()
+    unpaid = Bill.is_paid == False
+    overdue = unpaid & (Bill.due_date < now)
+
+    bills = db.session.query(
+        func.count(Bill.id),
+        func.sum(case((unpaid, 1), else_=0)),
+        func.sum(case((unpaid, Bill.amount), else_=0)),
+        func.sum(case((overdue, 1), else_=0)),
+        func.sum(case((overdue, Bill.amount), else_=0)),
+        func.min(case((unpaid & (Bill.due_date >= now), Bill.due_date))),
+    ).filter(Bill.user_id == user_id).one()
+    bill_count, unpaid_count, amount_due, overdue_count, overdue_amount, next_due_date = bills
+
+    # LoanDetails.amount_remaining, summed in SQL
+    remaining = LoanDetails.total_amount - func.coalesce(LoanDetails.installments_paid, 0) * LoanDetails.monthly_payment
+    loans = db.session.query(
+        func.count(LoanDetails.id),
+        func.sum(remaining),
+        func.sum(LoanDetails.monthly_payment),
+    ).join(Bill, Bill.id == LoanDetails.bill_id).filter(
+        Bill.user_id == user_id, LoanDetails.is_active == True
+    ).one()
+    active_loans, total_outstanding, monthly_commitment = loans
+
+    return {
+        'bill_count': bill_count or 0,
+        'unpaid_count': unpaid_count or 0,
+        'amount_due': round(amount_due or 0, 2),
+        'overdue_count': overdue_count or 0,
+        'overdue_amount': round(overdue_amount or 0, 2),
+        'next_due_date': next_due_date.isoformat() if next_due_date else None,
+        'active_loans': active_loans or 0,
+        'total_outstanding': round(total_outstanding or 0, 2),
+        'monthly_loan_payments': round(monthly_commitment or 0, 2),
+        'computed_at': now.isoformat()
+    }
+
+
+def _expires_at(summary):
+    """Monotonic expiry: the TTL, or sooner if the next due date passes first"""
+    expires_at = time.monotonic() + Config.SUMMARY_CACHE_SECONDS
+    if summary['next_due_date']:
+        until_due = (datetime.fromisoformat(summary['next_due_date']) - datetime.utcnow()).total_seconds()
+        expires_at = min(expires_at, time.monotonic() + max(until_due, 0))
+    return expires_at
+
+
+def _cached(user_id):
+    entry = _summaries.get(user_id)
+    if entry is None:
+        return None
+    if entry['expires_at'] <= time.monotonic():
+        del _summaries[user_id]
+        return None
+    return entry['summary']
+
+
+def get_summary(user_id):
+    """Returns (summary, cached)"""
+    with _lock:
+        summary = _cached(user_id)
+        if summary is not None:
+            return summary, True
+        flight = _inflight.setdefault(user_id, {'lock': threading.Lock(), 'users': 0, 'generation': 0})
+        flight['users'] += 1
+
+    try:
+        with flight['lock']:
+            # Whoever held the lock before us may have just stored a fresh summary
+            with _lock:
+                summary = _cached(user_id)
+                if summary is not None:
+                    return summary, True
+                generation = flight['generation']
+
+            summary = compute_summary(user_id)
+
+            with _lock:
+                if flight['generation'] == generation:
+                    _summaries[user_id] = {'summary': summary, 'expires_at': _expires_at(summary)}
+    finally:
+        with _lock:
+            flight['users'] -= 1
+            if not flight['users']:
+                del _inflight[user_id]
+    logger.debug(f"[SUMMARY] Computed summary for user {user_id}")
+    return summary, False
+
+
+def invalidate_summary(*user_ids):
+    """Drop the cached summaries; call after committing a bill, loan or payment write"""
+    with _lock:
+        for user_id in user_ids:
+            _summaries.pop(user_id, None)
+            flight = _inflight.get(user_id)
+            if flight is not None:
+                flight['generation'] += 1
@@ -1,9 +1,10 @@
 import os
-import tempfile
-from elevenlabs import ElevenLabs
-from elevenlabs import play, save, stream
-from elevenlabs import VoiceSettings
+import threading
+import time
 from dotenv import load_dotenv
+from config import Config
+from provider_transport import get_elevenlabs_client
+from audio_cache import audio_cache, audio_cache_key
 import logging
 
 
@@ -19,12 +20,24 @@ load_dotenv()
 api_key = os.getenv("ELEVENLABS_API_KEY")
 logger.info(f"[ELEVENLABS INIT] API key loaded: {'*' * 30 + api_key[-4:] if api_key else 'NOT SET'}")
 
-try:
-    # Initialize client with API key
-    client = ElevenLabs(api_key=api_key)
-    logger.info("[ELEVENLABS INIT] Client successfully initialized")
-except Exception as e:
-    logger.error(f"[ELEVENLABS INIT ERROR] Failed to initialize client: {str(e)}")
+# The ElevenLabs client is created on first use by get_elevenlabs_client()
+
+# Voice settings used for every reminder; part of the audio cache key
+VOICE_SETTINGS = {
+    'stability': 0.5,
+    'similarity_boost': 0.75,
+    'style': 0.5,
+    'use_speaker_boost': True
+}
+
+DEFAULT_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")
+
+# Chunk size when replaying cached audio to a streaming client
+STREAM_CHUNK_BYTES = 16 * 1024
+
+def _voice_settings():
+    from elevenlabs import VoiceSettings
+    return VoiceSettings(**VOICE_SETTINGS)
 
 def generate_voice_audio(text: str, voice_id: str = None):
     """Generate voice audio using ElevenLabs API."""
@@ -36,48 +49,33 @@ def generate_voice_audio(text: str, voice_id: str = None):
     try:
         # Use default voice ID if none is provided
         if not voice_id:
-            default_voice_id = os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")
-            voice_id = default_voice_id
+            voice_id = DEFAULT_VOICE_ID
             logger.info(f"[ELEVENLABS GENERATE] Using default voice ID: {voice_id}")
         else:
             logger.info(f"[ELEVENLABS GENERATE] Using provided voice ID: {voice_id}")
         
-        # Log voice settings
-        voice_settings = VoiceSettings(
-            stability=0.5,
-            similarity_boost=0.75,
-            style=0.5,
-            use_speaker_boost=True
-        )
-        logger.debug(f"[ELEVENLABS GENERATE] Voice settings - Stability: 0.5, Similarity: 0.75, Style: 0.5, Speaker boost: True")
+        model_id = Config.ELEVENLABS_MODEL_ID
+        cache_key = audio_cache_key(text, voice_id, model_id, VOICE_SETTINGS)
+        cached_path = audio_cache.get(cache_key)
+        if cached_path:
+            logger.info(f"[ELEVENLABS GENERATE] Audio cache hit: {cached_path}")
+            return {"success": True, "audio_path": cached_path, "cached": True}
+
+        logger.debug(f"[ELEVENLABS GENERATE] Voice settings: {VOICE_SETTINGS}")
         
         # Generate audio using new client method
         logger.info("[ELEVENLABS GENERATE] Calling ElevenLabs API to generate audio")
-        audio = client.text_to_speech.convert(
+        audio = get_elevenlabs_client().text_to_speech.convert(
             text=text,
             voice_id=voice_id,
-            model_id="eleven_multilingual_v2",
-            voice_settings=voice_settings
+            model_id=model_id,
+            voice_settings=_voice_settings()
         )
-        logger.info("[ELEVENLABS GENERATE] Audio generated successfully")
         
-        # Save to temporary file
-        logger.debug("[ELEVENLABS GENERATE] Creating temporary file for audio")
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-            temp_path = tmp_file.name
-            logger.debug(f"[ELEVENLABS GENERATE] Temporary file path: {temp_path}")
-            
-            logger.info("[ELEVENLABS GENERATE] Saving audio to temporary file")
-            save(audio, temp_path)
-            
-            # Verify file was created and get size
-            if os.path.exists(temp_path):
-                file_size = os.path.getsize(temp_path)
-                logger.info(f"[ELEVENLABS GENERATE] Audio file saved successfully. Size: {file_size} bytes")
-            else:
-                logger.error(f"[ELEVENLABS GENERATE] Audio file not found after save: {temp_path}")
-            
-            return {"success": True, "audio_path": temp_path}
+        # The response streams in; write it straight into the cache
+        audio_path = audio_cache.put(cache_key, audio)
+        logger.info(f"[ELEVENLABS GENERATE] Audio generated and cached. Size: {os.path.getsize(audio_path)} bytes")
+        return {"success": True, "audio_path": audio_path, "cached": False}
             
     except Exception as e:
         logger.error(f"[ELEVENLABS GENERATE ERROR] Failed to generate audio: {str(e)}", exc_info=True)
@@ -85,41 +83,99 @@ def generate_voice_audio(text: str, voice_id: str = None):
         print(f"Error generating ElevenLabs audio: {e}")
         return {"success": False, "error": str(e)}
 
-def get_available_voices():
+def stream_voice_audio(text: str, voice_id: str = None, cache: bool = True):
+    """
+    Yield MP3 chunks as ElevenLabs produces them. With `cache`, a cached copy
+    is replayed instead, and a fresh stream is written to the audio cache as
+    it passes through; a stream that is cut off is discarded, not cached.
+    """
+    voice_id = voice_id or DEFAULT_VOICE_ID
+    model_id = Config.ELEVENLABS_MODEL_ID
+    cache_key = audio_cache_key(text, voice_id, model_id, VOICE_SETTINGS)
+
+    # Opened by the cache itself, so a concurrent eviction cannot remove the file before it is read
+    cached = audio_cache.open(cache_key) if cache else None
+    if cached:
+        logger.info(f"[ELEVENLABS STREAM] Audio cache hit: {cached.name}")
+        with cached:
+            yield from iter(lambda: cached.read(STREAM_CHUNK_BYTES), b'')
+        return
+
+    logger.info(f"[ELEVENLABS STREAM] Streaming {len(text)} characters with voice {voice_id}")
+    audio = get_elevenlabs_client().text_to_speech.stream(
+        text=text,
+        voice_id=voice_id,
+        model_id=model_id,
+        voice_settings=_voice_settings()
+    )
+
+    writer = audio_cache.writer(cache_key) if cache else None
+    try:
+        for chunk in audio:
+            if writer:
+                writer.write(chunk)
+            yield chunk
+    except BaseException:
+        # Includes GeneratorExit when the client disconnects mid-stream
+        if writer:
+            writer.abort()
+        raise
+    if writer:
+        path = writer.commit()
+        logger.info(f"[ELEVENLABS STREAM] Stream finished, {writer.size} bytes cached at {path}")
+
+# Voice catalogue, refreshed in the background once it is older than VOICE_CATALOGUE_TTL_SECONDS
+_voice_catalogue = {'voices': None, 'fetched_at': 0.0, 'refreshing': False}
+_voice_catalogue_lock = threading.Lock()
+
+def _fetch_voices():
     """Get list of available voices from ElevenLabs."""
-    logger.info("[ELEVENLABS VOICES] Fetching available voices")
-    
+    logger.debug("[ELEVENLABS VOICES] Calling ElevenLabs API to get voices")
+    voices_response = get_elevenlabs_client().voices.search()
+    voice_list = [
+        {
+            "voice_id": voice.voice_id,
+            "name": voice.name,
+            "category": voice.category,
+        }
+        for voice in voices_response.voices
+    ]
+    with _voice_catalogue_lock:
+        _voice_catalogue['voices'] = voice_list
+        _voice_catalogue['fetched_at'] = time.monotonic()
+    logger.info(f"[ELEVENLABS VOICES] Catalogue refreshed: {len(voice_list)} voices")
+    return voice_list
+
+def _refresh_voices_in_background():
     try:
-        logger.debug("[ELEVENLABS VOICES] Calling ElevenLabs API to get voices")
-        # Use new client method to get voices
-        voices_response = client.voices.search()
-        available_voices = voices_response.voices
-        
-        logger.info(f"[ELEVENLABS VOICES] Retrieved {len(available_voices)} voices")
-        
-        voice_list = []
-        for voice in available_voices:
-            voice_data = {
-                "voice_id": voice.voice_id,
-                "name": voice.name,
-                "category": voice.category,
-            }
-            voice_list.append(voice_data)
-            logger.debug(f"[ELEVENLABS VOICES] Voice: {voice.name} (ID: {voice.voice_id}, Category: {voice.category})")
-        
-        logger.info(f"[ELEVENLABS VOICES] Successfully processed {len(voice_list)} voices")
-        
-        # Log categories summary
-        categories = {}
-        for v in voice_list:
-            cat = v.get('category', 'unknown')
-            categories[cat] = categories.get(cat, 0) + 1
-        logger.debug(f"[ELEVENLABS VOICES] Voice categories: {categories}")
-        
-        return {"success": True, "voices": voice_list}
-        
+        _fetch_voices()
+    except Exception as e:
+        logger.warning(f"[ELEVENLABS VOICES] Background refresh failed, keeping cached catalogue: {str(e)}")
+    finally:
+        with _voice_catalogue_lock:
+            _voice_catalogue['refreshing'] = False
+
+def get_available_voices():
+    """
+    Voice catalogue from a process-wide cache. Only the first call waits for
+    ElevenLabs; after the TTL the cached list is still returned while one
+    background thread fetches a fresh copy.
+    """
+    with _voice_catalogue_lock:
+        voices = _voice_catalogue['voices']
+        stale = time.monotonic() - _voice_catalogue['fetched_at'] > Config.VOICE_CATALOGUE_TTL_SECONDS
+        start_refresh = voices is not None and stale and not _voice_catalogue['refreshing']
+        if start_refresh:
+            _voice_catalogue['refreshing'] = True
+
+    if start_refresh:
+        logger.debug("[ELEVENLABS VOICES] Catalogue is stale, refreshing in the background")
+        threading.Thread(target=_refresh_voices_in_background, name='voice-catalogue-refresh', daemon=True).start()
+    if voices is not None:
+        return {"success": True, "voices": voices}
+
+    try:
+        return {"success": True, "voices": _fetch_voices()}
     except Exception as e:
         logger.error(f"[ELEVENLABS VOICES ERROR] Failed to get voices: {str(e)}", exc_info=True)
-        logger.debug(f"[ELEVENLABS VOICES ERROR] Error type: {type(e).__name__}")
-        print(f"Error getting ElevenLabs voices: {e}")
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+        return {"success": False, "error": str(e)}
@@ -154,6 +154,16 @@ class GlassyButton(HoverBehavior, Button):
 if platform != 'android':
     Window.size = (360, 640)
 
+class LocalBillsResponse:
+    """Stands in for the last /bills/changes response, with the merged local bill list as its JSON"""
+    def __init__(self, response, items):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self._items = items
+
+    def json(self):
+        return self._items
+
 class APIManager:
     """Handles all API communications with the Flask backend"""
     def update_bill_paid_status(self, bill_id, new_status, callback):
@@ -174,6 +184,9 @@ class APIManager:
         self.base_url = "http://127.0.0.1:5000/api"
         self.token = None
         self.store = JsonStore('bills_reminder.json')
+        # Local copy of the bill list, kept current through /bills/changes
+        self._bills = {}
+        self._bills_since = None
         self.load_token()
     
     def load_token(self):
@@ -182,10 +195,12 @@ class APIManager:
     
     def save_token(self, token):
         self.token = token
+        self._bills, self._bills_since = {}, None
         self.store.put('auth', token=token)
     
     def clear_token(self):
         self.token = None
+        self._bills, self._bills_since = {}, None
         if self.store.exists('auth'):
             self.store.delete('auth')
     
@@ -231,10 +246,35 @@ class APIManager:
     def get_bills(self, callback):
         def _get_bills():
             try:
-                response = requests.get(
-                    f"{self.base_url}/bills",
-                    headers=self.get_headers()
-                )
+                # Fetch only what changed since the last refresh and merge it into the local copy.
+                # The change set is paged; follow X-Next-Cursor and keep the copy only once the last page is in
+                params = {'limit': 200}
+                if self._bills_since:
+                    params['since'] = self._bills_since
+                local_bills = None
+                while True:
+                    response = requests.get(
+                        f"{self.base_url}/bills/changes",
+                        params=params,
+                        headers=self.get_headers()
+                    )
+                    if response.status_code != 200:
+                        break
+                    changes = response.json()
+                    if local_bills is None:
+                        local_bills = {} if changes['reset'] else dict(self._bills)
+                    for bill in changes['bills']:
+                        local_bills[bill['id']] = bill
+                    next_cursor = response.headers.get('X-Next-Cursor')
+                    if next_cursor:
+                        params = {'limit': 200, 'cursor': next_cursor}
+                        continue
+                    for bill_id in changes['deleted'].get('bill', []):
+                        local_bills.pop(bill_id, None)
+                    self._bills, self._bills_since = local_bills, changes['since']
+                    bills = sorted(self._bills.values(), key=lambda b: (b['due_date'], b['id']))
+                    response = LocalBillsResponse(response, bills)
+                    break
                 Clock.schedule_once(lambda dt: callback(response), 0)
             except Exception as e:
                 Clock.schedule_once(lambda dt, err=str(e): callback(None, err), 0)
@@ -293,6 +333,9 @@ class APIManager:
                     headers=self.get_headers()
                 )
                 logging.info(f"API call completed for test reminder type: {reminder_type}. Status: {response.status_code}")
+                # The server queues the reminder; long-poll the job until it finishes
+                if response.status_code == 202:
+                    response = self.wait_for_job(response.json()['job_id'])
                 Clock.schedule_once(lambda dt: callback(response), 0)
             except Exception as e:
                 logging.error(f"Error in API call for test reminder type: {reminder_type}: {str(e)}")
@@ -300,6 +343,19 @@ class APIManager:
         
         threading.Thread(target=_send_reminder).start()
     
+    def wait_for_job(self, job_id, max_polls=10):
+        """Long-poll a queued reminder job; returns the last status response"""
+        response = None
+        for _ in range(max_polls):
+            response = requests.get(
+                f"{self.base_url}/reminders/jobs/{job_id}",
+                params={'wait': 25},
+                headers=self.get_headers()
+            )
+            if response.status_code != 200 or response.json().get('status') in ('succeeded', 'failed'):
+                break
+        return response
+    
     def get_reminder_settings(self, callback):
         def _get_settings():
             try:
@@ -706,7 +762,7 @@ class SettingsScreen(Screen):
     def on_test_reminder_response(self, response, error=None):
         logging.info(f"Test reminder response received for type. Status: {response.status_code if response else 'None'}, Error: {error}")
         app = App.get_running_app()
-        if response and response.status_code == 200:
+        if response and response.status_code == 200 and response.json().get('status') == 'succeeded':
             app.show_popup('Success', 'Test reminder sent successfully')
         else:
             app.show_popup('Error', 'Failed to send test reminder')
@@ -0,0 +1,481 @@
+# fake_providers.py - Local stand-in servers for Twilio, Bland AI, Gemini, ElevenLabs and the SMS gateway
+#
+# Each fake speaks the request/response shapes the reminder code uses, with
+# injectable latency, error rate and 429 rate. Point the app at them with the
+# *_BASE_URL settings in Config, e.g.:
+#
+#   python fake_providers.py --latency-ms 150 --error-rate 0.02 --rate-limit-rate 0.01
+#
+# and export the environment variables it prints before starting app.py.
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from datetime import datetime
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROVIDERS = ('twilio', 'bland', 'gemini', 'elevenlabs', 'sms')
+
+DEFAULT_PORTS = {
+    'twilio': 8701,
+    'bland': 8702,
+    'gemini': 8703,
+    'elevenlabs': 8704,
+    'sms': 8705,
+}
+
+BASE_URL_SETTINGS = {
+    'twilio': 'TWILIO_BASE_URL',
+    'bland': 'BLAND_AI_BASE_URL',
+    'gemini': 'GEMINI_BASE_URL',
+    'elevenlabs': 'ELEVENLABS_BASE_URL',
+    'sms': 'SMS_BASE_URL',
+}
+
+# One silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, 417 bytes, ~26 ms
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+
+
+def fake_mp3(text):
+    """Silent MP3 whose duration roughly matches speaking `text`"""
+    frames = max(4, int(len(text) * 2.3))
+    return MP3_FRAME * frames
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # --- plumbing -------------------------------------------------------
+
+    def log_message(self, format, *args):
+        logger.debug(f"[FAKE {self.server.provider.upper()}] " + format % args)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, payload, content_type='application/json', headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, chunks, content_type, chunk_delay=0.0):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for chunk in chunks:
+            if chunk_delay:
+                time.sleep(chunk_delay)
+            self.wfile.write(f'{len(chunk):X}\r\n'.encode('ascii') + chunk + b'\r\n')
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _inject_faults(self):
+        """Apply latency, then maybe answer with a 429 or 500. Returns True if handled."""
+        server = self.server
+        server.record('requests')
+        if server.latency_ms:
+            jitter = random.uniform(-server.jitter_ms, server.jitter_ms) if server.jitter_ms else 0
+            time.sleep(max(0.0, server.latency_ms + jitter) / 1000.0)
+
+        roll = random.random()
+        if roll < server.rate_limit_rate:
+            server.record('rate_limited')
+            payload = {'status': 429, 'message': 'Too Many Requests'}
+            if server.provider == 'twilio':
+                payload['code'] = 20429
+            self._send(429, payload, headers={'Retry-After': '1'})
+            return True
+        if roll < server.rate_limit_rate + server.error_rate:
+            server.record('errors')
+            self._send(500, {'status': 500, 'message': 'Injected provider error'})
+            return True
+        return False
+
+    def do_HEAD(self):
+        # Connection warm-up
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method):
+        body = self._body() if method == 'POST' else b''
+        path = urlparse(self.path).path
+        routes = ROUTES.get(self.server.provider, [])
+        for route_method, pattern, handler in routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                if self._inject_faults():
+                    return
+                self.server.record('ok')
+                handler(self, body, *match.groups())
+                return
+        self._send(404, {'message': f'No fake route for {method} {path}'})
+
+    # --- Twilio ---------------------------------------------------------
+
+    def twilio_create_message(self, body, account_sid):
+        form = {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+        now = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S +0000')
+        sid = 'SM' + uuid.uuid4().hex
+        self._send(201, {
+            'sid': sid,
+            'account_sid': account_sid,
+            'to': form.get('To'),
+            'from': form.get('From'),
+            'body': form.get('Body'),
+            'status': 'queued',
+            'num_segments': '1',
+            'direction': 'outbound-api',
+            'api_version': '2010-04-01',
+            'date_created': now,
+            'date_updated': now,
+            'date_sent': None,
+            'error_code': None,
+            'error_message': None,
+            'price': None,
+            'price_unit': 'USD',
+            'uri': f'/2010-04-01/Accounts/{account_sid}/Messages/{sid}.json',
+        })
+
+    def twilio_create_call(self, body, account_sid):
+        form = {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+        if not form.get('To') or not (form.get('Twiml') or form.get('Url')):
+            self._send(400, {'code': 21201, 'message': 'To and Twiml or Url are required', 'status': 400})
+            return
+        now = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S +0000')
+        sid = 'CA' + uuid.uuid4().hex
+        self._send(201, {
+            'sid': sid,
+            'account_sid': account_sid,
+            'to': form.get('To'),
+            'from': form.get('From'),
+            'status': 'queued',
+            'direction': 'outbound-api',
+            'api_version': '2010-04-01',
+            'date_created': now,
+            'date_updated': now,
+            'uri': f'/2010-04-01/Accounts/{account_sid}/Calls/{sid}.json',
+        })
+
+    # --- Bland AI -------------------------------------------------------
+
+    def bland_create_call(self, body):
+        data = json.loads(body or b'{}')
+        if not data.get('phone_number'):
+            self._send(400, {'status': 'error', 'message': 'Missing phone_number'})
+            return
+        call_id = self.server.start_call()
+        if call_id is None:
+            self.server.record('rate_limited')
+            self._send(429, {'status': 'error', 'message': 'Concurrent call limit reached'})
+            return
+        self._send(200, {
+            'status': 'success',
+            'message': 'Call successfully queued.',
+            'call_id': call_id,
+        })
+
+    def bland_get_call(self, body, call_id):
+        status = self.server.call_status(call_id)
+        if status is None:
+            self._send(404, {'status': 'error', 'message': 'Call not found'})
+            return
+        self._send(200, {
+            'call_id': call_id,
+            'status': status,
+            'completed': status == 'completed',
+            'queue_status': 'complete' if status == 'completed' else 'started',
+        })
+
+    # --- Gemini ---------------------------------------------------------
+
+    def gemini_generate(self, body, model):
+        request = json.loads(body or b'{}')
+        prompt = ''.join(
+            part.get('text', '')
+            for content in request.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        mime_type = (request.get('generationConfig') or {}).get('responseMimeType')
+        text = _fake_gemini_text(prompt, mime_type)
+        self._send(200, {
+            'candidates': [{
+                'content': {'role': 'model', 'parts': [{'text': text}]},
+                'finishReason': 'STOP',
+                'index': 0,
+            }],
+            'usageMetadata': {
+                'promptTokenCount': len(prompt) // 4,
+                'candidatesTokenCount': len(text) // 4,
+                'totalTokenCount': (len(prompt) + len(text)) // 4,
+            },
+            'modelVersion': model,
+        })
+
+    def gemini_stream_generate(self, body, model):
+        request = json.loads(body or b'{}')
+        prompt = ''.join(
+            part.get('text', '')
+            for content in request.get('contents', [])
+            for part in content.get('parts', [])
+        )
+        words = _fake_gemini_text(prompt, None).split(' ')
+        events = []
+        for start in range(0, len(words), 3):
+            text = ' '.join(words[start:start + 3]) + ' '
+            event = {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'index': 0}]}
+            events.append(f"data: {json.dumps(event)}\r\n\r\n".encode('utf-8'))
+        # About the pace of a fast model: a few tokens every 30 ms
+        self._send_chunked(events, 'text/event-stream', chunk_delay=0.03)
+
+    # --- ElevenLabs -----------------------------------------------------
+
+    def elevenlabs_convert(self, body, voice_id):
+        data = json.loads(body or b'{}')
+        self._send(200, fake_mp3(data.get('text', '')), content_type='audio/mpeg')
+
+    def elevenlabs_stream(self, body, voice_id):
+        data = json.loads(body or b'{}')
+        audio = fake_mp3(data.get('text', ''))
+        chunk_size = len(MP3_FRAME) * 8
+        chunks = [audio[i:i + chunk_size] for i in range(0, len(audio), chunk_size)]
+        # Roughly real-time: each chunk holds ~200 ms of audio, sent a bit faster than that
+        self._send_chunked(chunks, 'audio/mpeg', chunk_delay=0.05)
+
+    def elevenlabs_speech_to_text(self, body):
+        # The fake cannot hear; every utterance is the same question
+        self._send(200, {'language_code': 'en', 'language_probability': 0.99, 'text': 'When is my payment due?', 'words': []})
+
+    def elevenlabs_search_voices(self, body):
+        voices = [
+            {'voice_id': '21m00Tcm4TlvDq8ikWAM', 'name': 'Rachel', 'category': 'premade'},
+            {'voice_id': 'EXAVITQu4vr4xnSDxMaL', 'name': 'Sarah', 'category': 'premade'},
+            {'voice_id': 'pNInz6obpgDQGcFmaJgB', 'name': 'Adam', 'category': 'premade'},
+        ]
+        self._send(200, {'voices': voices, 'has_more': False, 'total_count': len(voices), 'next_page_token': None})
+
+    # --- SMS gateway ----------------------------------------------------
+
+    def sms_bulk_send(self, body):
+        form = {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+        try:
+            data = json.loads(form.get('data') or '{}')
+        except ValueError:
+            self._send(400, {'status': 'failure', 'errors': [{'code': 4, 'message': 'Invalid data'}]})
+            return
+        sent, failures = [], []
+        for message in data.get('messages', []):
+            number = str(message.get('number', ''))
+            if not number.isdigit() or len(number) < 12:
+                failures.append({'custom': message.get('custom'), 'recipient': number, 'message': 'Invalid number'})
+                continue
+            sent.append({'id': uuid.uuid4().hex[:12], 'recipient': number, 'custom': message.get('custom')})
+        self.server.record_sms(len(sent))
+        self._send(200, {
+            'status': 'success',
+            'num_messages': len(sent),
+            'messages': sent,
+            'failures': failures,
+        })
+
+
+def _fake_gemini_text(prompt, mime_type):
+    """Reminder-shaped text; a JSON array when the batch prompt asks for one"""
+    if mime_type == 'application/json' and 'Records:' in prompt:
+        try:
+            records = json.loads(prompt.split('Records:', 1)[1])
+        except ValueError:
+            records = []
+        return json.dumps([
+            {
+                'id': record.get('id'),
+                'message': (
+                    f"Hey {record.get('name')}, {record.get('greeting', 'Good morning')}. "
+                    f"Your {record.get('bill')} payment of ₹{record.get('amount')} is due on "
+                    f"{record.get('due_date')}. Hope you have a nice day."
+                ),
+            }
+            for record in records
+        ])
+
+    opening = re.search(r'Start with: "([^"]+)"', prompt)
+    return (
+        f"{opening.group(1) if opening else 'Hey there.'} "
+        "This is a friendly reminder about your upcoming payment. Hope you have a nice day."
+    )
+
+
+ROUTES = {
+    'twilio': [
+        ('POST', r'/2010-04-01/Accounts/([^/]+)/Messages\.json', FakeProviderHandler.twilio_create_message),
+        ('POST', r'/2010-04-01/Accounts/([^/]+)/Calls\.json', FakeProviderHandler.twilio_create_call),
+    ],
+    'bland': [
+        ('POST', r'/call', FakeProviderHandler.bland_create_call),
+        ('GET', r'/v1/calls/([^/]+)', FakeProviderHandler.bland_get_call),
+    ],
+    'gemini': [
+        ('POST', r'/v1beta/models/([^/:]+):generateContent', FakeProviderHandler.gemini_generate),
+        ('POST', r'/v1beta/models/([^/:]+):streamGenerateContent', FakeProviderHandler.gemini_stream_generate),
+    ],
+    'elevenlabs': [
+        ('POST', r'/v1/text-to-speech/([^/]+)', FakeProviderHandler.elevenlabs_convert),
+        ('POST', r'/v1/text-to-speech/([^/]+)/stream', FakeProviderHandler.elevenlabs_stream),
+        ('GET', r'/v2/voices', FakeProviderHandler.elevenlabs_search_voices),
+        ('POST', r'/v1/speech-to-text', FakeProviderHandler.elevenlabs_speech_to_text),
+    ],
+    'sms': [
+        ('POST', r'/bulk_json/?', FakeProviderHandler.sms_bulk_send),
+    ],
+}
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    """Threaded HTTP server for one provider with fault injection settings"""
+
+    daemon_threads = True
+
+    def __init__(self, provider, port=0, host='127.0.0.1', latency_ms=0, jitter_ms=0,
+                 error_rate=0.0, rate_limit_rate=0.0, call_seconds=5.0, call_limit=0):
+        if provider not in PROVIDERS:
+            raise ValueError(f'Unknown provider: {provider}')
+        super().__init__((host, port), FakeProviderHandler)
+        self.provider = provider
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        # Bland AI: how long a fake call lasts and how many may be live at once (0 = no limit)
+        self.call_seconds = call_seconds
+        self.call_limit = call_limit
+        self._calls = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'ok': 0, 'errors': 0, 'rate_limited': 0, 'sms_delivered': 0,
+                      'calls_started': 0, 'calls_live_peak': 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def record(self, counter):
+        with self._stats_lock:
+            self.stats[counter] += 1
+
+    def record_sms(self, count):
+        with self._stats_lock:
+            self.stats['sms_delivered'] += count
+
+    def _live_calls(self, now):
+        return sum(1 for ends_at in self._calls.values() if ends_at > now)
+
+    def start_call(self):
+        """Register a new call, or return None when the concurrency limit is hit"""
+        now = time.monotonic()
+        with self._stats_lock:
+            live = self._live_calls(now)
+            if self.call_limit and live >= self.call_limit:
+                return None
+            call_id = str(uuid.uuid4())
+            self._calls[call_id] = now + self.call_seconds
+            self.stats['calls_started'] += 1
+            self.stats['calls_live_peak'] = max(self.stats['calls_live_peak'], live + 1)
+            return call_id
+
+    def call_status(self, call_id):
+        with self._stats_lock:
+            ends_at = self._calls.get(call_id)
+        if ends_at is None:
+            return None
+        return 'completed' if time.monotonic() >= ends_at else 'in-progress'
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name=f'fake-{self.provider}', daemon=True)
+        thread.start()
+        logger.info(f"[FAKE {self.provider.upper()}] Listening on {self.base_url}")
+        return thread
+
+
+def start_fake_providers(providers=PROVIDERS, ports=None, **fault_settings):
+    """Start fakes in background threads; returns {provider: server}"""
+    servers = {}
+    for provider in providers:
+        port = (ports or {}).get(provider, 0)
+        server = FakeProviderServer(provider, port=port, **fault_settings)
+        server.start()
+        servers[provider] = server
+    return servers
+
+
+def fake_provider_env(servers):
+    """Environment variables pointing Config at running fakes"""
+    return {BASE_URL_SETTINGS[provider]: server.base_url for provider, server in servers.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run local stand-ins for the reminder providers')
+    parser.add_argument('--providers', default=','.join(PROVIDERS), help='Comma separated providers to fake')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--call-seconds', type=float, default=5.0, help='Duration of each fake Bland AI call')
+    parser.add_argument('--call-limit', type=int, default=0, help='Concurrent Bland AI calls before 429 (0 = no limit)')
+    args = parser.parse_args()
+
+    servers = {}
+    for provider in args.providers.split(','):
+        server = FakeProviderServer(
+            provider,
+            port=DEFAULT_PORTS[provider],
+            host=args.host,
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            call_seconds=args.call_seconds,
+            call_limit=args.call_limit
+        )
+        server.start()
+        servers[provider] = server
+
+    print("\nExport these before starting app.py:")
+    for name, value in fake_provider_env(servers).items():
+        print(f"  export {name}={value}")
+
+    try:
+        while True:
+            time.sleep(60)
+            for provider, server in servers.items():
+                logger.info(f"[FAKE {provider.upper()}] Stats: {server.stats}")
+    except KeyboardInterrupt:
+        for server in servers.values():
+            server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
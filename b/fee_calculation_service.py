@@ -0,0 +1,277 @@
+# fee_calculation_service.py - Late fees and penal interest on overdue loan installments
+#
+# A loan's installment is its bill: overdue while the bill is unpaid and its
+# due date has passed. Once it is more than late_fee_grace_days days overdue:
+#   late_fee = base_emi * late_fee_amount / 100      ('percentage')
+#   late_fee = late_fee_amount                       ('fixed')
+#   additional_interest = amount_remaining * additional_interest_rate / 100 / 365 * days_past_grace
+# The figures are stored on the loan with fee_due_date set to the installment
+# they belong to. When that installment is paid or the bill moves on to
+# another due date, they are carried over into total_late_fees.
+#
+# The daily run looks only at loans with an overdue bill or with fees on an
+# installment, both through indexes, so its cost follows the number of
+# overdue loans rather than the size of the book. Of those it loads and
+# recalculates a loan only when something changed since last_calculation_date:
+#   - the loan or its bill was updated
+#   - the grace period ran out, or the installment was paid or moved
+#   - a day passed and additional interest is accruing
+# Each calculation writes a FeeCalculation audit row; loans and audit rows are
+# written with bulk statements, FEE_CALCULATION_CHUNK loans per transaction.
+
+from datetime import datetime, time
+import logging
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from config import Config
+from models import db, Bill, LoanDetails, FeeCalculation
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+FEE_TYPES = ('percentage', 'fixed')
+FEE_CONFIG_FIELDS = ('late_fee_type', 'late_fee_amount', 'late_fee_grace_days', 'additional_interest_rate')
+# Model defaults, for bulk inserts that bypass the ORM
+FEE_CONFIG_DEFAULTS = {name: LoanDetails.__table__.c[name].default.arg for name in FEE_CONFIG_FIELDS}
+
+# Earlier than any stored date: stands in for a NULL last_calculation_date and bounds fee_due_date ranges
+_NEVER = datetime(1970, 1, 1)
+
+_CANDIDATE_COLUMNS = (
+    LoanDetails.id, LoanDetails.total_amount, LoanDetails.monthly_payment, LoanDetails.installments_paid,
+    LoanDetails.is_active, LoanDetails.late_fee_type, LoanDetails.late_fee_amount,
+    LoanDetails.late_fee_grace_days, LoanDetails.additional_interest_rate, LoanDetails.fee_due_date,
+    LoanDetails.current_late_fee, LoanDetails.additional_interest, LoanDetails.total_late_fees,
+    LoanDetails.last_calculation_date, LoanDetails.updated_at,
+    Bill.due_date, Bill.is_paid, Bill.updated_at.label('bill_updated_at'),
+)
+
+
+def _number(value, name, minimum=0):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f'{name} must be a number')
+    if value < minimum:
+        raise ValueError(f'{name} must be at least {minimum}')
+    return value
+
+
+def parse_fee_config(data, current_type='percentage'):
+    """
+    Validated fee configuration fields present in `data`; raises ValueError.
+    `current_type` is the loan's late_fee_type when `data` does not change it.
+    """
+    config = {}
+    if 'late_fee_type' in data:
+        if data['late_fee_type'] not in FEE_TYPES:
+            raise ValueError(f"late_fee_type must be one of {', '.join(FEE_TYPES)}")
+        config['late_fee_type'] = data['late_fee_type']
+    if 'late_fee_amount' in data:
+        config['late_fee_amount'] = float(_number(data['late_fee_amount'], 'late_fee_amount'))
+    if 'late_fee_grace_days' in data:
+        grace_days = _number(data['late_fee_grace_days'], 'late_fee_grace_days')
+        if grace_days != int(grace_days):
+            raise ValueError('late_fee_grace_days must be a whole number of days')
+        config['late_fee_grace_days'] = int(grace_days)
+    if 'additional_interest_rate' in data:
+        config['additional_interest_rate'] = float(_number(data['additional_interest_rate'], 'additional_interest_rate'))
+    if config.get('late_fee_type', current_type) == 'percentage' and config.get('late_fee_amount', 0) > 100:
+        raise ValueError('A percentage late_fee_amount must be at most 100')
+    return config
+
+
+def compute_fees(base_emi, outstanding_amount, days_overdue, late_fee_type, late_fee_amount, grace_days,
+                 additional_interest_rate):
+    """Late fee and additional interest on an installment `days_overdue` days overdue"""
+    days_past_grace = max(days_overdue - (grace_days or 0), 0)
+    late_fee = additional_interest = 0.0
+    if days_past_grace > 0:
+        if late_fee_type == 'percentage':
+            late_fee = base_emi * (late_fee_amount or 0) / 100
+        else:
+            late_fee = late_fee_amount or 0
+        if (additional_interest_rate or 0) > 0:
+            daily_rate = additional_interest_rate / 100 / 365
+            additional_interest = max(outstanding_amount, 0) * daily_rate * days_past_grace
+    return {
+        'days_overdue': days_overdue,
+        'days_past_grace': days_past_grace,
+        'late_fee': round(late_fee, 2),
+        'additional_interest': round(additional_interest, 2)
+    }
+
+
+def _evaluate(row, today):
+    """(fees, outstanding_amount, fee_due_date) for a candidate row as of `today`"""
+    outstanding = row.total_amount - (row.installments_paid or 0) * row.monthly_payment
+    overdue = row.is_active and not row.is_paid and row.due_date.date() < today
+    days_overdue = (today - row.due_date.date()).days if overdue else 0
+    fees = compute_fees(
+        row.monthly_payment, outstanding, days_overdue, row.late_fee_type, row.late_fee_amount,
+        row.late_fee_grace_days, row.additional_interest_rate
+    )
+    charged = fees['late_fee'] > 0 or fees['additional_interest'] > 0
+    return fees, outstanding, row.due_date if charged else None
+
+
+def _needs_calculation(row, today):
+    fees, _, fee_due_date = _evaluate(row, today)
+    if row.fee_due_date is None and fee_due_date is None:
+        # Not past its grace period, or nothing to charge
+        return False
+    last = row.last_calculation_date
+    if last is None or row.fee_due_date != fee_due_date:
+        return True
+    if (row.updated_at and row.updated_at > last) or (row.bill_updated_at and row.bill_updated_at > last):
+        return True
+    return fees['additional_interest'] > 0 and last.date() < today
+
+
+def _calculate(row, now, trigger):
+    """(loan update parameters, audit row) for one candidate row"""
+    fees, outstanding, fee_due_date = _evaluate(row, now.date())
+    accumulated = row.total_late_fees or 0.0
+    if row.fee_due_date is not None and (row.is_paid or not row.is_active or row.due_date != row.fee_due_date):
+        # The installment these fees were on is paid or no longer the current one
+        accumulated = round(accumulated + (row.current_late_fee or 0.0) + (row.additional_interest or 0.0), 2)
+
+    loan_update = {
+        'b_id': row.id,
+        'b_seen': row.last_calculation_date or _NEVER,
+        'b_fee_due_date': fee_due_date,
+        'b_current_late_fee': fees['late_fee'],
+        'b_additional_interest': fees['additional_interest'],
+        'b_total_late_fees': accumulated,
+        'b_now': now,
+    }
+    audit = {
+        'loan_id': row.id,
+        'calculated_at': now,
+        'trigger': trigger,
+        'due_date': row.due_date,
+        'base_emi': row.monthly_payment,
+        'outstanding_amount': round(outstanding, 2),
+        'accumulated_late_fees': accumulated,
+        'total_due': round(row.monthly_payment + accumulated + fees['late_fee'] + fees['additional_interest'], 2),
+        **fees
+    }
+    return loan_update, audit
+
+
+def _write(loan_updates, audits):
+    """
+    Store one chunk of calculations in one transaction. A loan recalculated
+    by someone else since it was read makes the chunk roll back; its loans
+    are picked up again next run. Returns whether the chunk was stored.
+    """
+    table = LoanDetails.__table__
+    statement = update(table).where(
+        table.c.id == bindparam('b_id'),
+        func.coalesce(table.c.last_calculation_date, _NEVER) == bindparam('b_seen')
+    ).values(
+        fee_due_date=bindparam('b_fee_due_date'),
+        current_late_fee=bindparam('b_current_late_fee'),
+        additional_interest=bindparam('b_additional_interest'),
+        total_late_fees=bindparam('b_total_late_fees'),
+        last_calculation_date=bindparam('b_now'),
+        # Same instant as last_calculation_date, so this write does not count as a change next run
+        updated_at=bindparam('b_now'),
+    )
+    try:
+        updated = db.session.execute(statement, loan_updates).rowcount
+        if db.engine.dialect.supports_sane_multi_rowcount and updated != len(loan_updates):
+            db.session.rollback()
+            logger.warning(f"[FEES] {len(loan_updates) - updated} loans changed during the calculation; chunk skipped")
+            return False
+        db.session.execute(insert(FeeCalculation), audits)
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def _candidates(today):
+    """
+    Loans that may need a calculation, with the change checks of
+    _needs_calculation() done in SQL so unchanged loans are never loaded:
+      - overdue loans with fees configured that carry no fees on their current installment
+      - loans carrying fees whose loan or bill changed, or whose interest has not been accrued today
+    """
+    start_of_day = datetime.combine(today, time.min)
+    last = LoanDetails.last_calculation_date
+    joined = select(*_CANDIDATE_COLUMNS).join(Bill, Bill.id == LoanDetails.bill_id)
+
+    overdue = db.session.execute(joined.where(
+        Bill.is_paid == False, Bill.due_date < start_of_day, LoanDetails.is_active == True,
+        (LoanDetails.late_fee_amount > 0) | (LoanDetails.additional_interest_rate > 0),
+        LoanDetails.fee_due_date.is_(None) | (LoanDetails.fee_due_date != Bill.due_date)
+    )).all()
+    # A range rather than IS NOT NULL, so the fee_due_date index is used
+    charged = db.session.execute(joined.where(
+        LoanDetails.fee_due_date >= _NEVER,
+        (Bill.is_paid == True) | (LoanDetails.is_active == False) | (Bill.due_date != LoanDetails.fee_due_date)
+        | last.is_(None) | (LoanDetails.updated_at > last) | (Bill.updated_at > last)
+        | ((LoanDetails.additional_interest_rate > 0) & (last < start_of_day))
+    )).all()
+
+    rows = {row.id: row for row in overdue}
+    rows.update((row.id, row) for row in charged)
+    return list(rows.values())
+
+
+class FeeCalculationService:
+    """Late fee and additional interest calculations for loans"""
+
+    @staticmethod
+    def calculate_fees_for_loan(loan_id, user_id=None, trigger='manual'):
+        """
+        Recalculate and store the fees of one loan, optionally only if it
+        belongs to `user_id`. Returns the calculation, or None when the loan
+        does not exist.
+        """
+        query = select(*_CANDIDATE_COLUMNS).join(Bill, Bill.id == LoanDetails.bill_id).where(LoanDetails.id == loan_id)
+        if user_id is not None:
+            query = query.where(Bill.user_id == user_id)
+        row = db.session.execute(query).first()
+        if row is None:
+            return None
+
+        now = datetime.utcnow()
+        loan_update, audit = _calculate(row, now, trigger)
+        if not _write([loan_update], [audit]):
+            raise RuntimeError(f'Loan {loan_id} was recalculated concurrently; retry')
+        logger.info(f"[FEES] Loan {loan_id}: late fee {audit['late_fee']}, interest {audit['additional_interest']}, "
+                    f"carried over {audit['accumulated_late_fees']}")
+        return {
+            **{key: value for key, value in audit.items() if key != 'trigger'},
+            'due_date': audit['due_date'].isoformat() if audit['due_date'] else None,
+            'calculated_at': now.isoformat()
+        }
+
+    @staticmethod
+    def update_all_overdue_loans():
+        """Daily run over overdue loans; returns counts of loans read, recalculated and skipped"""
+        now = datetime.utcnow()
+        rows = _candidates(now.date())
+        due = [row for row in rows if _needs_calculation(row, now.date())]
+
+        calculated = conflicts = 0
+        for start in range(0, len(due), Config.FEE_CALCULATION_CHUNK):
+            chunk = [_calculate(row, now, 'scheduled') for row in due[start:start + Config.FEE_CALCULATION_CHUNK]]
+            loan_updates, audits = zip(*chunk)
+            if _write(list(loan_updates), list(audits)):
+                calculated += len(chunk)
+            else:
+                conflicts += len(chunk)
+
+        stats = {'candidates': len(rows), 'calculated': calculated, 'unchanged': len(rows) - len(due),
+                 'conflicts': conflicts}
+        logger.info(f"[FEES] Daily calculation: {stats}")
+        return stats
+
+
+def scheduled_fee_calculation():
+    """Entry point for the scheduler and manual runs"""
+    return FeeCalculationService.update_all_overdue_loans()
@@ -0,0 +1,70 @@
+# generation_service.py - Deadline-bounded calls to the message generation LLM
+
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import time
+import logging
+
+from config import Config
+from circuit_breaker import CircuitBreaker
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class GenerationUnavailable(Exception):
+    """Raised when a generation call is skipped, times out or the circuit is open"""
+
+
+class GenerationService:
+    """
+    Runs LLM requests on a small worker pool so the caller never waits longer
+    than `deadline` seconds. Timeouts, errors and calls slower than
+    `slow_call_threshold` count as failures for the circuit breaker; while the
+    circuit is open, calls fail immediately and callers use their fallback text.
+    """
+
+    def __init__(self, deadline, slow_call_threshold, max_workers, breaker):
+        self.deadline = deadline
+        self.slow_call_threshold = slow_call_threshold
+        self.breaker = breaker
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='generation')
+
+    def call(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` under the deadline and circuit breaker"""
+        if not self.breaker.allow_request():
+            logger.warning("[GENERATION] Circuit open, skipping LLM call")
+            raise GenerationUnavailable('generation circuit is open')
+
+        started = time.monotonic()
+        future = self._executor.submit(fn, *args, **kwargs)
+        try:
+            result = future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            future.cancel()
+            self.breaker.record_failure()
+            logger.warning(f"[GENERATION] LLM call exceeded deadline of {self.deadline}s")
+            raise GenerationUnavailable(f'generation exceeded {self.deadline}s deadline')
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        elapsed = time.monotonic() - started
+        if elapsed > self.slow_call_threshold:
+            logger.warning(f"[GENERATION] Slow LLM call: {elapsed:.2f}s")
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return result
+
+
+generation_service = GenerationService(
+    deadline=Config.GENERATION_DEADLINE_SECONDS,
+    slow_call_threshold=Config.GENERATION_SLOW_CALL_SECONDS,
+    max_workers=Config.GENERATION_MAX_WORKERS,
+    breaker=CircuitBreaker(
+        'gemini',
+        failure_threshold=Config.GENERATION_FAILURE_THRESHOLD,
+        recovery_timeout=Config.GENERATION_RECOVERY_SECONDS
+    )
+)
@@ -0,0 +1,125 @@
+# idempotency.py - Idempotency-Key support for payment endpoints
+#
+# A client sends the same Idempotency-Key header when it retries a request.
+# The first request with a key reserves it in its own transaction before the
+# view runs. A retry then gets one of:
+#   - the stored response of the finished first request, marked with an
+#     Idempotent-Replayed header
+#   - 409 while the first request is still running
+#   - 422 when the same key comes with a different request
+# A reservation left by a request that died is taken over after
+# IDEMPOTENCY_LOCK_SECONDS. A 5xx response releases the key so the client can retry.
+
+from datetime import datetime, timedelta
+from functools import wraps
+import hashlib
+import logging
+
+from flask import Response, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+
+from config import Config
+from models import db, IdempotencyKey
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _request_hash():
+    digest = hashlib.sha256(f"{request.method} {request.path}\n".encode('utf-8'))
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _reserve(user_id, key, request_hash):
+    """
+    Reserve the key. Returns None when this request should run, otherwise the
+    response to send instead.
+    """
+    db.session.add(IdempotencyKey(user_id=user_id, key=key, request_hash=request_hash))
+    try:
+        db.session.commit()
+        return None
+    except IntegrityError:
+        db.session.rollback()
+
+    existing = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if existing is None:
+        # Released by a failed first attempt in the meantime
+        return _reserve(user_id, key, request_hash)
+    if existing.request_hash != request_hash:
+        return jsonify({'message': f'{HEADER} was already used for a different request'}), 422
+    if existing.status_code is not None:
+        logger.info(f"[IDEMPOTENCY] Replaying response for key {key} of user {user_id}")
+        return Response(
+            existing.response_body, status=existing.status_code, mimetype='application/json',
+            headers={'Idempotent-Replayed': 'true'}
+        )
+
+    # Still running, or the request that reserved it died; take over only in the latter case
+    stale_before = datetime.utcnow() - timedelta(seconds=Config.IDEMPOTENCY_LOCK_SECONDS)
+    taken = IdempotencyKey.query.filter(
+        IdempotencyKey.id == existing.id,
+        IdempotencyKey.status_code.is_(None),
+        IdempotencyKey.created_at < stale_before
+    ).update({'created_at': datetime.utcnow()}, synchronize_session=False)
+    db.session.commit()
+    if taken:
+        logger.warning(f"[IDEMPOTENCY] Taking over abandoned key {key} of user {user_id}")
+        return None
+    return jsonify({'message': 'A request with this Idempotency-Key is still in progress'}), 409
+
+
+def idempotent(view):
+    """Honour the Idempotency-Key header on a view; place it below @jwt_required()"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'message': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        user_id = get_jwt_identity()
+        blocked = _reserve(user_id, key, _request_hash())
+        if blocked is not None:
+            return blocked
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _release(user_id, key)
+            raise
+
+        if response.status_code >= 500:
+            _release(user_id, key)
+        else:
+            db.session.rollback()
+            IdempotencyKey.query.filter_by(user_id=user_id, key=key).update({
+                'status_code': response.status_code,
+                'response_body': response.get_data(as_text=True)
+            }, synchronize_session=False)
+            db.session.commit()
+        return response
+    return wrapper
+
+
+def _release(user_id, key):
+    db.session.rollback()
+    IdempotencyKey.query.filter_by(user_id=user_id, key=key).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def prune_idempotency_keys():
+    """Forget keys older than IDEMPOTENCY_KEY_HOURS"""
+    cutoff = datetime.utcnow() - timedelta(hours=Config.IDEMPOTENCY_KEY_HOURS)
+    removed = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    if removed:
+        logger.info(f"[IDEMPOTENCY] Pruned {removed} keys older than {cutoff}")
+    return removed
@@ -0,0 +1,147 @@
+# job_queue.py - Background execution of slow reminder work with pollable job status
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import json
+import threading
+import time
+import uuid
+import logging
+
+from flask import current_app
+
+from config import Config
+from models import db, ReminderJob
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+
+class JobQueue:
+    """
+    Work runs on a bounded thread pool in the process that accepted it, so web
+    workers return immediately. Job state is kept in the reminder_job table,
+    so with several worker processes (or after a restart) any of them can
+    answer a status request. Callers poll or long-poll the job by id.
+    Finished jobs are deleted after `ttl_seconds`; a job still unfinished by
+    then was lost with its process and is reported failed.
+    """
+
+    def __init__(self, max_workers, ttl_seconds, poll_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.poll_seconds = poll_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='reminder-job')
+        # Notified when a job run by this process finishes, to wake local long-polls early
+        self._condition = threading.Condition()
+
+    def submit(self, user_id, kind, fn, *args, **kwargs):
+        """
+        Queue `fn(*args, **kwargs)`. It must return (payload, status_code),
+        the same pair the synchronous endpoint used to return. Must be called
+        inside an application context.
+        """
+        self._purge_expired()
+        job = ReminderJob(id=str(uuid.uuid4()), user_id=user_id, kind=kind, status=QUEUED)
+        db.session.add(job)
+        db.session.commit()
+        self._executor.submit(self._run, current_app._get_current_object(), job.id, fn, args, kwargs)
+        logger.info(f"[JOB QUEUE] Queued {kind} job {job.id} for user {user_id}")
+        return job.id
+
+    def _run(self, app, job_id, fn, args, kwargs):
+        with app.app_context():
+            self._update(job_id, RUNNING)
+            try:
+                payload, status_code = fn(*args, **kwargs)
+                state = SUCCEEDED if status_code < 400 else FAILED
+                self._update(job_id, state, payload, status_code)
+                logger.info(f"[JOB QUEUE] Job {job_id} finished: {state}")
+            except Exception as e:
+                logger.error(f"[JOB QUEUE ERROR] Job {job_id} raised: {str(e)}", exc_info=True)
+                self._update(job_id, FAILED, {'status': 'error', 'message': str(e)}, 500)
+
+    def _update(self, job_id, status, result=None, result_status=None):
+        values = {'status': status}
+        if status in FINISHED_STATES:
+            values.update(
+                result=json.dumps(result, default=str),
+                result_status=result_status,
+                finished_at=datetime.utcnow()
+            )
+        try:
+            ReminderJob.query.filter_by(id=job_id).update(values)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"[JOB QUEUE ERROR] Failed to store state {status} for job {job_id}: {str(e)}", exc_info=True)
+        if status in FINISHED_STATES:
+            with self._condition:
+                self._condition.notify_all()
+
+    def get(self, job_id, user_id, wait=0):
+        """
+        Public view of a job owned by `user_id`, or None. With `wait` > 0 this
+        long-polls: it blocks until the job finishes or `wait` seconds pass.
+        Must be called inside an application context.
+        """
+        deadline = time.monotonic() + max(0, wait)
+        while True:
+            job = db.session.get(ReminderJob, job_id, populate_existing=True)
+            if job is None or job.user_id != user_id:
+                return None
+            remaining = deadline - time.monotonic()
+            if job.status in FINISHED_STATES or remaining <= 0:
+                return _job_view(job)
+            # End the read transaction so the next read sees the worker's commit
+            db.session.rollback()
+            with self._condition:
+                self._condition.wait(min(remaining, self.poll_seconds))
+
+    def _purge_expired(self):
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.ttl_seconds)
+        try:
+            expired = ReminderJob.query.filter(ReminderJob.finished_at < cutoff).delete()
+            lost = ReminderJob.query.filter(
+                ReminderJob.finished_at.is_(None),
+                ReminderJob.created_at < cutoff
+            ).update({
+                'status': FAILED,
+                'result': json.dumps({'status': 'error', 'message': 'Job did not finish; its worker may have restarted'}),
+                'result_status': 500,
+                'finished_at': now
+            })
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"[JOB QUEUE ERROR] Failed to purge expired jobs: {str(e)}", exc_info=True)
+            return
+        if expired or lost:
+            logger.debug(f"[JOB QUEUE] Purged {expired} expired jobs, marked {lost} lost jobs failed")
+
+
+def _job_view(job):
+    return {
+        'id': job.id,
+        'user_id': job.user_id,
+        'kind': job.kind,
+        'status': job.status,
+        'result': json.loads(job.result) if job.result else None,
+        'result_status': job.result_status,
+        'created_at': job.created_at.isoformat(),
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+reminder_jobs = JobQueue(
+    max_workers=Config.REMINDER_JOB_WORKERS,
+    ttl_seconds=Config.REMINDER_JOB_TTL_SECONDS,
+    poll_seconds=Config.REMINDER_JOB_POLL_SECONDS
+)
@@ -3,8 +3,18 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, LoanDetails, Bill
+from pagination import parse_page_args, apply_bill_filters, keyset_page
+from sync import collection_etag, not_modified
+from serializers import LOAN_COLUMNS, loan_row, json_response
+from batch_operations import check_batch, pay_loan_installments, batch_response
+from dashboard_summary import invalidate_summary
+from idempotency import idempotent
+from amortization import loan_schedule, schedule_position, schedule_rows
+from fee_calculation_service import FeeCalculationService, FEE_CONFIG_FIELDS, parse_fee_config
 import logging
+from sqlalchemy import func, select, update
 from sqlalchemy.exc import IntegrityError
+from datetime import datetime
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,63 +25,212 @@ loans_bp = Blueprint('loans', __name__)
 @loans_bp.route('/loans', methods=['GET'])
 @jwt_required()
 def get_loans():
-    """Get all active loan details for the authenticated user."""
+    """
+    One page of active loans for the authenticated user, ordered by the bill's
+    (due_date, id). Takes the same limit, cursor and filter parameters as
+    GET /api/bills.
+    """
     user_id = get_jwt_identity()
-    logger.info(f"[LOANS GET] Request to get loans for user_id: {user_id}")
+    logger.info(f"[LOANS GET] Request to get loans for user_id: {user_id}, args: {dict(request.args)}")
 
     try:
-        loans = db.session.query(Bill, LoanDetails).join(
-            LoanDetails, Bill.id == LoanDetails.bill_id
-        ).filter(Bill.user_id == user_id, LoanDetails.is_active == True).all()
-
-        loans_data = []
-        for bill, loan in loans:
-            loans_data.append({
-                'bill_id': bill.id,
-                'bill_name': bill.name,
-                'total_amount': loan.total_amount,
-                'monthly_payment': loan.monthly_payment,
-                'total_installments': loan.total_installments,
-                'installments_paid': loan.installments_paid,
-                'interest_rate_percent': loan.interest_rate_percent,
-                'amount_remaining': loan.amount_remaining,
-                'is_active': loan.is_active
-            })
+        limit, after = parse_page_args(request.args)
+        query = apply_bill_filters(
+            db.session.query(*LOAN_COLUMNS).join(
+                LoanDetails, Bill.id == LoanDetails.bill_id
+            ).filter(Bill.user_id == user_id, LoanDetails.is_active == True),
+            request.args
+        )
+    except ValueError as e:
+        logger.warning(f"[LOANS GET] Bad query parameters: {str(e)}")
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        etag = collection_etag('loans', user_id, request.args)
+        if not_modified(request, etag):
+            logger.info(f"[LOANS GET] Not modified for user {user_id}")
+            return '', 304, {'ETag': f'W/"{etag}"'}
+
+        loans, next_cursor = keyset_page(query, limit, after)
+
+        loans_data = [loan_row(row) for row in loans]
 
         logger.info(f"[LOANS GET] Found {len(loans_data)} active loans for user {user_id}")
-        return jsonify(loans_data), 200
+        response = json_response(loans_data)
+        response.set_etag(etag, weak=True)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response, 200
 
     except Exception as e:
         logger.error(f"[LOANS GET ERROR] Failed to fetch loans for user {user_id}: {str(e)}", exc_info=True)
         return jsonify({'message': 'Failed to fetch loan data'}), 500
 
 
+@loans_bp.route('/loans/<loan_id>/schedule', methods=['GET'])
+@jwt_required()
+def get_loan_schedule(loan_id):
+    """
+    Amortisation schedule of a loan with the principal outstanding after the
+    installments paid so far. Pass rows=false for the totals only.
+    """
+    user_id = get_jwt_identity()
+    logger.info(f"[LOANS SCHEDULE] Request for loan {loan_id} by user {user_id}")
+
+    found = db.session.query(LoanDetails, Bill.due_date).join(Bill, Bill.id == LoanDetails.bill_id).filter(
+        LoanDetails.id == loan_id, Bill.user_id == user_id
+    ).first()
+    if not found:
+        return jsonify({'message': 'Loan not found or access denied'}), 404
+    loan, next_due_date = found
+
+    schedule = loan_schedule(loan)
+    result = {
+        'loan_id': loan.id,
+        'bill_id': loan.bill_id,
+        'principal': loan.total_amount,
+        'monthly_payment': loan.monthly_payment,
+        'interest_rate_percent': loan.interest_rate_percent or 0,
+        'total_installments': loan.total_installments,
+        'periods': int(schedule['balance'].size),
+        **schedule_position(loan, schedule)
+    }
+    if request.args.get('rows', 'true').lower() not in ('0', 'false', 'no'):
+        result['schedule'] = schedule_rows(loan, next_due_date, schedule)
+    return json_response(result)
+
+
+def _fee_config(loan):
+    return {
+        'loan_id': loan.id,
+        **{name: getattr(loan, name) for name in FEE_CONFIG_FIELDS},
+        'fee_due_date': loan.fee_due_date.isoformat() if loan.fee_due_date else None,
+        'current_late_fee': loan.current_late_fee or 0.0,
+        'additional_interest': loan.additional_interest or 0.0,
+        'total_late_fees': loan.total_late_fees or 0.0,
+        'last_calculation_date': loan.last_calculation_date.isoformat() if loan.last_calculation_date else None
+    }
+
+
+@loans_bp.route('/loans/<loan_id>/config', methods=['GET', 'PUT'])
+@jwt_required()
+def loan_fee_config(loan_id):
+    """
+    Late fee configuration of a loan with its current fees. PUT takes any of
+    late_fee_type, late_fee_amount, late_fee_grace_days and
+    additional_interest_rate; the fees follow at the next calculation.
+    """
+    user_id = get_jwt_identity()
+    loan = LoanDetails.query.join(Bill, Bill.id == LoanDetails.bill_id).filter(
+        LoanDetails.id == loan_id, Bill.user_id == user_id
+    ).first()
+    if not loan:
+        return jsonify({'message': 'Loan not found or access denied'}), 404
+    if request.method == 'GET':
+        return jsonify(_fee_config(loan)), 200
+
+    try:
+        changes = parse_fee_config(request.get_json(silent=True) or {}, loan.late_fee_type)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    logger.info(f"[LOANS CONFIG] Updating fee configuration of loan {loan_id}: {changes}")
+
+    try:
+        for name, value in changes.items():
+            setattr(loan, name, value)
+        db.session.commit()
+        return jsonify(_fee_config(loan)), 200
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"[LOANS CONFIG ERROR] Failed to update loan {loan_id}: {str(e)}", exc_info=True)
+        return jsonify({'message': 'Failed to update loan configuration'}), 500
+
+
+@loans_bp.route('/loans/<loan_id>/calculate', methods=['POST'])
+@jwt_required()
+def calculate_loan_fees(loan_id):
+    """Recalculate the late fee and additional interest of a loan now and return the dues"""
+    user_id = get_jwt_identity()
+    logger.info(f"[LOANS CALCULATE] Fee calculation for loan {loan_id} requested by user {user_id}")
+
+    try:
+        calculation = FeeCalculationService.calculate_fees_for_loan(loan_id, user_id)
+    except RuntimeError as e:
+        return jsonify({'message': str(e)}), 409
+    except Exception as e:
+        logger.error(f"[LOANS CALCULATE ERROR] Failed to calculate fees for loan {loan_id}: {str(e)}", exc_info=True)
+        return jsonify({'message': 'Failed to calculate fees'}), 500
+    if calculation is None:
+        return jsonify({'message': 'Loan not found or access denied'}), 404
+    return jsonify(calculation), 200
+
+
 @loans_bp.route('/loans/<loan_id>/pay', methods=['POST'])
 @jwt_required()
+@idempotent
 def pay_loan_installment(loan_id):
-    """Increments the installments paid for a specific loan."""
+    """
+    Increments the installments paid for a specific loan. The increment and
+    the fully-paid check are one conditional UPDATE, so concurrent requests
+    cannot lose an installment or go past the total.
+    """
     user_id = get_jwt_identity()
     logger.info(f"[LOANS PAY] Request to mark installment paid for loan: {loan_id} by user: {user_id}")
 
-    loan = LoanDetails.query.get(loan_id)
-    if not loan or loan.bill.user_id != user_id:
-        return jsonify({'message': 'Loan not found or access denied'}), 404
-    
-    if loan.installments_paid >= loan.total_installments:
-        return jsonify({'message': 'Loan is already fully paid'}), 400
-
-    loan.installments_paid += 1
-    
     try:
+        paid = func.coalesce(LoanDetails.installments_paid, 0)
+        row = db.session.execute(
+            update(LoanDetails)
+            .where(
+                LoanDetails.id == loan_id,
+                LoanDetails.bill_id.in_(select(Bill.id).where(Bill.user_id == user_id)),
+                paid < LoanDetails.total_installments
+            )
+            .values(installments_paid=paid + 1, updated_at=datetime.utcnow())
+            .returning(LoanDetails.installments_paid, LoanDetails.total_installments,
+                       LoanDetails.total_amount, LoanDetails.monthly_payment),
+            execution_options={'synchronize_session': False}
+        ).first()
+
+        if row is None:
+            db.session.rollback()
+            owned = db.session.query(LoanDetails.id).join(Bill, Bill.id == LoanDetails.bill_id).filter(
+                LoanDetails.id == loan_id, Bill.user_id == user_id
+            ).first()
+            if not owned:
+                return jsonify({'message': 'Loan not found or access denied'}), 404
+            return jsonify({'message': 'Loan is already fully paid'}), 400
+
         db.session.commit()
-        logger.info(f"[LOANS PAY] Installment marked as paid for loan {loan_id}. Paid: {loan.installments_paid}/{loan.total_installments}")
+        invalidate_summary(user_id)
+        installments_paid, total_installments, total_amount, monthly_payment = row
+        logger.info(f"[LOANS PAY] Installment marked as paid for loan {loan_id}. Paid: {installments_paid}/{total_installments}")
 
         return jsonify({
             'message': 'Installment marked as paid successfully',
-            'installments_paid': loan.installments_paid,
-            'amount_remaining': loan.amount_remaining
+            'installments_paid': installments_paid,
+            'amount_remaining': total_amount - (installments_paid * monthly_payment)
         }), 200
     except Exception as e:
         db.session.rollback()
         logger.error(f"[LOANS PAY ERROR] Failed to mark installment paid for loan {loan_id}: {str(e)}", exc_info=True)
         return jsonify({'message': 'Failed to update loan status'}), 500
+
+
+@loans_bp.route('/loans/batch/pay', methods=['POST'])
+@jwt_required()
+@idempotent
+def pay_loan_installments_batch():
+    """Record installments on many loans. Body: {"payments": [{"loan_id": ..., "installments": 1}, ...]}"""
+    user_id = get_jwt_identity()
+    items = (request.get_json(silent=True) or {}).get('payments')
+    error = check_batch(items, 'payments')
+    if error:
+        return jsonify({'message': error}), 400
+    logger.info(f"[LOANS BATCH PAY] Request from user_id: {user_id} with {len(items)} payments")
+
+    try:
+        results = pay_loan_installments(user_id, items)
+    except Exception as e:
+        return jsonify({'message': 'Failed to update loans', 'error': str(e)}), 500
+    return jsonify(batch_response(results)), 200
@@ -0,0 +1,267 @@
+# migrations.py - Versioned schema changes for existing databases
+#
+# db.create_all() only creates missing tables; it never changes a table that
+# already exists. Schema changes to existing tables go here as numbered
+# migrations. The schema_version table records which ones a database has had.
+# The app applies pending migrations at startup. To do it by hand, or to
+# check the hot queries for table scans, sorts and cross-user searches, run:
+#
+#   python migrations.py            # apply pending migrations
+#   python migrations.py --status   # show the current version
+#   python migrations.py --explain  # print query plans for the hot queries
+
+from datetime import datetime
+import argparse
+import logging
+
+from sqlalchemy import inspect, text
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+
+def _add_column(table, column, ddl, backfill=None):
+    """Step adding a column unless create_all() already made it; `backfill` is SQL run after adding"""
+    def step(connection):
+        if column in {c['name'] for c in inspect(connection).get_columns(table)}:
+            return
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+        if backfill:
+            connection.execute(text(backfill), {'now': datetime.utcnow()})
+    return step
+
+
+def _create_table(table_name):
+    def step(connection):
+        from models import db
+        db.metadata.tables[table_name].create(connection, checkfirst=True)
+    return step
+
+
+# (version, description, steps); a step is a SQL string or a callable taking the connection
+MIGRATIONS = [
+    (1, 'Indexes for the scheduler and list endpoint query shapes', [
+        'CREATE INDEX IF NOT EXISTS ix_bill_user_due ON bill (user_id, due_date, id)',
+        'CREATE INDEX IF NOT EXISTS ix_bill_user_paid_due ON bill (user_id, is_paid, due_date)',
+        'CREATE INDEX IF NOT EXISTS ix_bill_paid_due ON bill (is_paid, due_date)',
+        'CREATE INDEX IF NOT EXISTS ix_bill_paid_frequency ON bill (is_paid, frequency)',
+        'CREATE INDEX IF NOT EXISTS ix_payment_bill_date ON payment (bill_id, payment_date)',
+        'CREATE INDEX IF NOT EXISTS ix_reminder_settings_user ON reminder_settings (user_id)',
+        'CREATE INDEX IF NOT EXISTS ix_loan_details_active ON loan_details (is_active, bill_id)',
+        'CREATE INDEX IF NOT EXISTS ix_reminder_content_send_date ON reminder_content (send_date)',
+    ]),
+    (2, 'updated_at tracking and tombstones for delta sync', [
+        _add_column('bill', 'updated_at', 'DATETIME',
+                    'UPDATE bill SET updated_at = COALESCE(created_at, :now) WHERE updated_at IS NULL'),
+        _add_column('loan_details', 'updated_at', 'DATETIME',
+                    'UPDATE loan_details SET updated_at = :now WHERE updated_at IS NULL'),
+        _add_column('payment', 'updated_at', 'DATETIME',
+                    'UPDATE payment SET updated_at = COALESCE(created_at, :now) WHERE updated_at IS NULL'),
+        'CREATE INDEX IF NOT EXISTS ix_bill_user_updated ON bill (user_id, updated_at)',
+        'CREATE INDEX IF NOT EXISTS ix_loan_details_updated ON loan_details (updated_at)',
+        'CREATE INDEX IF NOT EXISTS ix_payment_updated ON payment (updated_at)',
+        _create_table('tombstone'),
+    ]),
+    (3, 'Idempotency keys for payment endpoints', [
+        _create_table('idempotency_key'),
+    ]),
+    (4, 'Index for incremental portfolio forecasts', [
+        'CREATE INDEX IF NOT EXISTS ix_bill_updated ON bill (updated_at)',
+    ]),
+    (5, 'Late fee configuration, fee state and the fee calculation audit', [
+        _add_column('loan_details', 'late_fee_type', "VARCHAR(20) DEFAULT 'percentage'"),
+        _add_column('loan_details', 'late_fee_amount', 'FLOAT DEFAULT 0'),
+        _add_column('loan_details', 'late_fee_grace_days', 'INTEGER DEFAULT 3'),
+        _add_column('loan_details', 'additional_interest_rate', 'FLOAT DEFAULT 0'),
+        _add_column('loan_details', 'fee_due_date', 'DATETIME'),
+        _add_column('loan_details', 'current_late_fee', 'FLOAT DEFAULT 0'),
+        _add_column('loan_details', 'additional_interest', 'FLOAT DEFAULT 0'),
+        _add_column('loan_details', 'total_late_fees', 'FLOAT DEFAULT 0'),
+        _add_column('loan_details', 'last_calculation_date', 'DATETIME'),
+        'CREATE INDEX IF NOT EXISTS ix_loan_details_fee_due ON loan_details (fee_due_date)',
+        _create_table('fee_calculation'),
+    ]),
+    (6, 'Manual reminder job state', [
+        _create_table('reminder_job'),
+    ]),
+    (7, 'Start loan pages from the user index and page changes without sorting', [
+        # Led the planner into every user's active loans before the user filter
+        'DROP INDEX IF EXISTS ix_loan_details_active',
+        'DROP INDEX IF EXISTS ix_bill_user_updated',
+        'CREATE INDEX IF NOT EXISTS ix_bill_user_updated ON bill (user_id, updated_at, id)',
+    ]),
+]
+
+# The queries the scheduler and API run most, with representative parameters
+HOT_QUERIES = {
+    'bills page (GET /api/bills)': (
+        'SELECT * FROM bill WHERE user_id = :user_id '
+        'AND (due_date > :due_date OR (due_date = :due_date AND id > :id)) '
+        'ORDER BY due_date, id LIMIT 101',
+        {'user_id': 'u', 'due_date': '2024-01-01 00:00:00', 'id': ''}
+    ),
+    'reminder tick: unpaid bills of a user': (
+        'SELECT * FROM bill WHERE user_id = :user_id AND is_paid = 0',
+        {'user_id': 'u'}
+    ),
+    'reminder settings of a user': (
+        'SELECT * FROM reminder_settings WHERE user_id = :user_id LIMIT 1',
+        {'user_id': 'u'}
+    ),
+    'overdue check': (
+        'SELECT * FROM bill WHERE is_paid = 0 AND due_date < :now',
+        {'now': '2024-01-01 00:00:00'}
+    ),
+    'recurring generation': (
+        "SELECT * FROM bill WHERE is_paid = 1 AND frequency IN ('weekly', 'monthly', 'quarterly', 'yearly')",
+        {}
+    ),
+    'pre-generation window': (
+        'SELECT * FROM bill JOIN user ON bill.user_id = user.id '
+        'JOIN reminder_settings ON reminder_settings.user_id = user.id '
+        'WHERE user.phone_number IS NOT NULL AND bill.is_paid = 0 '
+        'AND bill.due_date >= :start AND bill.due_date < :end',
+        {'start': '2024-01-01 00:00:00', 'end': '2024-01-05 00:00:00'}
+    ),
+    'active loans page (GET /api/loans)': (
+        'SELECT * FROM bill JOIN loan_details ON bill.id = loan_details.bill_id '
+        'WHERE bill.user_id = :user_id AND loan_details.is_active = 1 '
+        'ORDER BY bill.due_date, bill.id LIMIT 101',
+        {'user_id': 'u'}
+    ),
+    'payments of a bill': (
+        'SELECT * FROM payment WHERE bill_id = :bill_id ORDER BY payment_date',
+        {'bill_id': 'b'}
+    ),
+    'bill changes page (GET /api/bills/changes)': (
+        'SELECT * FROM bill WHERE user_id = :user_id AND updated_at > :since '
+        'AND (updated_at > :updated_at OR (updated_at = :updated_at AND id > :id)) '
+        'ORDER BY updated_at, id LIMIT 101',
+        {'user_id': 'u', 'since': '2024-01-01 00:00:00', 'updated_at': '2024-01-01 00:00:00', 'id': ''}
+    ),
+    'daily fees: overdue loans': (
+        'SELECT * FROM loan_details JOIN bill ON bill.id = loan_details.bill_id '
+        'WHERE bill.is_paid = 0 AND bill.due_date < :today AND loan_details.is_active = 1',
+        {'today': '2024-01-01 00:00:00'}
+    ),
+    'daily fees: loans carrying fees': (
+        'SELECT * FROM loan_details JOIN bill ON bill.id = loan_details.bill_id '
+        'WHERE loan_details.fee_due_date >= :never',
+        {'never': '1970-01-01 00:00:00'}
+    ),
+    'stale reminder content purge': (
+        'SELECT id FROM reminder_content WHERE send_date < :today',
+        {'today': '2024-01-01'}
+    ),
+}
+
+
+def _ensure_version_table(connection):
+    connection.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_version ('
+        ' version INTEGER PRIMARY KEY,'
+        ' description VARCHAR(255) NOT NULL,'
+        ' applied_at DATETIME NOT NULL)'
+    ))
+
+
+def current_version(connection):
+    _ensure_version_table(connection)
+    return connection.execute(text('SELECT COALESCE(MAX(version), 0) FROM schema_version')).scalar()
+
+
+def run_migrations(engine):
+    """Apply every migration newer than the database's version, each in its own transaction"""
+    applied = []
+    with engine.begin() as connection:
+        version = current_version(connection)
+
+    for migration_version, description, steps in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        logger.info(f"[MIGRATIONS] Applying {migration_version}: {description}")
+        with engine.begin() as connection:
+            for step in steps:
+                if callable(step):
+                    step(connection)
+                else:
+                    connection.execute(text(step))
+            connection.execute(
+                text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': migration_version, 'd': description, 't': datetime.utcnow()}
+            )
+        applied.append(migration_version)
+
+    if applied:
+        logger.info(f"[MIGRATIONS] Database is now at version {applied[-1]}")
+    else:
+        logger.debug(f"[MIGRATIONS] Database is up to date at version {version}")
+    return applied
+
+
+def explain_hot_queries(engine):
+    """
+    Query plan of every hot query. Returns {name: (plan_lines, problems)}
+    where `problems` lists tables read without an index, sorts the index
+    order does not cover, and (on sqlite) queries for one user whose plan
+    does not start from an index on user_id.
+    """
+    plans = {}
+    with engine.connect() as connection:
+        for name, (sql, params) in HOT_QUERIES.items():
+            if engine.dialect.name == 'sqlite':
+                rows = connection.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+                lines = [row[-1] for row in rows]
+                # 'SCAN bill' is a full table scan; 'SEARCH ... USING INDEX' and 'SCAN ... USING INDEX' are not
+                problems = [
+                    f'table scan of {line.split()[1]}' for line in lines
+                    if line.startswith('SCAN') and 'USING' not in line
+                ]
+                problems += [line for line in lines if line.startswith('USE TEMP B-TREE')]
+                # A per-user query that starts from another index reads every user's rows first
+                if 'user_id' in params and lines and 'user_id=' not in lines[0]:
+                    problems.append(f'not limited to one user: {lines[0]}')
+            else:
+                rows = connection.execute(text('EXPLAIN ' + sql), params).fetchall()
+                lines = [' '.join(str(col) for col in row) for row in rows]
+                problems = [
+                    line for line in lines
+                    if 'Seq Scan' in line or 'ALL' in line.split() or 'Using filesort' in line
+                    or line.lstrip(' ->').startswith('Sort ')
+                ]
+            plans[name] = (lines, problems)
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply schema migrations and inspect query plans')
+    parser.add_argument('--status', action='store_true', help='Print the schema version and exit')
+    parser.add_argument('--explain', action='store_true', help='Print query plans for the hot queries')
+    args = parser.parse_args()
+
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        engine = db.engine
+        if args.status:
+            with engine.begin() as connection:
+                print(f"Schema version: {current_version(connection)} (latest: {MIGRATIONS[-1][0]})")
+            return
+
+        db.create_all()
+        applied = run_migrations(engine)
+        print(f"Applied migrations: {applied or 'none'}")
+
+        if args.explain:
+            for name, (lines, problems) in explain_hot_queries(engine).items():
+                print(f"\n{name}{'  <-- ' + '; '.join(problems) if problems else ''}")
+                for line in lines:
+                    print(f"    {line}")
+
+
+if __name__ == '__main__':
+    main()
@@ -52,6 +52,7 @@ class Bill(db.Model):
     is_paid = db.Column(db.Boolean, default=False)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     loan_details = db.relationship('LoanDetails', backref='bill', uselist=False, cascade='all, delete-orphan')
 
@@ -63,6 +64,23 @@ class Bill(db.Model):
     enable_local_notification = db.Column(db.Boolean, default=True)
     
     payments = db.relationship('Payment', backref='bill', lazy=True, cascade='all, delete-orphan')
+    reminder_contents = db.relationship('ReminderContent', backref='bill', lazy=True, cascade='all, delete-orphan')
+
+    # Shapes of the hot bill queries; migrations.py creates these on existing databases
+    __table_args__ = (
+        # GET /api/bills pages: user_id = ? ORDER BY due_date, id
+        db.Index('ix_bill_user_due', 'user_id', 'due_date', 'id'),
+        # Reminder tick: user_id = ? AND is_paid = 0
+        db.Index('ix_bill_user_paid_due', 'user_id', 'is_paid', 'due_date'),
+        # Overdue check and pre-generation window: is_paid = 0 AND due_date < / BETWEEN
+        db.Index('ix_bill_paid_due', 'is_paid', 'due_date'),
+        # Recurring generation: is_paid = 1 AND frequency IN (...)
+        db.Index('ix_bill_paid_frequency', 'is_paid', 'frequency'),
+        # GET /api/bills/changes pages and list ETags: user_id = ? AND updated_at > ? ORDER BY updated_at, id
+        db.Index('ix_bill_user_updated', 'user_id', 'updated_at', 'id'),
+        # Incremental portfolio forecast: updated_at > ? across all users
+        db.Index('ix_bill_updated', 'updated_at'),
+    )
     
     def __init__(self, **kwargs):
         super(Bill, self).__init__(**kwargs)
@@ -107,6 +125,12 @@ class Payment(db.Model):
     payment_method = db.Column(db.String(50))
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_payment_bill_date', 'bill_id', 'payment_date'),
+        db.Index('ix_payment_updated', 'updated_at'),
+    )
     
     def __init__(self, **kwargs):
         super(Payment, self).__init__(**kwargs)
@@ -139,6 +163,10 @@ class ReminderSettings(db.Model):
     preferred_time = db.Column(db.String(5), default='09:00')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_reminder_settings_user', 'user_id'),
+    )
+    
     def __init__(self, **kwargs):
         super(ReminderSettings, self).__init__(**kwargs)
         logger.info(f"[REMINDER SETTINGS] Creating settings for user: {kwargs.get('user_id')}")
@@ -227,10 +255,140 @@ class LoanDetails(db.Model):
     installments_paid = db.Column(db.Integer, default=0)
     interest_rate_percent = db.Column(db.Float, default=0)
     is_active = db.Column(db.Boolean, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Late fee configuration; 'percentage' fees are a percentage of the installment
+    late_fee_type = db.Column(db.String(20), default='percentage')
+    late_fee_amount = db.Column(db.Float, default=0.0)
+    late_fee_grace_days = db.Column(db.Integer, default=3)
+    # Yearly rate charged daily on the amount remaining once the grace period is over
+    additional_interest_rate = db.Column(db.Float, default=0.0)
+
+    # Fees on the overdue installment due on fee_due_date; NULL when no installment is past its grace period
+    fee_due_date = db.Column(db.DateTime)
+    current_late_fee = db.Column(db.Float, default=0.0)
+    additional_interest = db.Column(db.Float, default=0.0)
+    # Fees carried over from earlier installments
+    total_late_fees = db.Column(db.Float, default=0.0)
+    last_calculation_date = db.Column(db.DateTime)
+
+    # GET /api/loans pages start from ix_bill_user_due and join here on the unique bill_id;
+    # an index led by is_active would pull the planner into every user's loans first
+    __table_args__ = (
+        db.Index('ix_loan_details_updated', 'updated_at'),
+        # Daily fee run: loans carrying fees on an installment
+        db.Index('ix_loan_details_fee_due', 'fee_due_date'),
+    )
 
     @property
     def amount_remaining(self):
         return self.total_amount - (self.installments_paid * self.monthly_payment)
 
     def __repr__(self):
-        return f'<LoanDetails {self.id}: Bill {self.bill_id}>'
\ No newline at end of file
+        return f'<LoanDetails {self.id}: Bill {self.bill_id}>'
+
+
+# Reminder content generated off-peak for a given send date
+class ReminderContent(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    bill_id = db.Column(db.String(36), db.ForeignKey('bill.id'), nullable=False)
+    send_date = db.Column(db.Date, nullable=False)
+    # Hash of the inputs the message was generated from; a mismatch at send time means the bill changed
+    fingerprint = db.Column(db.String(64), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    audio_path = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('bill_id', 'send_date', name='uq_reminder_content_bill_date'),
+        # Stale-content purge: send_date < today
+        db.Index('ix_reminder_content_send_date', 'send_date'),
+    )
+
+    def __repr__(self):
+        return f'<ReminderContent {self.id}: Bill {self.bill_id} on {self.send_date}>'
+
+
+# Deleted rows, kept for a while so GET /api/bills/changes can report deletions
+class Tombstone(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(36), nullable=False)
+    # 'bill', 'loan' or 'payment'
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.String(36), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_tombstone_user_deleted', 'user_id', 'deleted_at'),
+    )
+
+    def __repr__(self):
+        return f'<Tombstone {self.entity} {self.entity_id}>'
+
+
+# One row per fee calculation of a loan; kept when the loan is deleted
+class FeeCalculation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    loan_id = db.Column(db.String(36), nullable=False)
+    calculated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # 'scheduled' or 'manual'
+    trigger = db.Column(db.String(20), nullable=False)
+    due_date = db.Column(db.DateTime)
+    days_overdue = db.Column(db.Integer, nullable=False)
+    days_past_grace = db.Column(db.Integer, nullable=False)
+    base_emi = db.Column(db.Float, nullable=False)
+    outstanding_amount = db.Column(db.Float, nullable=False)
+    late_fee = db.Column(db.Float, nullable=False)
+    additional_interest = db.Column(db.Float, nullable=False)
+    # Fees carried over from earlier installments at the time of the calculation
+    accumulated_late_fees = db.Column(db.Float, nullable=False)
+    total_due = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_fee_calculation_loan_time', 'loan_id', 'calculated_at'),
+    )
+
+    def __repr__(self):
+        return f'<FeeCalculation {self.id}: Loan {self.loan_id} at {self.calculated_at}>'
+
+
+# Responses of requests sent with an Idempotency-Key header, replayed when the key is reused
+class IdempotencyKey(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(36), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    # Hash of method, path and body; the same key with a different request is rejected
+    request_hash = db.Column(db.String(64), nullable=False)
+    # Both NULL while the first request with this key is still running
+    status_code = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_key_user_key'),
+        db.Index('ix_idempotency_key_created', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key}: User {self.user_id}>'
+
+
+# Manual reminder jobs (POST /api/reminders/test and /send); stored here so any worker can report them
+class ReminderJob(db.Model):
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    # queued, running, succeeded or failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    # JSON payload and HTTP status the endpoint would have answered with
+    result = db.Column(db.Text)
+    result_status = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_reminder_job_created', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<ReminderJob {self.id}: {self.kind} {self.status}>'
@@ -0,0 +1,119 @@
+# pagination.py - Keyset pagination and list filters shared by the bill and loan endpoints
+
+from datetime import datetime, timedelta
+import base64
+import json
+
+from sqlalchemy import and_, or_
+
+from config import Config
+from models import Bill
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def encode_token(payload):
+    """Opaque URL-safe token carrying a small JSON payload"""
+    data = json.dumps(payload, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    """The payload of encode_token(); raises ValueError when it is malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def encode_cursor(due_date, row_id):
+    """Opaque cursor pointing just after (due_date, id)"""
+    return encode_token({'d': due_date.isoformat(), 'i': row_id})
+
+
+def decode_cursor(cursor):
+    """(due_date, id) from a cursor; raises ValueError when it is malformed"""
+    try:
+        payload = decode_token(cursor)
+        return datetime.fromisoformat(payload['d']), str(payload['i'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'{name} must be a date in YYYY-MM-DD format')
+
+
+def _parse_bool(value, name):
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f'{name} must be true or false')
+
+
+def parse_limit(args):
+    """Page size from the query string, capped at PAGE_SIZE_MAX; raises ValueError on bad input"""
+    try:
+        limit = int(args.get('limit', Config.PAGE_SIZE_DEFAULT))
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    return min(limit, Config.PAGE_SIZE_MAX)
+
+
+def parse_page_args(args):
+    """(limit, cursor) from the query string; raises ValueError on bad input"""
+    limit = parse_limit(args)
+    cursor = args.get('cursor')
+    return limit, decode_cursor(cursor) if cursor else None
+
+
+def apply_bill_filters(query, args):
+    """
+    Filters on Bill columns from the query string: is_paid, due_from and
+    due_to (inclusive, YYYY-MM-DD), category and frequency.
+    """
+    if args.get('is_paid'):
+        query = query.filter(Bill.is_paid == _parse_bool(args['is_paid'], 'is_paid'))
+    if args.get('due_from'):
+        query = query.filter(Bill.due_date >= _parse_date(args['due_from'], 'due_from'))
+    if args.get('due_to'):
+        query = query.filter(Bill.due_date < _parse_date(args['due_to'], 'due_to') + timedelta(days=1))
+    if args.get('category'):
+        query = query.filter(Bill.category == args['category'])
+    if args.get('frequency'):
+        query = query.filter(Bill.frequency == args['frequency'])
+    return query
+
+
+def keyset_page(query, limit, after=None):
+    """
+    One page of `query` ordered by (Bill.due_date, Bill.id), starting after
+    the `after` key. Returns (rows, next_cursor); next_cursor is None on the
+    last page. Reads one extra row to know whether another page exists.
+    """
+    if after:
+        due_date, row_id = after
+        query = query.filter(or_(
+            Bill.due_date > due_date,
+            and_(Bill.due_date == due_date, Bill.id > row_id)
+        ))
+    rows = query.order_by(Bill.due_date, Bill.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        # A Bill, a column row with due_date and id, or a (Bill, ...) entity row
+        if hasattr(last, '_fields') and 'due_date' not in last._fields:
+            last = last[0]
+        next_cursor = encode_cursor(last.due_date, last.id)
+    return rows, next_cursor
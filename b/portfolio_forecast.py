@@ -0,0 +1,364 @@
+# portfolio_forecast.py - Cash-flow forecast for the whole loan book
+#
+# Active loans are held as columnar numpy arrays (one array per field, rows
+# sorted by loan id) in FORECAST_DIR/portfolio_state.npz. A run loads that
+# state and reads back only two things from the database:
+#   - loans whose loan or bill row changed since the previous run
+#   - loans deleted since then, from the delta-sync tombstones
+# The first run, or a run older than the tombstone retention, reads every loan.
+#
+# From the arrays it computes, for each month of the horizon:
+#   - expected installment inflows
+#   - outstanding principal at the end of the month
+#   - loans still running
+#   - loans maturing and their final installments
+# It also computes the current arrears. The monthly table is written to
+# FORECAST_DIR/portfolio_forecast.npz. Export it with:
+#
+#   python portfolio_forecast.py                 # incremental run, print the table
+#   python portfolio_forecast.py --full          # rebuild the state from the database
+#   python portfolio_forecast.py --csv out.csv   # also export the table as CSV
+
+from datetime import datetime, timedelta
+import argparse
+import os
+import logging
+
+import numpy as np
+from sqlalchemy import extract, select
+
+from config import Config
+from models import db, Bill, LoanDetails, Tombstone
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+STATE_FILE = 'portfolio_state.npz'
+FORECAST_FILE = 'portfolio_forecast.npz'
+# Rate groups x months evaluated at once when summing balances
+BALANCE_BLOCK = 1 << 20
+
+# Columns of the state arrays, in select order
+STATE_COLUMNS = (
+    ('id', 'S36'),
+    ('due_month', np.int32),       # months since year 0 of the next unpaid installment
+    ('principal', np.float64),
+    ('payment', np.float64),
+    ('installments', np.int32),
+    ('paid', np.int32),
+    ('rate', np.float64),          # monthly rate
+    ('active', np.bool_),
+)
+
+
+def _loans_select():
+    return select(
+        LoanDetails.id,
+        extract('year', Bill.due_date) * 12 + extract('month', Bill.due_date) - 1,
+        LoanDetails.total_amount,
+        LoanDetails.monthly_payment,
+        LoanDetails.total_installments,
+        LoanDetails.installments_paid,
+        LoanDetails.interest_rate_percent,
+        LoanDetails.is_active,
+    ).join(Bill, Bill.id == LoanDetails.bill_id)
+
+
+def _to_columns(rows):
+    """State arrays from selected rows"""
+    columns = list(zip(*rows)) or [()] * len(STATE_COLUMNS)
+    arrays = {}
+    for (name, dtype), values in zip(STATE_COLUMNS, columns):
+        if name == 'id':
+            arrays[name] = np.array([value.encode('ascii') for value in values], dtype=dtype)
+        else:
+            arrays[name] = np.array([value or 0 for value in values], dtype=dtype)
+    arrays['rate'] /= 1200.0
+    return arrays
+
+
+def _sort_by_id(state):
+    order = np.argsort(state['id'], kind='stable')
+    return {name: values[order] for name, values in state.items()}
+
+
+def _find(ids, wanted):
+    """(positions, found mask) of `wanted` in the sorted `ids`"""
+    positions = np.searchsorted(ids, wanted)
+    if not ids.size:
+        return positions, np.zeros(wanted.size, dtype=bool)
+    found = ids[np.minimum(positions, ids.size - 1)] == wanted
+    return positions, found
+
+
+def _merge(state, changed, deleted_ids):
+    """Apply changed rows (insert or replace) and deletions to the sorted state"""
+    _, first = np.unique(changed['id'], return_index=True)
+    changed = {name: values[first] for name, values in changed.items()}
+
+    positions, found = _find(state['id'], changed['id'])
+    for name in state:
+        state[name][positions[found]] = changed[name][found]
+    new = ~found
+    if new.any():
+        # changed is sorted by id after np.unique, so the insert positions are ascending
+        insert_at = positions[new]
+        state = {name: np.insert(values, insert_at, changed[name][new]) for name, values in state.items()}
+
+    if deleted_ids.size:
+        positions, found = _find(state['id'], deleted_ids)
+        keep = np.ones(state['id'].size, dtype=bool)
+        keep[positions[found]] = False
+        state = {name: values[keep] for name, values in state.items()}
+    return state
+
+
+def _state_path():
+    return os.path.join(Config.FORECAST_DIR, STATE_FILE)
+
+
+def _load_state():
+    """(state, watermark) of the previous run, or (None, None)"""
+    path = _state_path()
+    if not os.path.exists(path):
+        return None, None
+    with np.load(path) as data:
+        if int(data['version']) != STATE_VERSION:
+            return None, None
+        state = {name: data[name] for name, _ in STATE_COLUMNS}
+        watermark = datetime.fromisoformat(str(data['watermark']))
+    return state, watermark
+
+
+def _save(path, arrays):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + '.tmp.npz'
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, path)
+
+
+def refresh_state(full=False):
+    """
+    Bring the loan arrays up to date with the database. Returns
+    (state, stats) where stats says how many rows were read.
+    """
+    started_at = datetime.utcnow()
+    state, watermark = (None, None) if full else _load_state()
+    if watermark and watermark < started_at - timedelta(days=Config.SYNC_TOMBSTONE_DAYS):
+        # Deletions older than the tombstone retention are gone; only a full read is safe
+        state = None
+
+    if state is None:
+        rows = db.session.execute(_loans_select()).all()
+        state = _sort_by_id(_to_columns(rows))
+        stats = {'mode': 'full', 'read': len(rows), 'deleted': 0}
+    else:
+        since = watermark - timedelta(seconds=Config.SYNC_OVERLAP_SECONDS)
+        rows = db.session.execute(_loans_select().where(LoanDetails.updated_at > since)).all()
+        rows += db.session.execute(_loans_select().where(Bill.updated_at > since)).all()
+        deleted = db.session.execute(
+            select(Tombstone.entity_id).where(Tombstone.entity == 'loan', Tombstone.deleted_at > since)
+        ).scalars().all()
+        deleted_ids = np.array([loan_id.encode('ascii') for loan_id in deleted], dtype='S36')
+        state = _merge(state, _to_columns(rows), deleted_ids)
+        stats = {'mode': 'incremental', 'read': len(rows), 'deleted': len(deleted)}
+
+    _save(_state_path(), {
+        **state,
+        'version': np.array(STATE_VERSION),
+        'watermark': np.array(started_at.isoformat())
+    })
+    return state, stats
+
+
+def _weighted_bincount(months, weights, size):
+    # bincount returns integers when there are no weights at all, as with an empty book
+    return np.bincount(months, weights=weights, minlength=size).astype(np.float64)
+
+
+def _window_sum(first, end, weights, horizon):
+    """Per month, the sum of weights whose window [first, end) covers it"""
+    return np.cumsum(
+        _weighted_bincount(first, weights, horizon + 1) - _weighted_bincount(end, weights, horizon + 1)
+    )[:horizon]
+
+
+def _balance_after(principal, payment, rate, periods):
+    """Closed-form balance after `periods` installments, as in amortization.py"""
+    growth = np.power(1.0 + rate, periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(rate > 0, (growth - 1.0) / rate, periods)
+    return np.maximum(principal * growth - payment * annuity, 0.0)
+
+
+def _payoff_periods(principal, payment, installments, rate):
+    """Periods until the loan is cleared: the term, or earlier when the installment clears it first"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        perpetuity = payment / rate
+        # B_k <= 0.005  <=>  (1+r)^k >= (M/r - 0.005) / (M/r - P)
+        amortizing = np.log((perpetuity - 0.005) / (perpetuity - principal)) / np.log1p(rate)
+        linear = (principal - 0.005) / payment
+    periods = np.where(rate > 0, amortizing, linear)
+    periods = np.where(np.isfinite(periods) & (periods >= 0), np.ceil(periods - 1e-9), installments)
+    return np.clip(periods, 1, installments).astype(np.int32)
+
+
+def _amortizing_balance(first, end, rate, coefficient, horizon):
+    """
+    Sum over loans of coefficient * (1+rate)^m for the months m in each
+    loan's window [first, end). Loans are grouped by rate so the power is
+    taken once per rate and month; the windows add up per group with
+    difference arrays, which keeps the cost at loans + rates x months.
+    """
+    rates, group = np.unique(rate, return_inverse=True)
+    months = np.arange(horizon)
+    balance = np.zeros(horizon)
+    block = max(BALANCE_BLOCK // (horizon + 1), 1)
+    for low in range(0, rates.size, block):
+        high = min(low + block, rates.size)
+        member = (group >= low) & (group < high)
+        row = (group[member] - low) * (horizon + 1)
+        size = (high - low) * (horizon + 1)
+        steps = (
+            _weighted_bincount(row + first[member], coefficient[member], size)
+            - _weighted_bincount(row + end[member], coefficient[member], size)
+        ).reshape(high - low, horizon + 1)
+        sums = np.cumsum(steps, axis=1)[:, :horizon]
+        balance += (sums * np.power(1.0 + rates[low:high, None], months)).sum(axis=0)
+    return balance
+
+
+def compute_forecast(state, horizon=None, today=None):
+    """Monthly portfolio table over `horizon` months starting with the current month"""
+    horizon = horizon or Config.FORECAST_HORIZON_MONTHS
+    today = today or datetime.utcnow().date()
+    start = today.year * 12 + today.month - 1
+
+    active = state['active']
+    principal, payment, rate = state['principal'][active], state['payment'][active], state['rate'][active]
+    installments = _payoff_periods(principal, payment, state['installments'][active], rate)
+    paid = state['paid'][active]
+    live = paid < installments
+    principal, payment, rate = principal[live], payment[live], rate[live]
+    installments, paid = installments[live], paid[live]
+    left = installments - paid
+    offset = state['due_month'][active][live] - start
+
+    # Installments run from month `offset` to `offset + left - 1`; anything before month 0 is arrears
+    first = np.clip(offset, 0, horizon)
+    end = np.clip(offset + left, 0, horizon)
+    inflow = _window_sum(first, end, payment, horizon)
+
+    # The last installment is whatever the balance before it plus a month's interest comes to
+    last_payment = _balance_after(principal, payment, rate, installments - 1) * (1.0 + rate)
+    last_month = offset + left - 1
+    overdue = np.clip(-offset, 0, left)
+    arrears = float((payment * overdue).sum() + (last_payment - payment)[last_month < 0].sum())
+    in_horizon = (last_month >= 0) & (last_month < horizon)
+    inflow += _weighted_bincount(last_month[in_horizon], (last_payment - payment)[in_horizon], horizon)
+
+    maturing_month = np.clip(last_month, 0, horizon)
+    maturing = np.bincount(maturing_month, minlength=horizon + 1)
+    maturing_amount = _weighted_bincount(maturing_month, last_payment, horizon + 1)
+    running = principal.size - np.cumsum(maturing[:horizon])
+
+    # End-of-month balance: unchanged before the next installment falls due, zero once
+    # the last one is paid, and in between (months m of [first, repaid)) after
+    # k = m + paid - offset + 1 installments:
+    #   rate > 0:  (P - M/r) (1+r)^(paid - offset + 1) * (1+r)^m + M/r
+    #   rate = 0:  P - M (paid - offset + 1) - M m
+    current = _balance_after(principal, payment, rate, paid)
+    repaid = np.clip(last_month, 0, horizon)
+    balance = _window_sum(np.zeros_like(first), first, current, horizon)
+    lag = paid - offset + 1
+    amortizing = rate > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        perpetuity = np.where(amortizing, payment / rate, 0.0)
+    coefficient = (principal - perpetuity) * np.power(1.0 + rate, lag)
+    balance += _amortizing_balance(
+        first[amortizing], repaid[amortizing], rate[amortizing], coefficient[amortizing], horizon
+    )
+    balance += _window_sum(first, repaid, np.where(amortizing, perpetuity, principal - payment * lag), horizon)
+    flat = ~amortizing
+    balance -= _window_sum(first[flat], repaid[flat], payment[flat], horizon) * np.arange(horizon)
+    outstanding = float(current.sum())
+
+    labels = [f"{(start + m) // 12:04d}-{(start + m) % 12 + 1:02d}" for m in range(horizon)]
+    return {
+        'month': np.array(labels, dtype='S7'),
+        'inflow': inflow,
+        'balance': balance,
+        'running_loans': running.astype(np.int64),
+        'maturing_loans': maturing[:horizon].astype(np.int64),
+        'maturing_amount': maturing_amount[:horizon],
+        'loans': np.array(principal.size),
+        'outstanding': np.array(outstanding),
+        'arrears': np.array(arrears),
+        'beyond_horizon_loans': np.array(int(maturing[horizon])),
+        'computed_at': np.array(datetime.utcnow().isoformat())
+    }
+
+
+def run_forecast(full=False, horizon=None):
+    """Refresh the loan arrays, compute the table and store it; returns (forecast, stats)"""
+    state, stats = refresh_state(full)
+    forecast = compute_forecast(state, horizon)
+    _save(os.path.join(Config.FORECAST_DIR, FORECAST_FILE), forecast)
+    logger.info(
+        f"[FORECAST] {stats['mode']} run: read {stats['read']} rows, {stats['deleted']} deletions, "
+        f"{int(forecast['loans'])} active loans"
+    )
+    return forecast, stats
+
+
+def load_forecast():
+    """The last stored table as a dict of arrays, or None"""
+    path = os.path.join(Config.FORECAST_DIR, FORECAST_FILE)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def export_csv(forecast, path):
+    with open(path, 'w') as f:
+        f.write('month,inflow,balance,running_loans,maturing_loans,maturing_amount\n')
+        for row in zip(forecast['month'], forecast['inflow'], forecast['balance'], forecast['running_loans'],
+                       forecast['maturing_loans'], forecast['maturing_amount']):
+            month, inflow, balance, running, maturing, amount = row
+            f.write(f"{month.decode()},{inflow:.2f},{balance:.2f},{running},{maturing},{amount:.2f}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast monthly collections for the loan book')
+    parser.add_argument('--full', action='store_true', help='Rebuild the loan arrays from the database')
+    parser.add_argument('--horizon', type=int, help='Months to forecast')
+    parser.add_argument('--csv', help='Also write the table to this CSV file')
+    args = parser.parse_args()
+
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        started = datetime.utcnow()
+        forecast, stats = run_forecast(full=args.full, horizon=args.horizon)
+        elapsed = (datetime.utcnow() - started).total_seconds()
+
+    print(f"{stats['mode']} run in {elapsed:.2f}s: read {stats['read']} rows, {stats['deleted']} deletions")
+    print(f"Active loans: {int(forecast['loans'])}, outstanding: {float(forecast['outstanding']):.2f}, "
+          f"arrears: {float(forecast['arrears']):.2f}")
+    print(f"{'month':<8} {'inflow':>16} {'balance':>18} {'running':>9} {'maturing':>9}")
+    for month, inflow, balance, running, maturing in zip(
+            forecast['month'], forecast['inflow'], forecast['balance'],
+            forecast['running_loans'], forecast['maturing_loans']):
+        print(f"{month.decode():<8} {inflow:>16.2f} {balance:>18.2f} {running:>9} {maturing:>9}")
+
+    if args.csv:
+        export_csv(forecast, args.csv)
+        print(f"Wrote {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# provider_health.py - Per-provider health tracking for reminder senders
+
+from functools import wraps
+import logging
+
+from config import Config
+from circuit_breaker import CircuitBreaker, OPEN
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+_breakers = {}
+
+
+def get_breaker(provider):
+    """Circuit breaker for a provider, created on first use"""
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers.setdefault(provider, CircuitBreaker(
+            provider,
+            failure_threshold=Config.PROVIDER_FAILURE_THRESHOLD,
+            recovery_timeout=Config.PROVIDER_RECOVERY_SECONDS,
+            half_open_max_calls=Config.PROVIDER_HALF_OPEN_CALLS
+        ))
+    return breaker
+
+
+def is_available(provider):
+    """True unless the provider's circuit is open (does not use up a trial request)"""
+    return get_breaker(provider).state != OPEN
+
+
+def is_provider_failure(result):
+    """
+    Decide whether a failed send says something about the provider's health.
+    Client errors such as an invalid number are the request's fault, not the
+    provider's; 429 and 5xx responses and transport errors count against it.
+    """
+    status_code = result.get('status_code')
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def guarded(provider):
+    """
+    Decorator for sender functions returning {"success": bool, ...}.
+    While the provider's circuit is open the sender is not called at all and a
+    failure result with circuit_open=True is returned immediately.
+    """
+    def decorator(sender):
+        @wraps(sender)
+        def wrapper(*args, **kwargs):
+            breaker = get_breaker(provider)
+            if not breaker.allow_request():
+                logger.warning(f"[PROVIDER HEALTH] {provider} circuit open, fast-failing {sender.__name__}")
+                return {"success": False, "error": f"{provider} is unavailable (circuit open)", "circuit_open": True}
+
+            try:
+                result = sender(*args, **kwargs)
+            except Exception:
+                breaker.record_failure()
+                raise
+
+            if result.get('success'):
+                breaker.record_success()
+            elif is_provider_failure(result):
+                breaker.record_failure()
+            else:
+                # The provider answered properly, it just rejected this request
+                breaker.record_success()
+            return result
+        return wrapper
+    return decorator
+
+
+def health_snapshot():
+    """Circuit state of every provider seen so far"""
+    return {provider: breaker.snapshot() for provider, breaker in _breakers.items()}
@@ -0,0 +1,132 @@
+# provider_transport.py - Long-lived, connection-pooled HTTP transport for outbound providers
+
+import threading
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+# The Twilio and ElevenLabs SDKs (and httpx) are imported inside their getters,
+# so processes that never send through them don't pay for the import.
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+BASE_URLS = {
+    'twilio': Config.TWILIO_BASE_URL.rstrip('/'),
+    'bland': Config.BLAND_AI_BASE_URL.rstrip('/'),
+    'gemini': Config.GEMINI_BASE_URL.rstrip('/'),
+    'elevenlabs': Config.ELEVENLABS_BASE_URL.rstrip('/'),
+    'sms': Config.SMS_BASE_URL.rstrip('/'),
+}
+
+_lock = threading.RLock()
+_sessions = {}
+_twilio_client = None
+_elevenlabs_client = None
+_elevenlabs_httpx = None
+
+
+def get_timeout():
+    """(connect, read) timeout applied to every provider request"""
+    return (Config.PROVIDER_CONNECT_TIMEOUT, Config.PROVIDER_READ_TIMEOUT)
+
+
+def _build_session(provider):
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=Config.PROVIDER_POOL_CONNECTIONS,
+        pool_maxsize=Config.PROVIDER_POOL_MAXSIZE,
+        max_retries=0
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Connection': 'keep-alive'})
+    logger.info(f"[TRANSPORT] Created pooled session for {provider} (pool size: {Config.PROVIDER_POOL_MAXSIZE})")
+    return session
+
+
+def get_session(provider):
+    """Shared requests.Session for a provider, created on first use"""
+    session = _sessions.get(provider)
+    if session is None:
+        with _lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _build_session(provider)
+                _sessions[provider] = session
+    return session
+
+
+def get_twilio_client():
+    """Twilio client whose HTTP client reuses the pooled 'twilio' session"""
+    global _twilio_client
+    if _twilio_client is None:
+        with _lock:
+            if _twilio_client is None:
+                from twilio.rest import Client
+                from twilio.http.http_client import TwilioHttpClient
+
+                http_client = TwilioHttpClient(timeout=Config.PROVIDER_READ_TIMEOUT)
+                http_client.session = get_session('twilio')
+                _twilio_client = Client(
+                    Config.TWILIO_ACCOUNT_SID,
+                    Config.TWILIO_AUTH_TOKEN,
+                    http_client=http_client
+                )
+                _twilio_client.api.base_url = BASE_URLS['twilio']
+                logger.info("[TRANSPORT] Created shared Twilio client")
+    return _twilio_client
+
+
+def get_elevenlabs_client():
+    """ElevenLabs client backed by a pooled, keep-alive httpx client"""
+    global _elevenlabs_client, _elevenlabs_httpx
+    if _elevenlabs_client is None:
+        with _lock:
+            if _elevenlabs_client is None:
+                import httpx
+                from elevenlabs import ElevenLabs
+
+                _elevenlabs_httpx = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=Config.PROVIDER_POOL_MAXSIZE,
+                        max_keepalive_connections=Config.PROVIDER_POOL_MAXSIZE,
+                        keepalive_expiry=Config.PROVIDER_KEEPALIVE_SECONDS
+                    ),
+                    timeout=httpx.Timeout(
+                        Config.PROVIDER_READ_TIMEOUT,
+                        connect=Config.PROVIDER_CONNECT_TIMEOUT
+                    )
+                )
+                _elevenlabs_client = ElevenLabs(
+                    base_url=BASE_URLS['elevenlabs'],
+                    api_key=Config.ELEVENLABS_API_KEY,
+                    httpx_client=_elevenlabs_httpx
+                )
+                logger.info("[TRANSPORT] Created shared ElevenLabs client")
+    return _elevenlabs_client
+
+
+def warm_connections():
+    """Open a connection to every provider so the first real send skips the handshake"""
+    for provider, base_url in BASE_URLS.items():
+        try:
+            if provider == 'elevenlabs':
+                get_elevenlabs_client()
+                _elevenlabs_httpx.head(base_url)
+            else:
+                get_session(provider).head(base_url, timeout=get_timeout())
+            logger.info(f"[TRANSPORT] Warmed connection to {provider}")
+        except Exception as e:
+            logger.warning(f"[TRANSPORT] Could not warm connection to {provider}: {str(e)}")
+
+
+def start_warmup():
+    """Warm provider connections on a background thread"""
+    thread = threading.Thread(target=warm_connections, name='provider-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,232 @@
+# reminder_content.py - Off-peak pre-generation of reminder messages
+
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
+import shutil
+import uuid
+import logging
+
+from config import Config
+from models import db, Bill, User, ReminderSettings, ReminderContent
+from reminder_service import generate_reminder_messages, get_greeting
+from elevenlabs_service import generate_voice_audio
+from tts_segments import compose_reminder_audio, reminder_text
+from telephony_audio import to_telephony
+from reminder_dispatcher import plan_channels
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Unified schedule: remind on the 3rd, 2nd and 1st day before the due date, and on the due date itself
+REMINDER_DAYS = [3, 2, 1, 0]
+
+
+def is_reminder_day(due_date, on_date):
+    """Check whether a bill due on `due_date` gets a reminder on `on_date`"""
+    due = due_date.date() if hasattr(due_date, 'date') else due_date
+    days_left = (due - on_date).days
+    return days_left in REMINDER_DAYS
+
+
+def build_bill_data(bill, greeting=None):
+    """Bill fields a reminder message is generated from"""
+    bill_data = {
+        'name': bill.name,
+        'amount': bill.amount,
+        'due_date': bill.due_date.strftime('%Y-%m-%d')
+    }
+    if greeting:
+        bill_data['greeting'] = greeting
+    return bill_data
+
+
+def greeting_for(settings):
+    """Greeting matching the hour the user's reminders go out"""
+    try:
+        hour = int((settings.preferred_time or '09:00').split(':')[0])
+    except ValueError:
+        hour = 9
+    return get_greeting(hour)
+
+
+def content_fingerprint(user_name, bill_data):
+    """Stable hash of everything that feeds the message text"""
+    payload = json.dumps({'user': user_name, 'bill': bill_data}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def pregenerate_reminder_content(target_date=None):
+    """
+    Work out which reminders go out on `target_date` (tomorrow by default) and
+    store their message text ahead of time. With PREGENERATE_AUDIO, reminders
+    that place a call also get their call audio, kept in REMINDER_AUDIO_DIR
+    and played by the call (see reminder_audio_url).
+    Must be called inside an application context.
+    """
+    target_date = target_date or (datetime.now().date() + timedelta(days=1))
+    logger.info(f"[PREGEN] Pre-generating reminder content for {target_date}")
+
+    window_start = datetime.combine(target_date, datetime.min.time())
+    window_end = window_start + timedelta(days=max(REMINDER_DAYS) + 1)
+
+    rows = db.session.query(Bill, User, ReminderSettings).join(
+        User, Bill.user_id == User.id
+    ).join(
+        ReminderSettings, ReminderSettings.user_id == User.id
+    ).filter(
+        User.phone_number.isnot(None),
+        Bill.is_paid == False,
+        Bill.due_date >= window_start,
+        Bill.due_date < window_end
+    ).all()
+    logger.info(f"[PREGEN] Found {len(rows)} unpaid bills in the reminder window")
+
+    existing = {
+        content.bill_id: content
+        for content in ReminderContent.query.filter_by(send_date=target_date).all()
+    }
+
+    pending = []
+    for bill, user, settings in rows:
+        if not is_reminder_day(bill.due_date, target_date):
+            continue
+        primary, _ = plan_channels(settings, bill)
+        if not primary:
+            continue
+        wants_call = 'call' in primary
+
+        bill_data = build_bill_data(bill, greeting_for(settings))
+        fingerprint = content_fingerprint(user.name, bill_data)
+        current = existing.get(bill.id)
+        if current and current.fingerprint == fingerprint:
+            logger.debug(f"[PREGEN] Content for bill {bill.id} is up to date")
+            continue
+        pending.append((bill, user, bill_data, fingerprint, wants_call))
+
+    logger.info(f"[PREGEN] Generating content for {len(pending)} reminders")
+    # Segmented call audio speaks the fixed template, so those reminders use its
+    # written form as their message instead of Gemini text
+    segmented = Config.PREGENERATE_AUDIO and Config.TTS_SEGMENTED
+    generate = [i for i, item in enumerate(pending) if not (segmented and item[4])]
+    messages = [reminder_text(user.name, bill_data) for _, user, bill_data, _, _ in pending]
+    generated = generate_reminder_messages([(pending[i][1].name, pending[i][2]) for i in generate])
+    for i, message in zip(generate, generated):
+        messages[i] = message
+
+    for (bill, user, bill_data, fingerprint, wants_call), message in zip(pending, messages):
+        audio_path = None
+        if Config.PREGENERATE_AUDIO and wants_call:
+            if segmented:
+                audio_result = compose_reminder_audio(user.name, bill_data)
+            else:
+                audio_result = generate_voice_audio(message)
+            if audio_result.get('success'):
+                audio_path = audio_result['audio_path']
+            else:
+                logger.warning(f"[PREGEN] Audio generation failed for bill {bill.id}: {audio_result.get('error')}")
+
+        if audio_path and Config.TELEPHONY_AUDIO_FORMAT:
+            # Calls play the narrowband copy; the MP3 stays in the audio cache
+            telephony_result = to_telephony(audio_path)
+            if telephony_result.get('success'):
+                audio_path = telephony_result['audio_path']
+            else:
+                logger.warning(f"[PREGEN] Keeping MP3 for bill {bill.id}: {telephony_result.get('error')}")
+
+        content = existing.get(bill.id)
+        if content is None:
+            content = ReminderContent(id=str(uuid.uuid4()), bill_id=bill.id, send_date=target_date)
+            db.session.add(content)
+        content.fingerprint = fingerprint
+        content.message = message
+        content.audio_path = store_reminder_audio(content.id, audio_path)
+
+    # Content for days that have passed is never read again
+    stale = ReminderContent.query.filter(ReminderContent.send_date < datetime.now().date()).delete()
+    if stale:
+        logger.info(f"[PREGEN] Removed {stale} stale content rows")
+
+    try:
+        db.session.commit()
+        logger.info(f"[PREGEN] Stored content for {len(pending)} reminders on {target_date}")
+    except Exception as e:
+        logger.error(f"[PREGEN ERROR] Failed to store reminder content: {str(e)}", exc_info=True)
+        db.session.rollback()
+        raise
+
+    remove_orphaned_audio()
+    return len(pending)
+
+
+def store_reminder_audio(content_id, audio_path):
+    """
+    Copy generated call audio out of the audio cache into REMINDER_AUDIO_DIR,
+    named after its content row, so cache eviction cannot remove a file a
+    stored reminder still plays. Returns the copy's path, or None (removing
+    any earlier copy) when there is no audio.
+    """
+    os.makedirs(Config.REMINDER_AUDIO_DIR, exist_ok=True)
+    for suffix in ('.wav', '.mp3'):
+        previous_path = os.path.join(Config.REMINDER_AUDIO_DIR, content_id + suffix)
+        if os.path.exists(previous_path):
+            os.remove(previous_path)
+    if not audio_path:
+        return None
+    stored_path = os.path.join(Config.REMINDER_AUDIO_DIR, content_id + os.path.splitext(audio_path)[1])
+    shutil.copyfile(audio_path, stored_path)
+    return stored_path
+
+
+def remove_orphaned_audio():
+    """Delete stored call audio whose content row is gone (stale, or its bill was deleted)"""
+    if not os.path.isdir(Config.REMINDER_AUDIO_DIR):
+        return 0
+    content_ids = {content_id for (content_id,) in db.session.query(ReminderContent.id)}
+    removed = 0
+    for name in os.listdir(Config.REMINDER_AUDIO_DIR):
+        if os.path.splitext(name)[0] not in content_ids:
+            os.remove(os.path.join(Config.REMINDER_AUDIO_DIR, name))
+            removed += 1
+    if removed:
+        logger.info(f"[PREGEN] Removed {removed} orphaned call audio files")
+    return removed
+
+
+def get_stored_contents(reminders, send_date):
+    """
+    Look up pre-generated content for (user_name, bill, bill_data) records.
+    Returns one ReminderContent per record, or None when there is nothing
+    stored or the bill changed since the content was generated.
+    """
+    bill_ids = [bill.id for _, bill, _ in reminders]
+    stored = {}
+    if bill_ids:
+        stored = {
+            content.bill_id: content
+            for content in ReminderContent.query.filter(
+                ReminderContent.send_date == send_date,
+                ReminderContent.bill_id.in_(bill_ids)
+            ).all()
+        }
+
+    contents = []
+    for user_name, bill, bill_data in reminders:
+        content = stored.get(bill.id)
+        if content and content.fingerprint != content_fingerprint(user_name, bill_data):
+            logger.info(f"[PREGEN] Bill {bill.id} changed since its content was generated")
+            content = None
+        contents.append(content)
+    return contents
+
+
+def reminder_audio_url(content):
+    """
+    Public URL a voice provider fetches the content's call audio from, or
+    None when there is no audio or PUBLIC_BASE_URL is not set.
+    """
+    if content is None or not content.audio_path or not Config.PUBLIC_BASE_URL:
+        return None
+    return f"{Config.PUBLIC_BASE_URL.rstrip('/')}/api/reminders/audio/{content.id}"
@@ -0,0 +1,279 @@
+# reminder_dispatcher.py - Channel selection and cross-channel failover for reminders
+
+import threading
+import logging
+
+from config import Config
+from provider_health import is_available
+from reminder_service import (
+    send_whatsapp_reminder,
+    send_sms_reminder,
+    send_sms_reminders,
+    send_audio_call_reminder
+)
+from voice_call_scheduler import queue_voice_call
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+CHANNEL_PROVIDERS = {
+    'whatsapp': 'twilio',
+    'call': 'bland',
+    'sms': 'sms',
+}
+
+CHANNEL_SENDERS = {
+    'whatsapp': send_whatsapp_reminder,
+    # Calls are queued behind the Bland AI concurrency cap
+    'call': queue_voice_call,
+    'sms': send_sms_reminder,
+}
+
+
+def settings_allow(settings, channel):
+    """Whether the user's ReminderSettings allow a channel at all"""
+    if settings is None:
+        return False
+    return bool({
+        'whatsapp': settings.whatsapp_enabled,
+        'call': settings.call_enabled,
+        'sms': settings.sms_enabled,
+    }.get(channel))
+
+
+def bill_allows(bill, channel):
+    """Whether the bill's own reminder flags select a channel"""
+    return bool({
+        'whatsapp': bill.enable_whatsapp,
+        'call': bill.enable_call,
+        'sms': bill.enable_sms,
+    }.get(channel))
+
+
+def failover_alternates(settings, exclude):
+    """
+    Channels the user has enabled in ReminderSettings but that are not already
+    in `exclude`, in REMINDER_FAILOVER_ORDER, skipping providers that are down.
+    """
+    return [
+        channel for channel in Config.REMINDER_FAILOVER_ORDER
+        if channel in CHANNEL_SENDERS
+        and channel not in exclude
+        and settings_allow(settings, channel)
+        and is_available(CHANNEL_PROVIDERS[channel])
+    ]
+
+
+def plan_channels(settings, bill):
+    """
+    Primary channels are the ones both the settings and the bill select.
+    Alternates are channels only the settings allow; they are used when every
+    primary channel fails.
+    """
+    primary = [
+        channel for channel in Config.REMINDER_FAILOVER_ORDER
+        if channel in CHANNEL_SENDERS and settings_allow(settings, channel) and bill_allows(bill, channel)
+    ]
+    return primary, failover_alternates(settings, primary)
+
+
+class SmsBatch:
+    """
+    Collects SMS reminders during a scheduler run so they go out in a few
+    bulk gateway requests instead of one request per message. Each message's
+    gateway result is handed to its `on_result` callback at flush time.
+    """
+
+    def __init__(self):
+        self._items = []
+        self.open = True
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, phone_number, message, on_result):
+        self._items.append((phone_number, message, on_result))
+
+    def flush(self):
+        """
+        Submit everything queued and report each result. The batch is closed
+        first, so SMS failovers triggered by these results are sent directly.
+        Returns counts of sent and failed messages.
+        """
+        self.open = False
+        items, self._items = self._items, []
+        summary = {'sent': 0, 'failed': 0}
+        if not items:
+            return summary
+
+        results = send_sms_reminders([(phone, message) for phone, message, _ in items])
+        for (phone_number, message, on_result), result in zip(items, results):
+            if result.get('success'):
+                summary['sent'] += 1
+            else:
+                summary['failed'] += 1
+                logger.error(f"[DISPATCH ERROR] SMS to {phone_number} failed: {result.get('error')}")
+            try:
+                on_result(result)
+            except Exception as e:
+                logger.error(f"[DISPATCH ERROR] SMS result handler raised: {str(e)}", exc_info=True)
+
+        logger.info(f"[DISPATCH] SMS batch flushed: {summary}")
+        return summary
+
+
+class ReminderDelivery:
+    """
+    Delivery state of one reminder across its channels. A channel whose
+    result comes back later (SMS in an SmsBatch, a call in the voice queue)
+    stays pending until then.
+    The reminder is delivered once any channel succeeds; while nothing has
+    succeeded and nothing is pending, the next alternate is tried.
+    """
+
+    def __init__(self, phone_number, message, alternates=(), sms_batch=None, on_delivered=None, audio_url=None):
+        self.phone_number = phone_number
+        self.message = message
+        self.audio_url = audio_url
+        self.alternates = list(alternates)
+        self.sms_batch = sms_batch
+        self.on_delivered = on_delivered
+        self.delivered = []
+        self.pending = []
+        self.failed = {}
+        self.failover = None
+        self._tried = set()
+        self._reported = False
+        self._lock = threading.RLock()
+
+    def start(self, primary):
+        """Send on every primary channel, failing over if none can deliver"""
+        with self._lock:
+            for channel in primary:
+                self._attempt(channel)
+            if primary:
+                self._fail_over()
+            # Deliveries known now are reported through the return value
+            self._reported = bool(self.delivered)
+            return self.outcome()
+
+    def outcome(self):
+        with self._lock:
+            return {
+                "delivered": list(self.delivered),
+                "pending": list(self.pending),
+                "failed": dict(self.failed),
+                "failover": self.failover
+            }
+
+    def settle(self, channel, result):
+        """Final result of a pending channel; calls on_delivered on the first late success"""
+        with self._lock:
+            if channel not in self.pending:
+                return
+            self.pending.remove(channel)
+            self._record(channel, result)
+            self._fail_over()
+            notify = bool(self.delivered) and not self._reported
+            if notify:
+                self._reported = True
+        if notify and self.on_delivered:
+            self.on_delivered(self.delivered[0])
+
+    def _attempt(self, channel):
+        # Caller holds self._lock
+        self._tried.add(channel)
+        if channel == 'sms' and self.sms_batch is not None and self.sms_batch.open \
+                and is_available(CHANNEL_PROVIDERS['sms']):
+            self.pending.append(channel)
+            self.sms_batch.add(self.phone_number, self.message, lambda result: self.settle('sms', result))
+            return
+        if channel == 'call' and self.audio_url and can_play_audio():
+            result = _send_audio_call(self.phone_number, self.audio_url)
+            if result.get('success'):
+                self._record(channel, result)
+                return
+            logger.warning(f"[DISPATCH] Audio call to {self.phone_number} failed, falling back to a Bland AI call")
+        if channel == 'call':
+            # The ticket's final result arrives on the voice queue thread; settle()
+            # waits for self._lock, so it always sees the channel as pending
+            result = _send(channel, self.phone_number, self.message, on_result=lambda r: self.settle('call', r))
+        else:
+            result = _send(channel, self.phone_number, self.message)
+        if result.get('pending'):
+            self.pending.append(channel)
+            return
+        self._record(channel, result)
+
+    def _record(self, channel, result):
+        # Caller holds self._lock
+        if result.get('success'):
+            self.delivered.append(channel)
+            return
+        self.failed[channel] = result.get('error', 'Unknown error')
+        if channel == self.failover:
+            self.failover = None
+
+    def _fail_over(self):
+        # Caller holds self._lock
+        for channel in self.alternates:
+            if self.delivered or self.pending:
+                return
+            if channel in self._tried:
+                continue
+            logger.info(f"[DISPATCH] Channels {', '.join(self.failed)} failed, failing over to {channel}")
+            self.failover = channel
+            self._attempt(channel)
+
+
+def dispatch_reminder(phone_number, message, primary, alternates=(), sms_batch=None, on_delivered=None, audio_url=None):
+    """
+    Send `message` on every primary channel. If none of them delivers, try the
+    alternates in order until one does. Providers with an open circuit fail
+    fast, so a provider incident costs no waiting time here.
+    With an `sms_batch`, SMS is queued for bulk submission; calls always wait
+    in the voice queue. Both are reported as pending rather than delivered.
+    If the gateway or Bland AI later rejects them and nothing else reached the
+    user, the reminder fails over to the channels it has not tried yet.
+    `on_delivered(channel)` is called when a delivery is only confirmed after
+    this function has returned.
+    With an `audio_url` (pre-generated call audio), the call channel plays it
+    through Twilio; if that is not configured or fails, Bland AI speaks
+    `message` instead.
+    Returns {"delivered": [...], "pending": [...], "failed": {channel: error}, "failover": channel or None}.
+    """
+    delivery = ReminderDelivery(phone_number, message, alternates, sms_batch, on_delivered, audio_url)
+    return delivery.start(primary)
+
+
+def can_play_audio():
+    """Whether calls can play pre-generated audio (Twilio voice configured and up)"""
+    return bool(Config.PUBLIC_BASE_URL and Config.TWILIO_VOICE_FROM) and is_available('twilio')
+
+
+def _send_audio_call(phone_number, audio_url):
+    logger.info(f"[DISPATCH] Sending audio call reminder to {phone_number}")
+    try:
+        result = send_audio_call_reminder(phone_number, audio_url)
+    except Exception as e:
+        logger.error(f"[DISPATCH ERROR] Audio call sender raised: {str(e)}", exc_info=True)
+        result = {"success": False, "error": str(e)}
+    return result or {"success": False, "error": "No result from sender"}
+
+
+def _send(channel, phone_number, message, **kwargs):
+    logger.info(f"[DISPATCH] Sending {channel} reminder to {phone_number}")
+    try:
+        result = CHANNEL_SENDERS[channel](phone_number, message, **kwargs)
+    except Exception as e:
+        logger.error(f"[DISPATCH ERROR] {channel} sender raised: {str(e)}", exc_info=True)
+        result = {"success": False, "error": str(e)}
+
+    if result and result.get('pending'):
+        logger.info(f"[DISPATCH] {channel} reminder to {phone_number} queued")
+        return result
+    if not result or not result.get('success'):
+        logger.error(f"[DISPATCH ERROR] {channel} reminder failed: {(result or {}).get('error', 'Unknown error')}")
+        return result or {"success": False, "error": "No result from sender"}
+    return result
@@ -2,39 +2,74 @@
 from dotenv import load_dotenv
 load_dotenv()
 import os
+import json
 import requests
 from datetime import datetime
-from twilio.rest import Client
-import google.generativeai as genai
+from xml.sax.saxutils import escape
 from config import Config
+from provider_transport import BASE_URLS, get_session, get_timeout, get_twilio_client
+from generation_service import generation_service, GenerationUnavailable
+from provider_health import guarded
+import time
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Configure Gemini
-logger.info("[GEMINI CONFIG] Configuring Gemini AI")
-genai.configure(api_key=Config.GOOGLE_API_KEY)
 logger.debug(f"[GEMINI CONFIG] API key configured: {'*' * 10 + Config.GOOGLE_API_KEY[-4:] if Config.GOOGLE_API_KEY else 'NOT SET'}")
 
-def generate_reminder_message(name, bill_data):
-    """Generate reminder message using Gemini AI"""
-    logger.info(f"[MESSAGE GEN] Starting message generation for user: {name}")
-    logger.debug(f"[MESSAGE GEN] Bill data received: {bill_data}")
+def gemini_generate_content(prompt, generation_config=None):
+    """Call the Gemini generateContent REST endpoint over the pooled session"""
+    url = f"{BASE_URLS['gemini']}/v1beta/models/{Config.GEMINI_MODEL}:generateContent"
+    body = {'contents': [{'parts': [{'text': prompt}]}]}
+    if generation_config:
+        body['generationConfig'] = generation_config
+
+    connect_timeout, read_timeout = get_timeout()
+    response = get_session('gemini').post(
+        url,
+        json=body,
+        headers={'x-goog-api-key': Config.GOOGLE_API_KEY or ''},
+        timeout=(connect_timeout, min(read_timeout, Config.GENERATION_DEADLINE_SECONDS))
+    )
+    response.raise_for_status()
 
-    gemini_model = genai.GenerativeModel('gemini-1.5-flash-latest')
+    candidates = response.json().get('candidates') or []
+    if not candidates:
+        raise ValueError('Gemini returned no candidates')
+    parts = candidates[0].get('content', {}).get('parts', [])
+    return ''.join(part.get('text', '') for part in parts)
 
-    current_hour = datetime.now().hour
+def get_greeting(hour=None):
+    """Pick the greeting used at the start of reminder messages"""
+    current_hour = datetime.now().hour if hour is None else hour
     logger.debug(f"[MESSAGE GEN] Current hour: {current_hour}")
 
     if 5 <= current_hour < 12:
-        greeting = "Good morning"
+        return "Good morning"
     elif 12 <= current_hour < 17:
-        greeting = "Good afternoon"
-    else:
-        greeting = "Good evening"
+        return "Good afternoon"
+    return "Good evening"
 
+def build_fallback_message(name, bill_data):
+    """Static reminder text used whenever Gemini cannot produce a message"""
+    if bill_data.get('days_overdue') is not None:
+        return (
+            f"URGENT: Your {bill_data.get('name')} payment of ₹{bill_data.get('amount')} is "
+            f"{bill_data.get('days_overdue')} days overdue. Please pay immediately to avoid late fees."
+        )
+    return (
+        f"Hi {name}, this is a reminder that your payment for '{bill_data.get('name')}' "
+        f"is due on {bill_data.get('due_date')}. Amount due: ₹{bill_data.get('amount')}."
+    )
+
+def generate_reminder_message(name, bill_data):
+    """Generate reminder message using Gemini AI"""
+    logger.info(f"[MESSAGE GEN] Starting message generation for user: {name}")
+    logger.debug(f"[MESSAGE GEN] Bill data received: {bill_data}")
+
+    greeting = bill_data.get('greeting') or get_greeting()
     logger.debug(f"[MESSAGE GEN] Selected greeting: {greeting}")
 
     prompt = f"""
@@ -55,22 +90,156 @@ def generate_reminder_message(name, bill_data):
 
     try:
         logger.info("[MESSAGE GEN] Calling Gemini AI to generate message")
-        response = gemini_model.generate_content(prompt)
-        generated_message = response.text.strip()
+        generated_message = generation_service.call(gemini_generate_content, prompt).strip()
         logger.info(f"[MESSAGE GEN] Successfully generated message via Gemini")
         logger.debug(f"[MESSAGE GEN] Generated message: {generated_message}")
         return generated_message
     except Exception as e:
-        logger.error(f"[MESSAGE GEN ERROR] Gemini generation failed: {str(e)}", exc_info=True)
+        if isinstance(e, GenerationUnavailable):
+            logger.warning(f"[MESSAGE GEN] Gemini skipped: {str(e)}")
+        else:
+            logger.error(f"[MESSAGE GEN ERROR] Gemini generation failed: {str(e)}", exc_info=True)
         # Fallback message
-        fallback_message = (
-            f"Hi {name}, this is a reminder that your payment for '{bill_data.get('name')}' "
-            f"is due on {bill_data.get('due_date')}. Amount due: ₹{bill_data.get('amount')}."
-        )
+        fallback_message = build_fallback_message(name, bill_data)
         logger.info("[MESSAGE GEN] Using fallback message due to Gemini error")
         logger.debug(f"[MESSAGE GEN] Fallback message: {fallback_message}")
         return fallback_message
 
+def _build_batch_prompt(items, greeting):
+    """Pack many (index, name, bill_data) records into one structured prompt"""
+    records = []
+    for index, name, bill_data in items:
+        record = {
+            'id': index,
+            'name': name,
+            'bill': bill_data.get('name'),
+            'amount': bill_data.get('amount'),
+            'due_date': bill_data.get('due_date'),
+            'greeting': bill_data.get('greeting') or greeting,
+        }
+        records.append(record)
+
+    return f"""
+    You are a friendly financial assistant creating reminder messages.
+
+    For EVERY record in the JSON array below, write one reminder message:
+    1. Start with: "Hey <name>, <greeting>."
+    2. Remind about the bill payment using the bill, amount (in ₹) and due_date.
+    3. End with: "Hope you have a nice day."
+    Keep each message brief and friendly.
+
+    Respond ONLY with a JSON array of objects of the form
+    {{"id": <id from the record>, "message": "<reminder text>"}}, one per record.
+
+    Records:
+    {json.dumps(records, ensure_ascii=False)}
+    """
+
+def _parse_batch_response(text):
+    """Parse the structured array response into {id: message}, skipping bad items"""
+    text = text.strip()
+    # Tolerate a markdown code fence around the JSON payload
+    if text.startswith('```'):
+        text = text.strip('`')
+        if text.lower().startswith('json'):
+            text = text[4:]
+
+    parsed = {}
+    try:
+        payload = json.loads(text)
+    except (json.JSONDecodeError, ValueError) as e:
+        logger.warning(f"[BATCH GEN] Could not decode batch response: {str(e)}")
+        return parsed
+
+    if not isinstance(payload, list):
+        logger.warning(f"[BATCH GEN] Batch response is not an array: {type(payload).__name__}")
+        return parsed
+
+    for item in payload:
+        if not isinstance(item, dict):
+            continue
+        message = item.get('message')
+        try:
+            index = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if isinstance(message, str) and message.strip():
+            parsed[index] = message.strip()
+    return parsed
+
+def _generate_batch(items, greeting):
+    """One Gemini round trip for a batch; returns {index: message} for parsed items"""
+    prompt = _build_batch_prompt(items, greeting)
+    try:
+        text = generation_service.call(
+            gemini_generate_content,
+            prompt,
+            generation_config={'responseMimeType': 'application/json'}
+        )
+        return _parse_batch_response(text)
+    except GenerationUnavailable as e:
+        logger.warning(f"[BATCH GEN] Gemini skipped for {len(items)} items: {str(e)}")
+        return {}
+    except Exception as e:
+        logger.error(f"[BATCH GEN ERROR] Gemini batch generation failed: {str(e)}", exc_info=True)
+        return {}
+
+def generate_reminder_messages(records, batch_size=None):
+    """
+    Generate reminder messages for many (name, bill_data) records.
+
+    Records are packed into batches of `batch_size` per Gemini request. Items
+    missing from a batch response are retried on their own, and anything that
+    still fails gets the static fallback text. No new batch is started once
+    GENERATION_BUDGET_SECONDS have been spent, so the worst case is bounded by
+    the budget plus one per-call deadline. Overdue records (with days_overdue)
+    always get the fixed URGENT text and never go to Gemini. Returns messages
+    in input order.
+    """
+    records = list(records)
+    if not records:
+        return []
+
+    batch_size = batch_size or Config.GEMINI_BATCH_SIZE
+    logger.info(f"[BATCH GEN] Generating {len(records)} messages in batches of {batch_size}")
+
+    greeting = get_greeting()
+    messages = {}
+    pending = []
+    for index, (name, bill_data) in enumerate(records):
+        if bill_data.get('days_overdue') is not None:
+            messages[index] = build_fallback_message(name, bill_data)
+        else:
+            pending.append((index, name, bill_data))
+    overdue = len(messages)
+
+    started = time.monotonic()
+    for attempt in range(Config.GEMINI_BATCH_RETRIES + 1):
+        if not pending:
+            break
+        if attempt:
+            logger.info(f"[BATCH GEN] Retry {attempt}: {len(pending)} items failed to parse")
+
+        for start in range(0, len(pending), batch_size):
+            if time.monotonic() - started >= Config.GENERATION_BUDGET_SECONDS:
+                logger.warning("[BATCH GEN] Generation budget spent, remaining items use fallback text")
+                break
+            batch = pending[start:start + batch_size]
+            messages.update(_generate_batch(batch, greeting))
+
+        pending = [item for item in pending if item[0] not in messages]
+
+    for index, name, bill_data in pending:
+        logger.info(f"[BATCH GEN] Using fallback message for record {index}")
+        messages[index] = build_fallback_message(name, bill_data)
+
+    logger.info(
+        f"[BATCH GEN] Completed: {len(records) - overdue - len(pending)} generated, "
+        f"{len(pending)} fallback, {overdue} overdue"
+    )
+    return [messages[index] for index in range(len(records))]
+
+@guarded('twilio')
 def send_whatsapp_reminder(phone_number, message_body):
     """Send WhatsApp reminder using Twilio"""
     logger.info(f"[WHATSAPP] Starting WhatsApp reminder to: {phone_number}")
@@ -82,19 +251,12 @@ def send_whatsapp_reminder(phone_number, message_body):
         phone_number = '+91' + phone_number.replace(' ', '')
 
     try:
-        # --- NEW DEBUG CODE ---
-        print("--- DEBUG: CHECKING TWILIO KEYS ---")
-        print(f"Account SID from Config: {Config.TWILIO_ACCOUNT_SID}")
-        print(f"Auth Token from Config: {Config.TWILIO_AUTH_TOKEN}")
-        print("-----------------------------------")
-        # --- END OF NEW DEBUG CODE ---
-
         logger.debug(f"[WHATSAPP] Twilio Account SID: {'*' * 30 + Config.TWILIO_ACCOUNT_SID[-4:] if Config.TWILIO_ACCOUNT_SID else 'NOT SET'}")
         logger.debug(f"[WHATSAPP] Twilio Auth Token: {'*' * 30 + Config.TWILIO_AUTH_TOKEN[-4:] if Config.TWILIO_AUTH_TOKEN else 'NOT SET'}")
         logger.debug(f"[WHATSAPP] WhatsApp From Number: {Config.TWILIO_WHATSAPP_FROM}")
 
-        logger.info("[WHATSAPP] Creating Twilio client")
-        client = Client(Config.TWILIO_ACCOUNT_SID, Config.TWILIO_AUTH_TOKEN)
+        # Shared client: the pooled session keeps the TLS connection to Twilio open between sends
+        client = get_twilio_client()
 
         formatted_to = f'whatsapp:{phone_number}'
         logger.debug(f"[WHATSAPP] Formatted recipient: {formatted_to}")
@@ -113,8 +275,33 @@ def send_whatsapp_reminder(phone_number, message_body):
     except Exception as e:
         logger.error(f"[WHATSAPP ERROR] Failed to send WhatsApp message: {str(e)}", exc_info=True)
         logger.debug(f"[WHATSAPP ERROR] Error type: {type(e).__name__}")
-        return {"success": False, "error": str(e)}
+        # TwilioRestException carries the HTTP status of the API response
+        return {"success": False, "error": str(e), "status_code": getattr(e, 'status', None)}
+
+@guarded('twilio')
+def send_audio_call_reminder(phone_number, audio_url):
+    """Place a Twilio voice call that plays the pre-generated reminder audio at `audio_url`"""
+    logger.info(f"[TWILIO CALL] Starting audio call reminder to: {phone_number}")
+
+    if not phone_number.startswith('+91'):
+        phone_number = '+91' + phone_number.replace(' ', '')
+
+    try:
+        call = get_twilio_client().calls.create(
+            to=phone_number,
+            from_=Config.TWILIO_VOICE_FROM,
+            twiml=f'<Response><Play>{escape(audio_url)}</Play></Response>'
+        )
+        logger.info(f"[TWILIO CALL] Call placed with SID: {call.sid}")
+        return {"success": True, "sid": call.sid}
+    except Exception as e:
+        logger.error(f"[TWILIO CALL ERROR] Failed to place audio call: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e), "status_code": getattr(e, 'status', None)}
+
+# Call states after which Bland AI no longer holds a concurrency slot for the call
+BLAND_FINISHED_STATUSES = ('completed', 'complete', 'failed', 'no-answer', 'busy', 'canceled', 'cancelled', 'error')
 
+@guarded('bland')
 def send_voice_call_reminder(phone_number, message_body):
     """Sends a voice call reminder using Bland AI"""
     logger.info(f"[BLAND AI] Starting voice call reminder to: {phone_number}")
@@ -124,7 +311,7 @@ def send_voice_call_reminder(phone_number, message_body):
         phone_number = '+91' + phone_number.replace(' ', '')
 
     # Bland AI API Endpoint
-    url = "https://api.bland.ai/call"
+    url = f"{BASE_URLS['bland']}/call"
 
     # FIX 1: The authorization header requires the "Bearer" prefix.
     headers = {
@@ -135,19 +322,122 @@ def send_voice_call_reminder(phone_number, message_body):
     data = {
         "phone_number": phone_number,
         "task": message_body,
-        "voice_id": "e1289219-0ea2-4f22-a994-c542c2a48a0f"
+        "voice_id": Config.BLAND_VOICE_ID
     }
 
     try:
-        response = requests.post(url, json=data, headers=headers)
+        response = get_session('bland').post(url, json=data, headers=headers, timeout=get_timeout())
         response.raise_for_status()  # This will raise an HTTPError for bad responses (4xx or 5xx)
         logger.info(f"[BLAND AI] Successfully triggered voice call: {response.json()}")
         return {"success": True, "details": response.json()}
     except requests.exceptions.RequestException as e:
         logger.error(f"[BLAND AI ERROR] Request failed: {str(e)}", exc_info=True)
         if hasattr(e, 'response') and e.response is not None:
-            return {"success": False, "error": f"HTTP Error: {e.response.text}"}
+            return {"success": False, "error": f"HTTP Error: {e.response.text}", "status_code": e.response.status_code}
         return {"success": False, "error": str(e)}
     except Exception as e:
         logger.error(f"[BLAND AI ERROR] An unexpected error occurred: {e}", exc_info=True)
-        return {"success": False, "error": str(e)}
\ No newline at end of file
+        return {"success": False, "error": str(e)}
+
+@guarded('bland')
+def get_voice_call_status(call_id):
+    """Fetch the state of a Bland AI call so finished calls can free their slot"""
+    url = f"{BASE_URLS['bland']}/v1/calls/{call_id}"
+    headers = {
+        "authorization": Config.BLAND_AI_API_KEY
+    }
+
+    try:
+        response = get_session('bland').get(url, headers=headers, timeout=get_timeout())
+        response.raise_for_status()
+        details = response.json()
+        status = details.get('status') or details.get('queue_status')
+        completed = bool(details.get('completed')) or status in BLAND_FINISHED_STATUSES
+        logger.debug(f"[BLAND AI] Call {call_id} status: {status} (completed: {completed})")
+        return {"success": True, "completed": completed, "status": status}
+    except requests.exceptions.RequestException as e:
+        logger.error(f"[BLAND AI ERROR] Status check for call {call_id} failed: {str(e)}")
+        if hasattr(e, 'response') and e.response is not None:
+            return {"success": False, "error": f"HTTP Error: {e.response.text}", "status_code": e.response.status_code}
+        return {"success": False, "error": str(e)}
+
+@guarded('sms')
+def _submit_sms_batch(batch):
+    """Submit one bulk request of (reference, number, text) items to the SMS gateway"""
+    url = f"{BASE_URLS['sms']}/bulk_json/"
+    payload = {
+        "sender": Config.SMS_SENDER,
+        "messages": [
+            {"number": number, "text": text, "custom": reference}
+            for reference, number, text in batch
+        ]
+    }
+
+    try:
+        response = get_session('sms').post(
+            url,
+            data={"apikey": Config.SMS_API_KEY or '', "data": json.dumps(payload)},
+            timeout=get_timeout()
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body.get('status') != 'success':
+            errors = body.get('errors') or [{'message': 'Unknown gateway error'}]
+            return {"success": False, "error": errors[0].get('message'), "status_code": response.status_code}
+        return {"success": True, "details": body}
+    except requests.exceptions.RequestException as e:
+        logger.error(f"[SMS ERROR] Bulk request failed: {str(e)}", exc_info=True)
+        if hasattr(e, 'response') and e.response is not None:
+            return {"success": False, "error": f"HTTP Error: {e.response.text}", "status_code": e.response.status_code}
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.error(f"[SMS ERROR] An unexpected error occurred: {e}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+def send_sms_reminders(messages):
+    """
+    Send many SMS reminders using the gateway's bulk endpoint.
+
+    `messages` is a list of (phone_number, message_body). Up to
+    SMS_BULK_MAX_MESSAGES messages go in each provider request. Returns one
+    {"success": bool, ...} result per message, in input order.
+    """
+    messages = list(messages)
+    logger.info(f"[SMS] Sending {len(messages)} SMS reminders in bulk")
+
+    items = []
+    for index, (phone_number, message_body) in enumerate(messages):
+        # The gateway wants country code + number without the leading '+'
+        number = phone_number.replace(' ', '').lstrip('+')
+        if not number.startswith('91'):
+            number = '91' + number
+        items.append((str(index), number, message_body))
+
+    results = [None] * len(items)
+    batch_size = Config.SMS_BULK_MAX_MESSAGES
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        response = _submit_sms_batch(batch)
+        if not response.get('success'):
+            logger.error(f"[SMS ERROR] Bulk request for {len(batch)} messages failed: {response.get('error')}")
+            for reference, _, _ in batch:
+                results[int(reference)] = dict(response)
+            continue
+
+        details = response['details']
+        for sent in details.get('messages', []):
+            results[int(sent['custom'])] = {"success": True, "id": sent.get('id')}
+        for failure in details.get('failures', []):
+            results[int(failure['custom'])] = {"success": False, "error": failure.get('message'), "status_code": 400}
+
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = {"success": False, "error": "Message missing from gateway response"}
+
+    sent_count = sum(1 for result in results if result['success'])
+    logger.info(f"[SMS] Bulk send complete: {sent_count} sent, {len(results) - sent_count} failed")
+    return results
+
+def send_sms_reminder(phone_number, message_body):
+    """Send a single SMS reminder"""
+    return send_sms_reminders([(phone_number, message_body)])[0]
@@ -1,9 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for, send_file, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, User, ReminderSettings, Bill
-from reminder_service import generate_reminder_message, send_whatsapp_reminder, send_voice_call_reminder
-from elevenlabs_service import generate_voice_audio
+from models import db, User, ReminderSettings, Bill, ReminderContent
+from reminder_service import generate_reminder_message, send_whatsapp_reminder, send_sms_reminder
+from voice_call_scheduler import place_voice_call
+from elevenlabs_service import generate_voice_audio, stream_voice_audio, get_available_voices
+from telephony_audio import to_telephony
+from job_queue import reminder_jobs
+from config import Config
 from datetime import datetime
+import os
 import logging
 
 # Configure logging
@@ -108,46 +113,30 @@ def update_reminder_settings():
     
     return jsonify({'message': 'Settings updated successfully'}), 200
 
-@reminders_bp.route('/test', methods=['POST'])
-@jwt_required()
-def test_reminder():
-    user_id = get_jwt_identity()
-    logger.info(f"[TEST REMINDER] Request from user_id: {user_id}")
-    
-    user = User.query.get(user_id)
-    logger.debug(f"[TEST REMINDER] User found: {user is not None}")
-    
-    if not user:
-        logger.warning(f"[TEST REMINDER] User {user_id} not found")
-        return jsonify({'message': 'User not found'}), 404
-    
-    logger.debug(f"[TEST REMINDER] User phone: {user.phone_number}")
-    
-    if not user.phone_number:
-        logger.warning(f"[TEST REMINDER] User {user_id} has no phone number")
-        return jsonify({'message': 'Phone number required for reminders'}), 400
-    
-    data = request.get_json()
-    reminder_type = data.get('type')
-    logger.info(f"[TEST REMINDER] Type requested: {reminder_type}")
-    
-    if reminder_type not in ['whatsapp', 'call', 'elevenlabs']:
-        logger.warning(f"[TEST REMINDER] Invalid reminder type: {reminder_type}")
-        return jsonify({'message': 'Invalid reminder type'}), 400
-    
-    # Create test bill data
-    test_bill_data = {
+def _queued_response(job_id):
+    """202 Accepted pointing the caller at the job status endpoint"""
+    status_url = url_for('reminders.get_reminder_job', job_id=job_id)
+    response = jsonify({
+        'status': 'queued',
+        'job_id': job_id,
+        'status_url': status_url
+    })
+    response.headers['Location'] = status_url
+    return response, 202
+
+def _test_bill_data():
+    """Bill data the test reminders are generated from"""
+    return {
         'name': 'Test Bill',
         'amount': 1000,
         'due_date': datetime.now().strftime('%Y-%m-%d')
     }
+
+def run_test_reminder(reminder_type, user_name, phone_number):
+    """Generate and deliver a test reminder; runs on the job queue"""
+    test_bill_data = _test_bill_data()
     logger.debug(f"[TEST REMINDER] Test bill data: {test_bill_data}")
     
-    # Generate message
-    logger.debug(f"[TEST REMINDER] Generating message for user: {user.name}")
-    message = generate_reminder_message(user.name, test_bill_data)
-    logger.debug(f"[TEST REMINDER] Generated message: {message[:100]}...")
-    
     # Send reminder based on type
     result = None
     try:
@@ -155,16 +144,26 @@ def test_reminder():
             # --- THIS IS THE FIX ---
             # Using a static, pre-saved message for the fastest and correct response.
             message = "Whatsapp Test successfully done! Your number is ready for future reminders :)"
-            logger.info(f"[TEST REMINDER] Sending WhatsApp test to {user.phone_number}")
-            result = send_whatsapp_reminder(user.phone_number, message)
+            logger.info(f"[TEST REMINDER] Sending WhatsApp test to {phone_number}")
+            result = send_whatsapp_reminder(phone_number, message)
             
         elif reminder_type == 'call':
             # Using a static message for the call test as well.
-            message = f"Hello {user.name}. This is a test call from your bills reminder application. Your reminders are set up correctly. Goodbye."
-            logger.info(f"[TEST REMINDER] Sending voice call test to {user.phone_number}")
-            result = send_voice_call_reminder(user.phone_number, message)
+            message = f"Hello {user_name}. This is a test call from your bills reminder application. Your reminders are set up correctly. Goodbye."
+            logger.info(f"[TEST REMINDER] Sending voice call test to {phone_number}")
+            result = place_voice_call(phone_number, message, timeout=Config.REMINDER_JOB_MAX_WAIT_SECONDS)
+            
+        elif reminder_type == 'sms':
+            message = f"Hello {user_name}, SMS test successful. Your number is ready for bill reminders."
+            logger.info(f"[TEST REMINDER] Sending SMS test to {phone_number}")
+            result = send_sms_reminder(phone_number, message)
             
         elif reminder_type == 'elevenlabs':
+            # Only this channel speaks the generated text, so only it pays for generation
+            logger.debug(f"[TEST REMINDER] Generating message for user: {user_name}")
+            message = generate_reminder_message(user_name, test_bill_data)
+            logger.debug(f"[TEST REMINDER] Generated message: {message[:100]}...")
+            
             logger.info(f"[TEST REMINDER] Generating ElevenLabs audio")
             # Generate audio file using ElevenLabs
             audio_result = generate_voice_audio(message)
@@ -172,6 +171,9 @@ def test_reminder():
             
             if audio_result['success']:
                 result = {'success': True, 'message': 'Audio generated', 'audio_path': audio_result['audio_path']}
+                telephony_result = to_telephony(audio_result['audio_path'])
+                if telephony_result['success']:
+                    result['telephony_audio_path'] = telephony_result['audio_path']
                 logger.info(f"[TEST REMINDER] Audio generated at: {audio_result.get('audio_path')}")
             else:
                 result = audio_result
@@ -180,25 +182,184 @@ def test_reminder():
         logger.error(f"[TEST REMINDER ERROR] Exception during {reminder_type} test: {str(e)}", exc_info=True)
         result = {'success': False, 'error': str(e)}
     
+    if result.get('pending'):
+        logger.info(f"[TEST REMINDER] Test {reminder_type} reminder still queued, ticket {result.get('ticket')}")
+        return {
+            'status': 'queued',
+            'message': f'Test reminder queued via {reminder_type}',
+            'details': result
+        }, 202
     if result.get('success'):
         logger.info(f"[TEST REMINDER] Test reminder sent successfully via {reminder_type}")
-        return jsonify({
+        return {
             'status': 'success',
             'message': f'Test reminder sent via {reminder_type}',
             'details': result
-        }), 200
+        }, 200
     else:
         logger.error(f"[TEST REMINDER] Failed to send test reminder via {reminder_type}: {result}")
-        return jsonify({
+        return {
             'status': 'error',
             'message': f'Failed to send reminder via {reminder_type}',
             'details': result
-        }), 500
+        }, 500
+
+@reminders_bp.route('/test', methods=['POST'])
+@jwt_required()
+def test_reminder():
+    """Validate the request, then queue the test reminder and return 202"""
+    user_id = get_jwt_identity()
+    logger.info(f"[TEST REMINDER] Request from user_id: {user_id}")
+    
+    user = User.query.get(user_id)
+    logger.debug(f"[TEST REMINDER] User found: {user is not None}")
+    
+    if not user:
+        logger.warning(f"[TEST REMINDER] User {user_id} not found")
+        return jsonify({'message': 'User not found'}), 404
+    
+    logger.debug(f"[TEST REMINDER] User phone: {user.phone_number}")
+    
+    if not user.phone_number:
+        logger.warning(f"[TEST REMINDER] User {user_id} has no phone number")
+        return jsonify({'message': 'Phone number required for reminders'}), 400
+    
+    data = request.get_json()
+    reminder_type = data.get('type')
+    logger.info(f"[TEST REMINDER] Type requested: {reminder_type}")
+    
+    if reminder_type not in ['whatsapp', 'call', 'sms', 'elevenlabs']:
+        logger.warning(f"[TEST REMINDER] Invalid reminder type: {reminder_type}")
+        return jsonify({'message': 'Invalid reminder type'}), 400
+    
+    job_id = reminder_jobs.submit(
+        user_id, 'test', run_test_reminder, reminder_type, user.name, user.phone_number
+    )
+    return _queued_response(job_id)
+
+@reminders_bp.route('/audio/stream', methods=['POST'])
+@jwt_required()
+def stream_reminder_audio():
+    """
+    Stream ElevenLabs audio to the caller as it is synthesised (chunked
+    transfer, audio/mpeg). Speaks `text` if given, otherwise the user's test
+    reminder. Pass "cache": false to skip the audio cache.
+    """
+    user_id = get_jwt_identity()
+    logger.info(f"[AUDIO STREAM] Request from user_id: {user_id}")
+    
+    user = User.query.get(user_id)
+    if not user:
+        logger.warning(f"[AUDIO STREAM] User {user_id} not found")
+        return jsonify({'message': 'User not found'}), 404
+    
+    data = request.get_json(silent=True) or {}
+    text = (data.get('text') or '').strip()
+    if not text:
+        text = generate_reminder_message(user.name, _test_bill_data())
+    if len(text) > Config.TTS_STREAM_MAX_CHARS:
+        logger.warning(f"[AUDIO STREAM] Text too long: {len(text)} characters")
+        return jsonify({'message': f'Text must be at most {Config.TTS_STREAM_MAX_CHARS} characters'}), 400
+    
+    chunks = stream_voice_audio(text, data.get('voice_id'), cache=bool(data.get('cache', True)))
+    
+    # Pull the first chunk before answering, so a provider failure is still a proper error response
+    try:
+        first_chunk = next(chunks, b'')
+    except Exception as e:
+        logger.error(f"[AUDIO STREAM ERROR] Failed to start audio stream: {str(e)}", exc_info=True)
+        return jsonify({'message': 'Failed to generate audio', 'error': str(e)}), 502
+    
+    def generate():
+        yield first_chunk
+        yield from chunks
+    
+    logger.info(f"[AUDIO STREAM] Streaming {len(text)} characters of audio to user {user_id}")
+    return Response(
+        stream_with_context(generate()),
+        mimetype='audio/mpeg',
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+    )
+
+@reminders_bp.route('/audio/<content_id>', methods=['GET'])
+def get_reminder_audio(content_id):
+    """
+    Pre-generated call audio for one reminder. Fetched by the voice provider
+    while the call is live, so it is not behind JWT; the content id is a
+    random UUID that only appears in the call request.
+    """
+    content = db.session.get(ReminderContent, content_id)
+    if not content or not content.audio_path or not os.path.isfile(content.audio_path):
+        logger.warning(f"[REMINDER AUDIO] No audio for content {content_id}")
+        return jsonify({'message': 'Audio not found'}), 404
+    
+    mimetype = 'audio/wav' if content.audio_path.endswith('.wav') else 'audio/mpeg'
+    logger.info(f"[REMINDER AUDIO] Serving {mimetype} audio for content {content_id}")
+    return send_file(os.path.abspath(content.audio_path), mimetype=mimetype, max_age=0)
+
+@reminders_bp.route('/voices', methods=['GET'])
+@jwt_required()
+def list_voices():
+    """ElevenLabs voices available for voice reminders (served from the cached catalogue)"""
+    result = get_available_voices()
+    if not result['success']:
+        logger.error(f"[VOICES] Failed to load voice catalogue: {result.get('error')}")
+        return jsonify({'message': 'Failed to load voices', 'error': result.get('error')}), 502
+    return jsonify({'voices': result['voices']}), 200
+
+def run_send_reminder(reminder_type, bill_id, bill_data, user_name, phone_number):
+    """Generate and deliver a bill reminder; runs on the job queue"""
+    # Generate and send reminder
+    logger.debug(f"[SEND REMINDER] Generating message for user: {user_name}")
+    message = generate_reminder_message(user_name, bill_data)
+    logger.debug(f"[SEND REMINDER] Generated message: {message[:100]}...")
+    
+    result = None
+    try:
+        if reminder_type == 'whatsapp':
+            logger.info(f"[SEND REMINDER] Sending WhatsApp reminder to {phone_number} for bill {bill_id}")
+            result = send_whatsapp_reminder(phone_number, message)
+            logger.debug(f"[SEND REMINDER] WhatsApp result: {result}")
+            
+        elif reminder_type == 'call':
+            logger.info(f"[SEND REMINDER] Sending voice reminder to {phone_number} for bill {bill_id}")
+            result = place_voice_call(phone_number, message, timeout=Config.REMINDER_JOB_MAX_WAIT_SECONDS)
+            logger.debug(f"[SEND REMINDER] Voice call result: {result}")
+            
+        elif reminder_type == 'sms':
+            logger.info(f"[SEND REMINDER] Sending SMS reminder to {phone_number} for bill {bill_id}")
+            result = send_sms_reminder(phone_number, message)
+            logger.debug(f"[SEND REMINDER] SMS result: {result}")
+            
+    except Exception as e:
+        logger.error(f"[SEND REMINDER ERROR] Exception during {reminder_type} send: {str(e)}", exc_info=True)
+        result = {'success': False, 'error': str(e)}
+    
+    if result.get('pending'):
+        logger.info(f"[SEND REMINDER] {reminder_type} reminder for bill {bill_id} still queued, ticket {result.get('ticket')}")
+        return {
+            'status': 'queued',
+            'message': f'Reminder queued via {reminder_type}',
+            'details': result
+        }, 202
+    if result.get('success'):
+        logger.info(f"[SEND REMINDER] Successfully sent {reminder_type} reminder for bill {bill_id}")
+        return {
+            'status': 'success',
+            'message': f'Reminder sent via {reminder_type}'
+        }, 200
+    else:
+        logger.error(f"[SEND REMINDER] Failed to send {reminder_type} reminder for bill {bill_id}: {result}")
+        return {
+            'status': 'error',
+            'message': 'Failed to send reminder',
+            'details': result
+        }, 500
 
 @reminders_bp.route('/send', methods=['POST'])
 @jwt_required()
 def send_reminder():
-    """Send reminder for a specific bill"""
+    """Validate a reminder for a specific bill, then queue it and return 202"""
     user_id = get_jwt_identity()
     logger.info(f"[SEND REMINDER] Request from user_id: {user_id}")
     
@@ -223,7 +384,7 @@ def send_reminder():
         return jsonify({'message': 'Bill not found'}), 404
     
     logger.debug(f"[SEND REMINDER] Bill details - Name: {bill.name}, Amount: {bill.amount}, Due: {bill.due_date}")
-    logger.debug(f"[SEND REMINDER] Bill settings - WhatsApp: {bill.enable_whatsapp}, Call: {bill.enable_call}")
+    logger.debug(f"[SEND REMINDER] Bill settings - WhatsApp: {bill.enable_whatsapp}, Call: {bill.enable_call}, SMS: {bill.enable_sms}")
     
     user = User.query.get(user_id)
     if not user.phone_number:
@@ -240,42 +401,37 @@ def send_reminder():
     }
     logger.debug(f"[SEND REMINDER] Prepared bill data: {bill_data}")
     
-    # Generate and send reminder
-    logger.debug(f"[SEND REMINDER] Generating message for user: {user.name}")
-    message = generate_reminder_message(user.name, bill_data)
-    logger.debug(f"[SEND REMINDER] Generated message: {message[:100]}...")
+    # Check the channel before generating, so a rejected request never calls Gemini
+    channel_enabled = (
+        (reminder_type == 'whatsapp' and bill.enable_whatsapp) or
+        (reminder_type == 'call' and bill.enable_call) or
+        (reminder_type == 'sms' and bill.enable_sms)
+    )
+    if not channel_enabled:
+        logger.warning(f"[SEND REMINDER] Reminder type {reminder_type} not enabled for bill {bill_id}")
+        logger.debug(f"[SEND REMINDER] Bill settings - WhatsApp: {bill.enable_whatsapp}, Call: {bill.enable_call}")
+        return jsonify({'message': 'Reminder type not enabled for this bill'}), 400
+    
+    job_id = reminder_jobs.submit(
+        user_id, 'send', run_send_reminder, reminder_type, bill_id, bill_data, user.name, user.phone_number
+    )
+    return _queued_response(job_id)
+
+@reminders_bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_reminder_job(job_id):
+    """Job status; pass ?wait=<seconds> to long-poll until the job finishes"""
+    user_id = get_jwt_identity()
     
-    result = None
     try:
-        if reminder_type == 'whatsapp' and bill.enable_whatsapp:
-            logger.info(f"[SEND REMINDER] Sending WhatsApp reminder to {user.phone_number} for bill {bill_id}")
-            result = send_whatsapp_reminder(user.phone_number, message)
-            logger.debug(f"[SEND REMINDER] WhatsApp result: {result}")
-            
-        elif reminder_type == 'call' and bill.enable_call:
-            logger.info(f"[SEND REMINDER] Sending voice reminder to {user.phone_number} for bill {bill_id}")
-            result = send_voice_call_reminder(user.phone_number, message)
-            logger.debug(f"[SEND REMINDER] Voice call result: {result}")
-            
-        else:
-            logger.warning(f"[SEND REMINDER] Reminder type {reminder_type} not enabled for bill {bill_id}")
-            logger.debug(f"[SEND REMINDER] Bill settings - WhatsApp: {bill.enable_whatsapp}, Call: {bill.enable_call}")
-            return jsonify({'message': 'Reminder type not enabled for this bill'}), 400
-            
-    except Exception as e:
-        logger.error(f"[SEND REMINDER ERROR] Exception during {reminder_type} send: {str(e)}", exc_info=True)
-        result = {'success': False, 'error': str(e)}
+        wait = min(float(request.args.get('wait', 0)), Config.REMINDER_JOB_MAX_WAIT_SECONDS)
+    except ValueError:
+        return jsonify({'message': 'wait must be a number of seconds'}), 400
     
-    if result.get('success'):
-        logger.info(f"[SEND REMINDER] Successfully sent {reminder_type} reminder for bill {bill_id}")
-        return jsonify({
-            'status': 'success',
-            'message': f'Reminder sent via {reminder_type}'
-        }), 200
-    else:
-        logger.error(f"[SEND REMINDER] Failed to send {reminder_type} reminder for bill {bill_id}: {result}")
-        return jsonify({
-            'status': 'error',
-            'message': 'Failed to send reminder',
-            'details': result
-        }), 500
\ No newline at end of file
+    job = reminder_jobs.get(job_id, user_id, wait=wait)
+    if not job:
+        logger.warning(f"[REMINDER JOB] Job {job_id} not found for user {user_id}")
+        return jsonify({'message': 'Job not found'}), 404
+    
+    logger.debug(f"[REMINDER JOB] Job {job_id} status: {job['status']}")
+    return jsonify(job), 200
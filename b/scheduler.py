@@ -4,8 +4,24 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from models import db, Bill, User, ReminderSettings
-from reminder_service import generate_reminder_message, send_whatsapp_reminder, send_voice_call_reminder
+from reminder_service import generate_reminder_messages
+from reminder_dispatcher import plan_channels, failover_alternates, dispatch_reminder, SmsBatch
 from models import db, Bill, User, ReminderSettings, LoanDetails
+from reminder_content import (
+    REMINDER_DAYS,
+    is_reminder_day,
+    build_bill_data,
+    greeting_for,
+    pregenerate_reminder_content,
+    get_stored_contents,
+    reminder_audio_url
+)
+from sync import prune_tombstones
+from idempotency import prune_idempotency_keys
+from portfolio_forecast import run_forecast
+from fee_calculation_service import scheduled_fee_calculation
+from dashboard_summary import invalidate_summary
+from config import Config
 import pytz
 import logging
 import json
@@ -34,6 +50,9 @@ def start_scheduler(app):
             users = User.query.filter(User.phone_number.isnot(None)).all()
             logger.info(f"[REMINDER CHECK] Found {len(users)} users with phone numbers")
             
+            # First pass: collect every (user, bill) that qualifies this tick, so
+            # the messages can be generated in a few batched Gemini requests.
+            due_reminders = []
             for user in users:
                 logger.debug(f"[USER CHECK] Processing user: {user.id} - {user.name}")
                 
@@ -67,47 +86,65 @@ def start_scheduler(app):
                         
                         # Check if reminder should be sent based on new unified schedule
                         if check_reminder_schedule(bill):
-                            logger.info(f"[REMINDER TRIGGER] Bill {bill.id} qualifies for reminder")
-                            
-                            bill_data = {
-                                'name': bill.name,
-                                'amount': bill.amount,
-                                'due_date': bill.due_date.strftime('%Y-%m-%d')
-                            }
-                            
-                            logger.debug(f"[MESSAGE GEN] Generating message for bill: {bill_data}")
-                            message = generate_reminder_message(user.name, bill_data)
-                            logger.debug(f"[MESSAGE GEN] Generated message: {message[:50]}...")
+                            primary, alternates = plan_channels(settings, bill)
+                            if not primary:
+                                # No channel will use the text, so don't generate it
+                                logger.debug(f"[BILL SKIP] Bill {bill.id} has no reminder channel enabled")
+                                continue
                             
-                            if settings.whatsapp_enabled and bill.enable_whatsapp:
-                                logger.info(f"[WHATSAPP] Sending WhatsApp reminder to {user.phone_number} for bill {bill.id}")
-                                try:
-                                    send_whatsapp_reminder(user.phone_number, message)
-                                    logger.info(f"[WHATSAPP] Successfully sent WhatsApp reminder for bill {bill.id}")
-                                    update_last_reminder_sent(bill)
-                                except Exception as e:
-                                    logger.error(f"[WHATSAPP ERROR] Failed to send WhatsApp reminder for bill {bill.id}: {str(e)}")
-                            else:
-                                logger.debug(f"[WHATSAPP] Skipped - WhatsApp disabled (settings: {settings.whatsapp_enabled}, bill: {bill.enable_whatsapp})")
+                            logger.info(f"[REMINDER TRIGGER] Bill {bill.id} qualifies for reminder")
                             
-                            if settings.call_enabled and bill.enable_call:
-                                logger.info(f"[VOICE CALL] Sending voice reminder to {user.phone_number} for bill {bill.id}")
-                                try:
-                                    result = send_voice_call_reminder(user.phone_number, message)
-                                    if result and result.get('success'):
-                                        logger.info(f"[VOICE CALL] Successfully sent voice reminder for bill {bill.id}")
-                                        update_last_reminder_sent(bill)
-                                    else:
-                                        logger.error(f"[VOICE CALL ERROR] Failed to send voice reminder for bill {bill.id}: {result.get('error', 'Unknown error')}")
-                                except Exception as e:
-                                    logger.error(f"[VOICE CALL ERROR] Failed to send voice reminder for bill {bill.id}: {str(e)}")
-                            else:
-                                logger.debug(f"[VOICE CALL] Skipped - Voice call disabled (settings: {settings.call_enabled}, bill: {bill.enable_call})")
+                            bill_data = build_bill_data(bill, greeting_for(settings))
+                            due_reminders.append((user, settings, bill, bill_data, primary, alternates))
                         else:
                             logger.debug(f"[BILL SKIP] Bill {bill.id} not due for reminder based on frequency")
                 else:
                     logger.debug(f"[TIME SKIP] Current time {current_time} does not match user {user.id} preferred time {settings.preferred_time}")
             
+            logger.info(f"[REMINDER CHECK] {len(due_reminders)} reminders qualify this tick")
+            
+            # Use content generated off-peak; only bills that changed since then
+            # (or were never pre-generated) go to Gemini now.
+            contents = get_stored_contents(
+                [(user.name, bill, bill_data) for user, _, bill, bill_data, _, _ in due_reminders],
+                datetime.now().date()
+            )
+            missing = [i for i, content in enumerate(contents) if content is None]
+            logger.info(f"[REMINDER CHECK] {len(due_reminders) - len(missing)} pre-generated, {len(missing)} to generate now")
+            
+            messages = [content.message if content else None for content in contents]
+            audio_urls = [reminder_audio_url(content) for content in contents]
+            generated = generate_reminder_messages(
+                [(due_reminders[i][0].name, due_reminders[i][3]) for i in missing]
+            )
+            for i, message in zip(missing, generated):
+                messages[i] = message
+            
+            # Second pass: deliver the generated messages, failing over between
+            # channels when a provider is down. SMS goes out in bulk at the end.
+            sms_batch = SmsBatch()
+            for (user, settings, bill, bill_data, primary, alternates), message, audio_url in zip(due_reminders, messages, audio_urls):
+                logger.debug(f"[MESSAGE GEN] Message for bill {bill.id}: {message[:50]}...")
+                logger.info(f"[REMINDER SEND] Bill {bill.id} channels: {', '.join(primary)} (alternates: {', '.join(alternates) or 'none'})")
+                
+                outcome = dispatch_reminder(
+                    user.phone_number, message, primary, alternates,
+                    sms_batch=sms_batch,
+                    on_delivered=lambda channel, bill_id=bill.id: record_late_delivery(bill_id, channel),
+                    audio_url=audio_url
+                )
+                if outcome['delivered']:
+                    logger.info(f"[REMINDER SEND] Delivered reminder for bill {bill.id} via {', '.join(outcome['delivered'])}")
+                    update_last_reminder_sent(bill)
+                elif outcome['pending']:
+                    logger.info(f"[REMINDER SEND] Reminder for bill {bill.id} pending on {', '.join(outcome['pending'])}")
+                if outcome['failed']:
+                    logger.error(f"[REMINDER SEND ERROR] Failed channels for bill {bill.id}: {outcome['failed']}")
+            
+            if len(sms_batch):
+                logger.info(f"[REMINDER SEND] Submitting {len(sms_batch)} queued SMS reminders")
+                sms_batch.flush()
+            
             logger.info(f"[REMINDER CHECK] Completed reminder check at {datetime.now().strftime('%H:%M:%S')}")
 
     # NEW FUNCTION: Simplified reminder schedule check
@@ -117,17 +154,12 @@ def start_scheduler(app):
         This simplified logic applies to all recurring bills.
         """
         current_date = datetime.now().date()
-        bill_due_date = bill.due_date.date()
-        
-        days_left = (bill_due_date - current_date).days
         
-        logger.debug(f"[SCHEDULE CHECK] Bill {bill.id} - Days left: {days_left}")
+        logger.debug(f"[SCHEDULE CHECK] Bill {bill.id} - Days left: {(bill.due_date.date() - current_date).days}")
         
         # Unified logic: send reminder on the 3rd, 2nd, and 1st day before the due date, and on the due date itself.
-        reminder_days = [3, 2, 1, 0]
-        
-        if days_left in reminder_days and days_left >= 0:
-            logger.debug(f"[SCHEDULE CHECK] Bill {bill.id} - Sending reminder (days_left: {days_left})")
+        if is_reminder_day(bill.due_date, current_date):
+            logger.debug(f"[SCHEDULE CHECK] Bill {bill.id} - Sending reminder (reminder days: {REMINDER_DAYS})")
             return True
 
         return False
@@ -146,6 +178,18 @@ def start_scheduler(app):
             logger.debug(f"[REMINDER DATE] Could not parse last reminder date for bill {bill.id}: {str(e)}")
         return None
 
+    def record_late_delivery(bill_id, channel):
+        """
+        Mark a bill reminded once a pending channel (batched SMS, a queued call) confirms
+        delivery. Uses its own app context, so it can run on any thread.
+        """
+        with app.app_context():
+            bill = db.session.get(Bill, bill_id)
+            if bill is None:
+                return
+            logger.info(f"[REMINDER SEND] Delivered reminder for bill {bill_id} via {channel}")
+            update_last_reminder_sent(bill)
+
     def update_last_reminder_sent(bill):
         """
         Update the last reminder sent date for the bill.
@@ -183,6 +227,7 @@ def start_scheduler(app):
             ).all()
             
             logger.info(f"[RECURRING CHECK] Found {len(recurring_bills)} paid recurring bills")
+            created_for = set()
             
             for bill in recurring_bills:
                 next_due_date = calculate_next_due_date(bill)
@@ -214,10 +259,12 @@ def start_scheduler(app):
                         )
                         
                         db.session.add(new_bill)
+                        created_for.add(bill.user_id)
                         logger.info(f"[RECURRING CHECK] Created new recurring bill for {bill.name} due on {next_due_date}")
             
             try:
                 db.session.commit()
+                invalidate_summary(*created_for)
                 logger.info("[RECURRING CHECK] Completed recurring bills check")
             except Exception as e:
                 logger.error(f"[RECURRING CHECK ERROR] Failed to save recurring bills: {str(e)}")
@@ -265,6 +312,7 @@ def start_scheduler(app):
             
             logger.info(f"[OVERDUE CHECK] Found {len(overdue_bills)} overdue bills")
             
+            overdue_reminders = []
             for bill in overdue_bills:
                 logger.debug(f"[OVERDUE PROCESS] Processing overdue bill: {bill.id} - {bill.name}")
                 
@@ -281,24 +329,84 @@ def start_scheduler(app):
                 logger.debug(f"[OVERDUE PROCESS] Bill {bill.id} is {days_overdue} days overdue")
                 
                 # Only send overdue reminders for bills that were due recently
-                if days_overdue <= 7:
-                    message = f"URGENT: Your {bill.name} payment of ₹{bill.amount} is {days_overdue} days overdue. Please pay immediately to avoid late fees."
-                    logger.info(f"[OVERDUE ALERT] Sending overdue alert for bill {bill.id} ({days_overdue} days overdue)")
-                    
-                    if bill.enable_whatsapp:
-                        logger.info(f"[OVERDUE WHATSAPP] Sending WhatsApp overdue reminder to {user.phone_number}")
-                        try:
-                            send_whatsapp_reminder(user.phone_number, message)
-                            logger.info(f"[OVERDUE WHATSAPP] Successfully sent overdue reminder for bill {bill.id}")
-                        except Exception as e:
-                            logger.error(f"[OVERDUE WHATSAPP ERROR] Failed to send overdue reminder for bill {bill.id}: {str(e)}")
-                    else:
-                        logger.debug(f"[OVERDUE WHATSAPP] WhatsApp disabled for bill {bill.id}")
-                else:
+                if days_overdue > 7:
                     logger.debug(f"[OVERDUE SKIP] Bill {bill.id} is {days_overdue} days overdue (>7 days, skipping)")
+                    continue
+                
+                if not bill.enable_whatsapp:
+                    logger.debug(f"[OVERDUE WHATSAPP] WhatsApp disabled for bill {bill.id}")
+                    continue
+                
+                bill_data = {
+                    'name': bill.name,
+                    'amount': bill.amount,
+                    'due_date': bill.due_date.strftime('%Y-%m-%d'),
+                    'days_overdue': days_overdue
+                }
+                alternates = failover_alternates(user.reminder_settings, ['whatsapp'])
+                overdue_reminders.append((user, bill, bill_data, alternates))
+            
+            messages = generate_reminder_messages(
+                [(user.name, bill_data) for user, _, bill_data, _ in overdue_reminders]
+            )
+            
+            sms_batch = SmsBatch()
+            for (user, bill, bill_data, alternates), message in zip(overdue_reminders, messages):
+                logger.info(f"[OVERDUE ALERT] Sending overdue alert for bill {bill.id} ({bill_data['days_overdue']} days overdue)")
+                outcome = dispatch_reminder(user.phone_number, message, ['whatsapp'], alternates, sms_batch=sms_batch)
+                if outcome['delivered']:
+                    logger.info(f"[OVERDUE ALERT] Sent overdue reminder for bill {bill.id} via {', '.join(outcome['delivered'])}")
+                elif outcome['pending']:
+                    logger.info(f"[OVERDUE ALERT] Overdue reminder for bill {bill.id} pending on {', '.join(outcome['pending'])}")
+                else:
+                    logger.error(f"[OVERDUE ALERT ERROR] Failed to send overdue reminder for bill {bill.id}: {outcome['failed']}")
+            
+            if len(sms_batch):
+                sms_batch.flush()
             
             logger.info(f"[OVERDUE CHECK] Completed overdue bills check at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+    def pregenerate_next_day_content():
+        """This job runs off-peak to prepare tomorrow's reminder messages."""
+        with app.app_context():
+            logger.info("[PREGEN JOB] Starting next-day reminder content generation")
+            try:
+                pregenerate_reminder_content()
+            except Exception as e:
+                logger.error(f"[PREGEN JOB ERROR] Failed to pre-generate reminder content: {str(e)}", exc_info=True)
+
+    def prune_sync_tombstones():
+        """Drop delete markers and idempotency keys past their retention"""
+        with app.app_context():
+            try:
+                prune_tombstones()
+            except Exception as e:
+                logger.error(f"[TOMBSTONE PRUNE ERROR] Failed to prune tombstones: {str(e)}", exc_info=True)
+                db.session.rollback()
+            try:
+                prune_idempotency_keys()
+            except Exception as e:
+                logger.error(f"[IDEMPOTENCY PRUNE ERROR] Failed to prune idempotency keys: {str(e)}", exc_info=True)
+                db.session.rollback()
+
+    def forecast_portfolio():
+        """Nightly incremental run of the portfolio cash-flow forecast"""
+        with app.app_context():
+            try:
+                run_forecast()
+            except Exception as e:
+                logger.error(f"[FORECAST JOB ERROR] Portfolio forecast failed: {str(e)}", exc_info=True)
+                db.session.rollback()
+
+    def calculate_late_fees():
+        """Daily late fee and additional interest run over overdue loans"""
+        with app.app_context():
+            try:
+                scheduled_fee_calculation()
+            except Exception as e:
+                logger.error(f"[FEE JOB ERROR] Late fee calculation failed: {str(e)}", exc_info=True)
+                db.session.rollback()
+
     # Add the jobs to the scheduler
     logger.info("[SCHEDULER CONFIG] Adding reminder_checker job (runs every minute)")
     scheduler.add_job(
@@ -319,6 +427,16 @@ def start_scheduler(app):
         replace_existing=True
     )
     
+    logger.info(f"[SCHEDULER CONFIG] Adding content_pregenerator job (runs daily at {Config.PREGENERATION_HOUR:02d}:{Config.PREGENERATION_MINUTE:02d})")
+    scheduler.add_job(
+        func=pregenerate_next_day_content,
+        trigger="cron",
+        hour=Config.PREGENERATION_HOUR,
+        minute=Config.PREGENERATION_MINUTE,
+        id='content_pregenerator',
+        replace_existing=True
+    )
+    
     logger.info("[SCHEDULER CONFIG] Adding overdue_checker job (runs daily at 10:00)")
     scheduler.add_job(
         func=check_overdue_bills,
@@ -329,6 +447,36 @@ def start_scheduler(app):
         replace_existing=True
     )
     
+    logger.info("[SCHEDULER CONFIG] Adding tombstone_pruner job (runs daily at 00:30)")
+    scheduler.add_job(
+        func=prune_sync_tombstones,
+        trigger="cron",
+        hour=0,
+        minute=30,
+        id='tombstone_pruner',
+        replace_existing=True
+    )
+    
+    logger.info(f"[SCHEDULER CONFIG] Adding portfolio_forecaster job (runs daily at {Config.FORECAST_HOUR:02d}:00)")
+    scheduler.add_job(
+        func=forecast_portfolio,
+        trigger="cron",
+        hour=Config.FORECAST_HOUR,
+        minute=0,
+        id='portfolio_forecaster',
+        replace_existing=True
+    )
+    
+    logger.info(f"[SCHEDULER CONFIG] Adding fee_calculator job (runs daily at {Config.FEE_CALCULATION_HOUR:02d}:00)")
+    scheduler.add_job(
+        func=calculate_late_fees,
+        trigger="cron",
+        hour=Config.FEE_CALCULATION_HOUR,
+        minute=0,
+        id='fee_calculator',
+        replace_existing=True
+    )
+    
     # Start the scheduler if it's not already running
     if not scheduler.running:
         logger.info("[SCHEDULER START] Starting the scheduler")
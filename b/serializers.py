@@ -0,0 +1,113 @@
+# serializers.py - Column-projected serialisers and JSON encoding for the list endpoints
+#
+# The list endpoints select only the columns below as row tuples instead of
+# loading ORM instances, and map each row with a fixed positional serialiser.
+# The column list and the function that reads it are kept next to each other
+# so they change together. orjson is used for encoding when it is installed.
+
+import json
+
+from flask import Response
+
+from models import Bill, LoanDetails, Payment
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BILL_COLUMNS = (
+    Bill.id, Bill.name, Bill.account_name, Bill.amount, Bill.due_date, Bill.category, Bill.frequency,
+    Bill.is_paid, Bill.notes, Bill.created_at, Bill.updated_at,
+    Bill.enable_whatsapp, Bill.enable_call, Bill.enable_sms, Bill.enable_local_notification,
+)
+
+# Bill.id keeps its name so keyset_page can read (due_date, id) from the row
+LOAN_COLUMNS = (
+    Bill.id, Bill.name, Bill.due_date,
+    LoanDetails.id.label('loan_id'), LoanDetails.total_amount, LoanDetails.monthly_payment,
+    LoanDetails.total_installments, LoanDetails.installments_paid, LoanDetails.interest_rate_percent,
+    LoanDetails.is_active, LoanDetails.updated_at,
+    LoanDetails.total_late_fees, LoanDetails.current_late_fee, LoanDetails.additional_interest,
+)
+
+PAYMENT_COLUMNS = (
+    Payment.id, Payment.bill_id, Payment.amount, Payment.payment_date, Payment.payment_method,
+    Payment.notes, Payment.updated_at,
+)
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def bill_row(row):
+    (bill_id, name, account_name, amount, due_date, category, frequency, is_paid, notes, created_at,
+     updated_at, enable_whatsapp, enable_call, enable_sms, enable_local_notification) = row
+    return {
+        'id': bill_id,
+        'name': name,
+        'account_name': account_name,
+        'amount': amount,
+        'due_date': due_date.isoformat(),
+        'category': category,
+        'frequency': frequency,
+        'is_paid': is_paid,
+        'notes': notes,
+        'created_at': _iso(created_at),
+        'updated_at': _iso(updated_at),
+        'reminder_preferences': {
+            'enable_whatsapp': enable_whatsapp,
+            'enable_call': enable_call,
+            'enable_sms': enable_sms,
+            'enable_local_notification': enable_local_notification
+        }
+    }
+
+
+def loan_row(row):
+    (bill_id, bill_name, _due_date, loan_id, total_amount, monthly_payment, total_installments,
+     installments_paid, interest_rate_percent, is_active, updated_at,
+     total_late_fees, current_late_fee, additional_interest) = row
+    installments_paid = installments_paid or 0
+    return {
+        'id': loan_id,
+        'bill_id': bill_id,
+        'bill_name': bill_name,
+        'total_amount': total_amount,
+        'monthly_payment': monthly_payment,
+        'total_installments': total_installments,
+        'installments_paid': installments_paid,
+        'interest_rate_percent': interest_rate_percent,
+        # Same as LoanDetails.amount_remaining
+        'amount_remaining': total_amount - (installments_paid * monthly_payment),
+        # Carried-over and current late fees plus additional interest, as of the last fee calculation
+        'late_fees_due': round((total_late_fees or 0) + (current_late_fee or 0) + (additional_interest or 0), 2),
+        'is_active': is_active,
+        'updated_at': _iso(updated_at)
+    }
+
+
+def payment_row(row):
+    payment_id, bill_id, amount, payment_date, payment_method, notes, updated_at = row
+    return {
+        'id': payment_id,
+        'bill_id': bill_id,
+        'amount': amount,
+        'payment_date': _iso(payment_date),
+        'payment_method': payment_method,
+        'notes': notes,
+        'updated_at': _iso(updated_at)
+    }
+
+
+def dumps(data):
+    """Compact JSON as bytes; orjson when installed, the standard library otherwise"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def json_response(data, status=200):
+    """Drop-in for jsonify() on large list bodies"""
+    return Response(dumps(data), status=status, mimetype='application/json')
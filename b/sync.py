@@ -0,0 +1,200 @@
+# sync.py - Change tracking for client refreshes: list ETags, change sets and tombstones
+
+from datetime import datetime, timedelta
+import hashlib
+import logging
+
+from sqlalchemy import func, and_, or_
+
+from config import Config
+from models import db, Bill, LoanDetails, Payment, Tombstone
+from pagination import encode_token, decode_token
+from serializers import BILL_COLUMNS, LOAN_COLUMNS, PAYMENT_COLUMNS
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SINCE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def collection_etag(scope, user_id, args):
+    """
+    Weak ETag for a list endpoint, computed from the row count and newest
+    updated_at of the user's rows instead of the response body, so an
+    unchanged list is answered with one aggregate query. `args` (the query
+    string) is part of the tag because every page and filter is its own
+    representation.
+    """
+    if scope == 'loans':
+        count, bill_updated, loan_updated = db.session.query(
+            func.count(Bill.id), func.max(Bill.updated_at), func.max(LoanDetails.updated_at)
+        ).join(LoanDetails, Bill.id == LoanDetails.bill_id).filter(Bill.user_id == user_id).one()
+        newest = max(filter(None, (bill_updated, loan_updated)), default=None)
+    else:
+        count, newest = db.session.query(
+            func.count(Bill.id), func.max(Bill.updated_at)
+        ).filter(Bill.user_id == user_id).one()
+
+    # A delete followed by an insert can leave count and newest unchanged; the tombstone cannot
+    last_delete = db.session.query(func.max(Tombstone.deleted_at)).filter(Tombstone.user_id == user_id).scalar()
+
+    key = f"{scope}|{user_id}|{count}|{newest}|{last_delete}|{sorted(args.items(multi=True))}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def not_modified(request, etag):
+    return request.if_none_match.contains_weak(etag)
+
+
+def record_tombstones(user_id, bill):
+    """Tombstones for a bill and the loan details and payments deleted with it"""
+    tombstones = [Tombstone(user_id=user_id, entity='bill', entity_id=bill.id)]
+    if bill.loan_details:
+        tombstones.append(Tombstone(user_id=user_id, entity='loan', entity_id=bill.loan_details.id))
+    tombstones.extend(Tombstone(user_id=user_id, entity='payment', entity_id=payment.id) for payment in bill.payments)
+    db.session.add_all(tombstones)
+    return tombstones
+
+
+def format_since(moment):
+    return moment.strftime(SINCE_FORMAT)
+
+
+def parse_since(value):
+    """Datetime from a `since` token; raises ValueError when it is malformed"""
+    try:
+        return datetime.strptime(value, SINCE_FORMAT)
+    except ValueError:
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+        except ValueError:
+            raise ValueError('since must be the token returned by the previous call')
+
+
+def _change_queries(user_id, floor):
+    """(name, query, updated_at column, id column, id field of the row) for each kind of row, in paging order"""
+    bills = db.session.query(*BILL_COLUMNS).filter(Bill.user_id == user_id)
+    loans = db.session.query(*LOAN_COLUMNS).join(LoanDetails, Bill.id == LoanDetails.bill_id).filter(
+        Bill.user_id == user_id
+    )
+    payments = db.session.query(*PAYMENT_COLUMNS).join(Bill, Payment.bill_id == Bill.id).filter(
+        Bill.user_id == user_id
+    )
+    if floor is not None:
+        bills = bills.filter(Bill.updated_at > floor)
+        loans = loans.filter((Bill.updated_at > floor) | (LoanDetails.updated_at > floor))
+        payments = payments.filter(Payment.updated_at > floor)
+    return [
+        ('bills', bills, Bill.updated_at, Bill.id, 'id'),
+        ('loans', loans, LoanDetails.updated_at, LoanDetails.id, 'loan_id'),
+        ('payments', payments, Payment.updated_at, Payment.id, 'id'),
+    ]
+
+
+def _encode_sync_cursor(now, floor, reset, phase, updated_at=None, row_id=None):
+    return encode_token({
+        'n': format_since(now),
+        'f': format_since(floor) if floor else None,
+        'r': reset,
+        'p': phase,
+        'u': format_since(updated_at) if updated_at else None,
+        'i': row_id,
+    })
+
+
+def decode_sync_cursor(cursor):
+    """The walk state carried by a changes cursor; raises ValueError when it is malformed"""
+    try:
+        payload = decode_token(cursor)
+        return {
+            'now': parse_since(payload['n']),
+            'floor': parse_since(payload['f']) if payload['f'] else None,
+            'reset': bool(payload['r']),
+            'phase': int(payload['p']),
+            'after': (parse_since(payload['u']), str(payload['i'])) if payload['u'] else None,
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def changes_since(user_id, since=None, limit=None, cursor=None):
+    """
+    Bill, loan and payment rows (see serializers.py) of the user changed
+    after `since`, and the ids deleted after it. Without `since`, or when
+    `since` is older than the tombstone retention, everything is returned
+    with `reset` set so the client replaces its copy instead of merging.
+
+    The change set is paged: at most `limit` rows per call, bills first, then
+    loans, then payments, each ordered by (updated_at, id). While rows remain,
+    `next_cursor` is set and `since` is None; the client passes the cursor
+    back (it carries the original `since`) until the last page, which has the
+    deletions and the `since` token for the next refresh. A row updated
+    mid-walk moves to the end of its order, so it is returned again rather
+    than skipped.
+
+    The `since` token is taken before the first page and moved back by
+    SYNC_OVERLAP_SECONDS, so a row written by a transaction that committed
+    while this one was reading is returned again next time rather than
+    missed. Clients apply changes by id, so repeats are harmless.
+    """
+    limit = limit or Config.PAGE_SIZE_DEFAULT
+    if cursor:
+        now, floor, reset = cursor['now'], cursor['floor'], cursor['reset']
+        phase, after = cursor['phase'], cursor['after']
+    else:
+        now = datetime.utcnow()
+        reset = since is None or since < now - timedelta(days=Config.SYNC_TOMBSTONE_DAYS)
+        floor = None if reset else since - timedelta(seconds=Config.SYNC_OVERLAP_SECONDS)
+        phase, after = 0, None
+
+    result = {'since': None, 'reset': reset, 'bills': [], 'loans': [], 'payments': [], 'deleted': {}, 'next_cursor': None}
+    queries = _change_queries(user_id, floor)
+    remaining = limit
+    for index in range(phase, len(queries)):
+        name, query, updated_column, id_column, id_field = queries[index]
+        if not remaining:
+            result['next_cursor'] = _encode_sync_cursor(now, floor, reset, index)
+            break
+        if after:
+            updated_at, row_id = after
+            query = query.filter(or_(
+                updated_column > updated_at,
+                and_(updated_column == updated_at, id_column > row_id)
+            ))
+            after = None
+        rows = query.order_by(updated_column, id_column).limit(remaining + 1).all()
+        if len(rows) > remaining:
+            rows = rows[:remaining]
+            last = rows[-1]
+            result[name] = rows
+            result['next_cursor'] = _encode_sync_cursor(now, floor, reset, index, last.updated_at, getattr(last, id_field))
+            break
+        result[name] = rows
+        remaining -= len(rows)
+
+    if result['next_cursor'] is None:
+        deleted = {'bill': [], 'loan': [], 'payment': []}
+        if floor is not None:
+            tombstones = Tombstone.query.filter(Tombstone.user_id == user_id, Tombstone.deleted_at > floor)
+            for tombstone in tombstones:
+                deleted.setdefault(tombstone.entity, []).append(tombstone.entity_id)
+        result['deleted'] = deleted
+        result['since'] = format_since(now)
+
+    logger.debug(
+        f"[SYNC] User {user_id} since {floor}: {len(result['bills'])} bills, {len(result['loans'])} loans, "
+        f"{len(result['payments'])} payments, {sum(len(ids) for ids in result['deleted'].values())} deletions "
+        f"(more: {result['next_cursor'] is not None})"
+    )
+    return result
+
+
+def prune_tombstones():
+    """Drop tombstones past the retention; clients that old get a full reset instead"""
+    cutoff = datetime.utcnow() - timedelta(days=Config.SYNC_TOMBSTONE_DAYS)
+    removed = Tombstone.query.filter(Tombstone.deleted_at < cutoff).delete()
+    db.session.commit()
+    if removed:
+        logger.info(f"[SYNC] Pruned {removed} tombstones older than {cutoff}")
+    return removed
@@ -0,0 +1,86 @@
+# telephony_audio.py - Narrowband copies of generated audio for phone calls
+
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import logging
+
+from config import Config
+from audio_cache import audio_cache
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# ffmpeg codec arguments per telephony format; all are mono WAV at TELEPHONY_SAMPLE_RATE
+TELEPHONY_FORMATS = {
+    'ulaw': ['-c:a', 'pcm_mulaw'],
+    'alaw': ['-c:a', 'pcm_alaw'],
+    'pcm': ['-c:a', 'pcm_s16le'],
+}
+
+
+def ffmpeg_path():
+    """Full path of the ffmpeg binary, or None when it is not installed"""
+    return shutil.which(Config.FFMPEG_BINARY)
+
+
+def _telephony_key(source_bytes, fmt):
+    digest = hashlib.sha256(source_bytes).hexdigest()
+    return hashlib.sha256(f"{digest}:{fmt}:{Config.TELEPHONY_SAMPLE_RATE}".encode('utf-8')).hexdigest()
+
+
+def to_telephony(audio_path, fmt=None):
+    """
+    Transcode generated audio to 8 kHz mono telephony format once and keep
+    the result in the audio cache beside the original. Later calls for the
+    same audio are served from the cache.
+    Returns {"success", "audio_path", "format", "cached"}.
+    """
+    fmt = fmt or Config.TELEPHONY_AUDIO_FORMAT
+    if fmt not in TELEPHONY_FORMATS:
+        return {"success": False, "error": f"Unknown telephony format: {fmt}"}
+
+    with open(audio_path, 'rb') as f:
+        key = _telephony_key(f.read(), fmt)
+    cached_path = audio_cache.get(key)
+    if cached_path:
+        logger.debug(f"[TELEPHONY AUDIO] Cache hit for {os.path.basename(audio_path)} ({fmt})")
+        return {"success": True, "audio_path": cached_path, "format": fmt, "cached": True}
+
+    binary = ffmpeg_path()
+    if not binary:
+        logger.warning(f"[TELEPHONY AUDIO] {Config.FFMPEG_BINARY} not found, cannot transcode to {fmt}")
+        return {"success": False, "error": "ffmpeg is not installed"}
+
+    fd, temp_path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    command = [
+        binary, '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', audio_path,
+        '-ac', '1', '-ar', str(Config.TELEPHONY_SAMPLE_RATE),
+        *TELEPHONY_FORMATS[fmt],
+        '-f', 'wav', temp_path
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True, timeout=Config.TELEPHONY_TRANSCODE_TIMEOUT)
+        with open(temp_path, 'rb') as f:
+            telephony_path = audio_cache.put(key, f.read(), suffix='.wav')
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.decode('utf-8', 'replace').strip()
+        logger.error(f"[TELEPHONY AUDIO ERROR] ffmpeg failed for {audio_path}: {error}")
+        return {"success": False, "error": error or str(e)}
+    except Exception as e:
+        logger.error(f"[TELEPHONY AUDIO ERROR] Transcoding {audio_path} failed: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    logger.info(
+        f"[TELEPHONY AUDIO] Transcoded to {fmt}: {os.path.getsize(audio_path)} -> "
+        f"{os.path.getsize(telephony_path)} bytes"
+    )
+    return {"success": True, "audio_path": telephony_path, "format": fmt, "cached": False}
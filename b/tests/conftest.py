@@ -0,0 +1,82 @@
+# Shared fixtures: an app on a throwaway sqlite database with every outbound
+# provider pointed at the local fakes in fake_providers.py. Config reads the
+# environment at import time, so the environment is set before any app import.
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_providers import start_fake_providers, fake_provider_env
+
+_workdir = tempfile.mkdtemp()
+_servers = start_fake_providers()
+os.environ.update(fake_provider_env(_servers))
+os.environ.update(
+    DATABASE_URL='sqlite:///' + os.path.join(_workdir, 'test.db'),
+    AUDIO_CACHE_DIR=os.path.join(_workdir, 'audio'),
+    REMINDER_AUDIO_DIR=os.path.join(_workdir, 'reminder_audio'),
+    FORECAST_DIR=os.path.join(_workdir, 'forecast'),
+    ELEVENLABS_API_KEY='test', GOOGLE_API_KEY='test', BLAND_AI_API_KEY='test', SMS_API_KEY='test',
+    TWILIO_ACCOUNT_SID='ACtest', TWILIO_AUTH_TOKEN='test', PROVIDER_WARM_ON_START='false',
+    JWT_SECRET_KEY='test-jwt-secret-key-of-at-least-32-bytes',
+)
+
+from flask_jwt_extended import create_access_token
+
+from app import create_app
+from models import db, Bill, User
+
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app()
+
+
+@pytest.fixture
+def fake_servers():
+    return _servers
+
+
+@pytest.fixture(autouse=True)
+def database(app):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    user = User(email='test@example.com', name='Test User', phone_number='9876543210', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(user):
+    return {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+
+@pytest.fixture
+def create_loan(client, auth_headers):
+    """Create a loan bill through POST /api/bills; returns (bill_id, loan_id)"""
+    def create(name='Loan', due_date='2026-01-05T00:00:00', **loan_details):
+        loan_details = {'total_amount': 12000, 'monthly_payment': 1000, 'total_installments': 12, **loan_details}
+        response = client.post('/api/bills', headers=auth_headers, json={
+            'name': name, 'amount': loan_details['monthly_payment'], 'due_date': due_date,
+            'account_name': 'Bank', 'loan_details': loan_details
+        })
+        assert response.status_code == 201, response.get_json()
+        bill_id = response.get_json()['id']
+        return bill_id, db.session.get(Bill, bill_id).loan_details.id
+    return create
@@ -0,0 +1,25 @@
+from audio_cache import AudioCache
+from elevenlabs_service import stream_voice_audio
+
+
+def test_open_file_survives_eviction(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=150)
+    cache.put('a' * 64, b'x' * 100)
+
+    cached = cache.open('a' * 64)
+    # Storing another file pushes the total over the limit and evicts the first one
+    cache.put('b' * 64, b'y' * 100)
+    assert cache.get('a' * 64) is None
+
+    with cached:
+        assert cached.read() == b'x' * 100
+    assert cache.open('a' * 64) is None
+    assert cache.stats['evictions'] == 1
+
+
+def test_stream_replays_the_cached_copy(fake_servers):
+    requests = fake_servers['elevenlabs'].stats['requests']
+    streamed = b''.join(stream_voice_audio('Cached stream test'))
+    replayed = b''.join(stream_voice_audio('Cached stream test'))
+    assert replayed == streamed and streamed
+    assert fake_servers['elevenlabs'].stats['requests'] == requests + 1
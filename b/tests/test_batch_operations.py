@@ -0,0 +1,113 @@
+from flask_jwt_extended import create_access_token
+
+from config import Config
+from models import db, Bill, LoanDetails, Payment, User
+
+
+def _bill(name='Loan', **overrides):
+    return {
+        'name': name, 'amount': 1000, 'due_date': '2026-01-05T00:00:00', 'account_name': 'Bank',
+        'loan_details': {'total_amount': 12000, 'monthly_payment': 1000, 'total_installments': 12},
+        **overrides
+    }
+
+
+def _other_user_headers():
+    other = User(email='other@example.com', name='Other User', phone_number='9876500000', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+    return {'Authorization': f'Bearer {create_access_token(identity=str(other.id))}'}
+
+
+def _fail_on(monkeypatch, table):
+    """Make the next executemany into `table` fail, as a constraint violation would"""
+    execute = db.session.execute
+
+    def failing(statement, *args, **kwargs):
+        if getattr(statement, 'table', None) is not None and statement.table.name == table:
+            raise RuntimeError(f'insert into {table} failed')
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db.session, 'execute', failing)
+
+
+def test_size_limits(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(Config, 'BATCH_MAX_ITEMS', 2)
+    requests = [
+        ('post', '/api/bills/batch', 'bills', _bill()),
+        ('put', '/api/bills/batch', 'bills', {'id': 'x', 'name': 'n'}),
+        ('post', '/api/bills/batch/pay', 'bill_ids', 'x'),
+        ('post', '/api/loans/batch/pay', 'payments', {'loan_id': 'x'}),
+    ]
+    for method, url, key, item in requests:
+        for body in ({key: [item] * 3}, {key: []}, {key: item}, {}):
+            response = getattr(client, method)(url, headers=auth_headers, json=body)
+            assert response.status_code == 400, (url, body)
+
+
+def test_create_reports_invalid_items_and_creates_the_rest(client, auth_headers):
+    response = client.post('/api/bills/batch', headers=auth_headers, json={'bills': [
+        _bill('Good'),
+        {'name': 'No loan details', 'amount': 1000, 'due_date': '2026-01-05', 'account_name': 'Bank'},
+        _bill('Bad amount', amount='lots'),
+        _bill('Bad date', due_date='soon'),
+        _bill('Also good'),
+    ]})
+
+    body = response.get_json()
+    assert response.status_code == 200 and not body['success']
+    assert body['summary'] == {'created': 2, 'error': 3}
+    assert [r['index'] for r in body['results'] if r['status'] == 'error'] == [1, 2, 3]
+    assert body['results'][2]['error'] == 'amount must be a number'
+    assert sorted(bill.name for bill in Bill.query.all()) == ['Also good', 'Good']
+    assert LoanDetails.query.count() == 2
+
+
+def test_update_and_pay_only_touch_the_users_own_bills(client, auth_headers, create_loan):
+    own_id, own_loan = create_loan(name='Own')
+    other_headers = _other_user_headers()
+    other_id = client.post('/api/bills', headers=other_headers, json=_bill('Theirs')).get_json()['id']
+    other_loan = db.session.get(Bill, other_id).loan_details.id
+
+    response = client.put('/api/bills/batch', headers=auth_headers, json={'bills': [
+        {'id': own_id, 'name': 'Renamed'}, {'id': other_id, 'name': 'Hijacked'}, {'id': own_id}
+    ]})
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['updated', 'error', 'error']
+    assert results[1]['error'] == 'Bill not found' and results[2]['error'] == 'No fields to update'
+
+    response = client.post('/api/bills/batch/pay', headers=auth_headers, json={'bill_ids': [own_id, other_id, own_id]})
+    assert [r['status'] for r in response.get_json()['results']] == ['paid', 'error', 'already_paid']
+
+    response = client.post('/api/loans/batch/pay', headers=auth_headers, json={
+        'payments': [{'loan_id': own_loan}, {'loan_id': other_loan}]
+    })
+    assert [r['status'] for r in response.get_json()['results']] == ['paid', 'error']
+
+    db.session.expire_all()
+    other = db.session.get(Bill, other_id)
+    assert other.name == 'Theirs' and not other.is_paid
+    assert other.loan_details.installments_paid == 0
+    assert Payment.query.filter_by(bill_id=other_id).count() == 0
+    assert db.session.get(Bill, own_id).name == 'Renamed'
+
+
+def test_create_rolls_back_when_a_statement_fails(client, auth_headers, monkeypatch):
+    _fail_on(monkeypatch, 'loan_details')
+
+    response = client.post('/api/bills/batch', headers=auth_headers, json={'bills': [_bill('A'), _bill('B')]})
+    assert response.status_code == 500
+    monkeypatch.undo()
+    assert Bill.query.count() == 0
+
+
+def test_pay_rolls_back_when_the_payments_cannot_be_written(client, auth_headers, create_loan, monkeypatch):
+    bill_id, _ = create_loan()
+    _fail_on(monkeypatch, 'payment')
+
+    response = client.post('/api/bills/batch/pay', headers=auth_headers, json={'bill_ids': [bill_id]})
+    assert response.status_code == 500
+    monkeypatch.undo()
+    db.session.expire_all()
+    assert not db.session.get(Bill, bill_id).is_paid
+    assert Payment.query.count() == 0
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from fee_calculation_service import compute_fees, scheduled_fee_calculation
+from models import db, FeeCalculation, LoanDetails
+
+
+def _days_ago(days):
+    return (datetime.utcnow() - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+
+
+def test_compute_fees():
+    # Inside the grace period nothing is charged
+    assert compute_fees(1000, 5000, 3, 'percentage', 5, 3, 12)['late_fee'] == 0
+    assert compute_fees(1000, 5000, 4, 'percentage', 5, 3, 0) == {
+        'days_overdue': 4, 'days_past_grace': 1, 'late_fee': 50.0, 'additional_interest': 0.0
+    }
+    assert compute_fees(1000, 5000, 4, 'fixed', 75, 3, 0)['late_fee'] == 75
+    # 5000 * 36.5% / 365 per day, for the 10 days past the grace period
+    assert compute_fees(1000, 5000, 13, 'fixed', 0, 3, 36.5)['additional_interest'] == 50.0
+
+
+def test_scheduled_run_charges_an_installment_once(create_loan):
+    _, loan_id = create_loan(due_date=_days_ago(10), late_fee_type='fixed', late_fee_amount=50, late_fee_grace_days=3)
+
+    assert scheduled_fee_calculation()['calculated'] == 1
+    assert scheduled_fee_calculation()['calculated'] == 0
+
+    loan = db.session.get(LoanDetails, loan_id)
+    assert loan.current_late_fee == 50 and loan.total_late_fees == 0
+    assert FeeCalculation.query.filter_by(loan_id=loan_id).count() == 1
+
+
+def test_no_fee_inside_the_grace_period(create_loan):
+    _, loan_id = create_loan(due_date=_days_ago(2), late_fee_amount=5, late_fee_grace_days=3)
+
+    assert scheduled_fee_calculation()['calculated'] == 0
+    loan = db.session.get(LoanDetails, loan_id)
+    assert loan.fee_due_date is None and loan.current_late_fee == 0
+
+
+def test_fees_carry_over_when_the_installment_moves_on(client, auth_headers, create_loan):
+    bill_id, loan_id = create_loan(due_date=_days_ago(40), late_fee_amount=5, late_fee_grace_days=3)
+    scheduled_fee_calculation()
+    assert db.session.get(LoanDetails, loan_id).current_late_fee == 50
+
+    # The next installment is overdue too: the first one's fee is carried over and the new one charged once
+    response = client.put(f'/api/bills/{bill_id}', headers=auth_headers, json={'due_date': _days_ago(10)})
+    assert response.status_code == 200
+    scheduled_fee_calculation()
+    scheduled_fee_calculation()
+
+    db.session.expire_all()
+    loan = db.session.get(LoanDetails, loan_id)
+    assert loan.total_late_fees == 50 and loan.current_late_fee == 50
+    assert FeeCalculation.query.filter_by(loan_id=loan_id).count() == 2
+
+    # Paying it carries the second fee over and clears the current one
+    assert client.post(f'/api/bills/{bill_id}/pay', headers=auth_headers).status_code == 200
+    scheduled_fee_calculation()
+    db.session.expire_all()
+    loan = db.session.get(LoanDetails, loan_id)
+    assert loan.total_late_fees == 100 and loan.current_late_fee == 0 and loan.fee_due_date is None
+    assert scheduled_fee_calculation()['candidates'] == 0
@@ -0,0 +1,74 @@
+from config import Config
+
+
+def _walk(client, auth_headers, url, **params):
+    """Every page of `url`; returns (items, number of pages)"""
+    items, pages = [], 0
+    while True:
+        response = client.get(url, headers=auth_headers, query_string=params)
+        assert response.status_code == 200, response.get_json()
+        items += response.get_json()
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return items, pages
+        params['cursor'] = cursor
+
+
+def test_cursor_round_trip(client, auth_headers, create_loan):
+    due_dates = ['2026-03-05', '2026-01-05', '2026-05-05', '2026-02-05', '2026-04-05']
+    for day in due_dates:
+        create_loan(name=day, due_date=f'{day}T00:00:00')
+
+    bills, pages = _walk(client, auth_headers, '/api/bills', limit=2)
+    assert pages == 3
+    assert [bill['name'] for bill in bills] == sorted(due_dates)
+
+    loans, pages = _walk(client, auth_headers, '/api/loans', limit=2)
+    assert pages == 3
+    assert [loan['bill_name'] for loan in loans] == sorted(due_dates)
+
+
+def test_ties_on_due_date_are_broken_by_id(client, auth_headers, create_loan):
+    bill_ids = [create_loan(name=f'Loan {i}')[0] for i in range(5)]
+
+    bills, pages = _walk(client, auth_headers, '/api/bills', limit=2)
+    assert pages == 3
+    assert [bill['id'] for bill in bills] == sorted(bill_ids)
+
+
+def test_default_page_size_leaves_the_rest_behind_the_cursor(client, auth_headers, create_loan, monkeypatch):
+    monkeypatch.setattr(Config, 'PAGE_SIZE_DEFAULT', 2)
+    for i in range(3):
+        create_loan(name=f'Loan {i}')
+
+    response = client.get('/api/bills', headers=auth_headers)
+    assert len(response.get_json()) == 2
+    assert response.headers.get('X-Next-Cursor')
+
+
+def test_filters(client, auth_headers, create_loan):
+    paid_id, _ = create_loan(name='January', due_date='2026-01-05T00:00:00')
+    create_loan(name='February', due_date='2026-02-05T00:00:00')
+    create_loan(name='March', due_date='2026-03-05T00:00:00')
+    assert client.post(f'/api/bills/{paid_id}/pay', headers=auth_headers).status_code == 200
+
+    def names(**params):
+        response = client.get('/api/bills', headers=auth_headers, query_string=params)
+        assert response.status_code == 200, response.get_json()
+        return [bill['name'] for bill in response.get_json()]
+
+    assert names(is_paid='true') == ['January']
+    assert names(is_paid='false') == ['February', 'March']
+    # due_to is inclusive of the whole day
+    assert names(due_from='2026-02-01', due_to='2026-03-05') == ['February', 'March']
+    assert names(category='loan', is_paid='no', limit=1) == ['February']
+    assert names(frequency='weekly') == []
+
+
+def test_bad_parameters_are_rejected(client, auth_headers):
+    for params in ({'cursor': 'not-a-cursor'}, {'cursor': 'e30'}, {'limit': 'ten'}, {'limit': 0},
+                   {'is_paid': 'maybe'}, {'due_from': '05/01/2026'}):
+        for url in ('/api/bills', '/api/loans'):
+            response = client.get(url, headers=auth_headers, query_string=params)
+            assert response.status_code == 400, (url, params)
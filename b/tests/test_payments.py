@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import threading
+
+from sqlalchemy import update
+
+import batch_operations
+from models import db, LoanDetails, Payment
+
+
+def _concurrently(app, auth_headers, url, requests=8):
+    """POST `url` from `requests` threads released together; returns the responses"""
+    barrier = threading.Barrier(requests)
+
+    def post(_):
+        client = app.test_client()
+        barrier.wait()
+        return client.post(url, headers=auth_headers)
+
+    with ThreadPoolExecutor(requests) as pool:
+        return list(pool.map(post, range(requests)))
+
+
+def test_concurrent_mark_paid_records_one_payment(app, auth_headers, create_loan):
+    bill_id, _ = create_loan()
+
+    responses = _concurrently(app, auth_headers, f'/api/bills/{bill_id}/pay')
+
+    assert [r.status_code for r in responses] == [200] * 8
+    assert sum(1 for r in responses if 'payment_id' in r.get_json()) == 1
+    assert Payment.query.filter_by(bill_id=bill_id).count() == 1
+
+
+def test_concurrent_installments_stop_at_loan_total(app, auth_headers, create_loan):
+    _, loan_id = create_loan(total_amount=3000, monthly_payment=1000, total_installments=3)
+
+    responses = _concurrently(app, auth_headers, f'/api/loans/{loan_id}/pay')
+
+    assert sorted(r.status_code for r in responses) == [200] * 3 + [400] * 5
+    db.session.expire_all()
+    assert db.session.get(LoanDetails, loan_id).installments_paid == 3
+
+
+def test_batch_pay_rejected_at_write_time(client, auth_headers, create_loan, monkeypatch):
+    _, loan_id = create_loan(total_amount=3000, monthly_payment=1000, total_installments=3)
+    transaction = batch_operations._transaction
+
+    @contextmanager
+    def paid_in_between(operation, user_id):
+        # Another request pays the loan off after the batch read it
+        db.session.execute(update(LoanDetails).where(LoanDetails.id == loan_id).values(installments_paid=3))
+        with transaction(operation, user_id):
+            yield
+
+    monkeypatch.setattr(batch_operations, '_transaction', paid_in_between)
+    response = client.post('/api/loans/batch/pay', headers=auth_headers, json={
+        'payments': [{'loan_id': loan_id, 'installments': 1}, {'loan_id': loan_id, 'installments': 1}]
+    })
+
+    results = response.get_json()['results']
+    assert [r['status'] for r in results] == ['error', 'error']
+    assert all(set(r) == {'index', 'id', 'status', 'error'} for r in results)
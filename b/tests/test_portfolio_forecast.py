@@ -0,0 +1,106 @@
+from datetime import date
+
+import numpy as np
+
+from amortization import amortization_schedule
+from portfolio_forecast import compute_forecast, run_forecast, _to_columns
+
+TODAY = date(2026, 10, 19)
+START = 2026 * 12 + 9
+
+
+def _state(due_month, principal, payment, installments, paid, annual_rate, active):
+    n = len(principal)
+    return {
+        'id': np.array([str(i).encode() for i in range(n)], dtype='S36'),
+        'due_month': np.asarray(due_month, dtype=np.int32),
+        'principal': np.asarray(principal, dtype=np.float64),
+        'payment': np.asarray(payment, dtype=np.float64),
+        'installments': np.asarray(installments, dtype=np.int32),
+        'paid': np.asarray(paid, dtype=np.int32),
+        'rate': np.asarray(annual_rate, dtype=np.float64) / 1200.0,
+        'active': np.asarray(active, dtype=bool),
+    }
+
+
+def _brute_force(state, horizon):
+    """Loan-by-loan forecast from amortization_schedule()"""
+    inflow, balance = np.zeros(horizon), np.zeros(horizon)
+    outstanding = arrears = 0.0
+    for i in np.flatnonzero(state['active']):
+        schedule = amortization_schedule(
+            state['principal'][i], state['payment'][i], state['installments'][i], state['rate'][i] * 1200
+        )
+        periods, paid = schedule['balance'].size, int(state['paid'][i])
+        if paid >= periods:
+            continue
+        offset, left = int(state['due_month'][i]) - START, periods - paid
+        outstanding += schedule['balance'][paid - 1] if paid else state['principal'][i]
+        for k in range(paid, periods):
+            month = offset + k - paid
+            if month < 0:
+                arrears += schedule['payment'][k]
+            elif month < horizon:
+                inflow[month] += schedule['payment'][k]
+        for month in range(horizon):
+            done = paid + min(max(month - offset + 1, 0), left)
+            balance[month] += schedule['balance'][done - 1] if done else state['principal'][i]
+    return inflow, balance, outstanding, arrears
+
+
+def test_matches_loan_by_loan_schedules():
+    rng = np.random.default_rng(1)
+    n, horizon = 2000, 60
+    installments = rng.integers(1, 120, n)
+    principal = rng.uniform(1000, 100000, n).round(2)
+    annual_rate = rng.choice([0, 0, 5, 8.5, 12, 9.99, 24], n)
+    rate = annual_rate / 1200
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity = np.where(rate > 0, principal * rate / (1 - (1 + rate) ** -installments.astype(float)),
+                           principal / installments)
+    # Some installments too small to clear the loan in time, some clearing it early
+    payment = (annuity * rng.choice([1, 1, 1, 0.8, 1.5, 3], n)).round(2)
+    state = _state(START + rng.integers(-5, 80, n), principal, payment, installments,
+                   rng.integers(0, 130, n), annual_rate, rng.random(n) > 0.1)
+
+    forecast = compute_forecast(state, horizon, TODAY)
+    inflow, balance, outstanding, arrears = _brute_force(state, horizon)
+
+    assert np.allclose(forecast['inflow'], inflow, atol=1e-6)
+    assert np.allclose(forecast['balance'], balance, atol=1e-6)
+    assert np.isclose(float(forecast['outstanding']), outstanding, atol=1e-6)
+    assert np.isclose(float(forecast['arrears']), arrears, atol=1e-6)
+
+
+def test_arrears_include_the_adjusted_last_installment():
+    # 1000 over 3 installments of 300: the last one carries the remaining 400, and all three are overdue
+    state = _state([START - 3], [1000], [300], [3], [0], [0], [True])
+    forecast = compute_forecast(state, 12, TODAY)
+    assert float(forecast['arrears']) == 1000.0
+    assert not forecast['inflow'].any()
+
+
+def test_empty_book():
+    forecast = compute_forecast(_to_columns([]), 12, TODAY)
+    assert int(forecast['loans']) == 0
+    assert forecast['balance'].dtype == np.float64
+    assert not forecast['inflow'].any() and not forecast['balance'].any()
+
+
+def test_only_inactive_or_fully_paid_loans():
+    state = _state([START, START], [1200, 1200], [100, 100], [12, 12], [12, 3], [0, 10], [True, False])
+    forecast = compute_forecast(state, 12, TODAY)
+    assert int(forecast['loans']) == 0
+    assert float(forecast['outstanding']) == 0.0
+    assert not forecast['maturing_amount'].any()
+
+
+def test_run_forecast_after_the_last_loan_is_deleted(client, auth_headers, create_loan):
+    bill_id, _ = create_loan()
+    forecast, stats = run_forecast(full=True, horizon=12)
+    assert int(forecast['loans']) == 1 and stats['mode'] == 'full'
+
+    assert client.delete(f'/api/bills/{bill_id}', headers=auth_headers).status_code == 204
+    forecast, stats = run_forecast(horizon=12)
+    assert stats == {'mode': 'incremental', 'read': 0, 'deleted': 1}
+    assert int(forecast['loans']) == 0
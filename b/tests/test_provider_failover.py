@@ -0,0 +1,57 @@
+import pytest
+
+import provider_health
+from circuit_breaker import CLOSED, OPEN
+from config import Config
+from models import ReminderSettings
+from provider_health import get_breaker, is_provider_failure
+from reminder_dispatcher import dispatch_reminder, failover_alternates
+from reminder_service import send_sms_reminder
+
+SETTINGS = ReminderSettings(whatsapp_enabled=True, sms_enabled=True, call_enabled=False)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(provider_health, '_breakers', {})
+    monkeypatch.setattr(Config, 'PROVIDER_FAILURE_THRESHOLD', 2)
+
+
+def test_provider_failures():
+    assert is_provider_failure({'status_code': 429})
+    assert is_provider_failure({'status_code': 503})
+    # Transport errors carry no status
+    assert is_provider_failure({'error': 'Connection refused'})
+    assert not is_provider_failure({'status_code': 400})
+
+
+def test_rate_limits_open_the_breaker_and_reminders_fail_over(fake_servers, monkeypatch):
+    twilio = fake_servers['twilio']
+    monkeypatch.setattr(twilio, 'rate_limit_rate', 1.0)
+
+    for _ in range(Config.PROVIDER_FAILURE_THRESHOLD):
+        outcome = dispatch_reminder('9876543210', 'Pay', ['whatsapp'], failover_alternates(SETTINGS, ['whatsapp']))
+        assert outcome['delivered'] == ['sms'] and outcome['failover'] == 'sms'
+        assert 'whatsapp' in outcome['failed']
+    assert get_breaker('twilio').state == OPEN
+
+    # While open, WhatsApp fails fast without a request and is no longer offered as an alternate
+    requests = twilio.stats['requests']
+    outcome = dispatch_reminder('9876543210', 'Pay', ['whatsapp'], ['sms'])
+    assert outcome['delivered'] == ['sms'] and twilio.stats['requests'] == requests
+    assert failover_alternates(SETTINGS, ['sms']) == []
+
+
+def test_server_errors_open_the_breaker(fake_servers, monkeypatch):
+    monkeypatch.setattr(fake_servers['sms'], 'error_rate', 1.0)
+
+    for _ in range(Config.PROVIDER_FAILURE_THRESHOLD):
+        outcome = dispatch_reminder('9876543210', 'Pay', ['sms'], failover_alternates(SETTINGS, ['sms']))
+        assert outcome['delivered'] == ['whatsapp'] and outcome['failover'] == 'whatsapp'
+    assert get_breaker('sms').state == OPEN
+
+
+def test_rejected_requests_leave_the_breaker_closed():
+    for _ in range(Config.PROVIDER_FAILURE_THRESHOLD + 1):
+        assert not send_sms_reminder('12345', 'Pay')['success']
+    assert get_breaker('sms').state == CLOSED
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+import json
+
+from flask_jwt_extended import create_access_token
+
+import scheduler
+from models import db, Bill, ReminderJob, ReminderSettings, User
+from reminder_service import send_sms_reminders
+
+NOW = datetime(2026, 10, 19, 9, 0)
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return NOW
+
+
+def _scheduler_job(app, monkeypatch, job_id):
+    """A scheduler job function, registered without starting the scheduler thread"""
+    monkeypatch.setattr(scheduler.scheduler, 'start', lambda *args, **kwargs: None)
+    monkeypatch.setattr(scheduler, 'datetime', _FrozenDatetime)
+    scheduler.start_scheduler(app)
+    return scheduler.scheduler.get_job(job_id).func
+
+
+def _sms_user(email, phone_number):
+    """A user reminded by SMS only at 09:00, with one bill due tomorrow"""
+    user = User(email=email, name=email.split('@')[0], phone_number=phone_number, password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(ReminderSettings(user_id=user.id, whatsapp_enabled=False, call_enabled=False,
+                                    sms_enabled=True, preferred_time='09:00'))
+    bill = Bill(user_id=user.id, account_name='Bank', name='Loan', amount=1000, due_date=NOW + timedelta(days=1),
+                category='loan', frequency='monthly', enable_whatsapp=False, enable_sms=True)
+    db.session.add(bill)
+    db.session.commit()
+    return bill.id
+
+
+def _reminded(bill_id):
+    db.session.expire_all()
+    notes = db.session.get(Bill, bill_id).notes
+    return bool(notes) and 'last_reminder_date' in json.loads(notes)
+
+
+def test_bulk_sms_failures_map_back_to_their_messages():
+    results = send_sms_reminders([('9876543210', 'a'), ('12345', 'b'), ('+91 98765 43211', 'c')])
+    assert [result['success'] for result in results] == [True, False, True]
+    assert results[1]['error'] == 'Invalid number'
+
+
+def test_only_bills_whose_sms_was_accepted_are_marked_reminded(app, monkeypatch):
+    accepted = _sms_user('valid@example.com', '9876543210')
+    rejected = _sms_user('invalid@example.com', '12345')
+
+    _scheduler_job(app, monkeypatch, 'reminder_checker')()
+
+    assert _reminded(accepted)
+    assert not _reminded(rejected)
+
+
+def test_queued_test_reminder_is_long_polled_to_completion(client, auth_headers):
+    response = client.post('/api/reminders/test', headers=auth_headers, json={'type': 'sms'})
+    assert response.status_code == 202
+    queued = response.get_json()
+    assert queued['status'] == 'queued' and response.headers['Location'] == queued['status_url']
+
+    job = client.get(queued['status_url'], headers=auth_headers, query_string={'wait': 5}).get_json()
+    assert job['id'] == queued['job_id'] and job['kind'] == 'test'
+    assert job['status'] == 'succeeded' and job['result_status'] == 200
+    assert job['result']['status'] == 'success' and job['finished_at']
+    # The state is in the database, so any worker can answer
+    assert db.session.get(ReminderJob, job['id']).status == 'succeeded'
+
+    other = User(email='other@example.com', name='Other', phone_number='9876500000', password_hash='x')
+    db.session.add(other)
+    db.session.commit()
+    other_headers = {'Authorization': f'Bearer {create_access_token(identity=str(other.id))}'}
+    assert client.get(queued['status_url'], headers=other_headers).status_code == 404
+
+
+def test_expired_jobs_are_purged_and_lost_jobs_reported_failed(client, auth_headers, user):
+    long_ago = datetime.utcnow() - timedelta(hours=2)
+    # Finished long ago, and one whose worker went away before it finished
+    finished = ReminderJob(user_id=user.id, kind='test', status='succeeded', result='{}', result_status=200,
+                           created_at=long_ago, finished_at=long_ago)
+    lost = ReminderJob(user_id=user.id, kind='send', status='running', created_at=long_ago)
+    db.session.add_all([finished, lost])
+    db.session.commit()
+    finished_id, lost_id = finished.id, lost.id
+
+    response = client.post('/api/reminders/test', headers=auth_headers, json={'type': 'sms'})
+    assert response.status_code == 202
+    client.get(response.get_json()['status_url'], headers=auth_headers, query_string={'wait': 5})
+
+    assert client.get(f'/api/reminders/jobs/{finished_id}', headers=auth_headers).status_code == 404
+    job = client.get(f'/api/reminders/jobs/{lost_id}', headers=auth_headers).get_json()
+    assert job['status'] == 'failed' and job['result_status'] == 500
+    assert job['result']['status'] == 'error'
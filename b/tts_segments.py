@@ -0,0 +1,274 @@
+# tts_segments.py - Compose voice reminders from cached TTS segments
+#
+# A voice reminder is mostly fixed wording; only the name, bill, amount and
+# date change. The fixed phrases and a small vocabulary for numbers (Indian
+# numbering) and dates are synthesised once per voice and kept in the audio
+# cache, so a reminder only pays for its name and bill title the first time
+# they are seen. Segments are joined at MP3 frame level, without re-encoding.
+#
+# Pre-render the fixed phrases and vocabularies for a voice with:
+#
+#   python tts_segments.py --prerender [--voice-id <id>]
+
+from datetime import datetime
+import argparse
+import logging
+
+from config import Config
+from audio_cache import audio_cache, audio_cache_key
+from elevenlabs_service import generate_voice_audio, DEFAULT_VOICE_ID, VOICE_SETTINGS
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+ONES = [
+    'zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine',
+    'ten', 'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen',
+    'seventeen', 'eighteen', 'nineteen'
+]
+TENS = ['', '', 'twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety']
+ORDINALS = [
+    '', 'first', 'second', 'third', 'fourth', 'fifth', 'sixth', 'seventh', 'eighth', 'ninth',
+    'tenth', 'eleventh', 'twelfth', 'thirteenth', 'fourteenth', 'fifteenth', 'sixteenth',
+    'seventeenth', 'eighteenth', 'nineteenth', 'twentieth', 'twenty first', 'twenty second',
+    'twenty third', 'twenty fourth', 'twenty fifth', 'twenty sixth', 'twenty seventh',
+    'twenty eighth', 'twenty ninth', 'thirtieth', 'thirty first'
+]
+MONTHS = [
+    'January', 'February', 'March', 'April', 'May', 'June', 'July',
+    'August', 'September', 'October', 'November', 'December'
+]
+# Indian numbering: crore = 10^7, lakh = 10^5
+SCALES = [(10 ** 7, 'crore'), (10 ** 5, 'lakh'), (1000, 'thousand'), (100, 'hundred')]
+
+FIXED_PHRASES = [
+    'Hey', 'Good morning.', 'Good afternoon.', 'Good evening.',
+    'This is a reminder that your', 'payment of', 'rupees', 'and', 'paise',
+    'is due on the', 'was due on the', 'and is now overdue. Please pay as soon as possible.',
+    'Hope you have a nice day.'
+]
+
+
+def words_below_hundred(n):
+    """0-99 as one vocabulary entry, e.g. 'forty two'"""
+    if n < 20:
+        return ONES[n]
+    tens, ones = divmod(n, 10)
+    return TENS[tens] + (f' {ONES[ones]}' if ones else '')
+
+
+def number_segments(n):
+    """Vocabulary entries that speak `n` in Indian numbering"""
+    n = int(n)
+    if n < 100:
+        return [words_below_hundred(n)]
+    segments = []
+    for value, scale in SCALES:
+        count, n = divmod(n, value)
+        if count:
+            # Anything above 99 crore is spoken as '<n> crore' recursively
+            segments.extend(number_segments(count) if count >= 100 else [words_below_hundred(count)])
+            segments.append(scale)
+    if n:
+        segments.append(words_below_hundred(n))
+    return segments
+
+
+def amount_segments(amount):
+    """Entries for a rupee amount, with paise when there are any"""
+    paise_total = int(round(float(amount) * 100))
+    rupees, paise = divmod(paise_total, 100)
+    segments = number_segments(rupees) + ['rupees']
+    if paise:
+        segments += ['and'] + number_segments(paise) + ['paise']
+    return segments
+
+
+def date_segments(due_date):
+    """'the twenty fifth' + 'of March' style entries for a YYYY-MM-DD date"""
+    if isinstance(due_date, str):
+        due_date = datetime.strptime(due_date[:10], '%Y-%m-%d')
+    return [ORDINALS[due_date.day], f'of {MONTHS[due_date.month - 1]}.']
+
+
+def vocabulary():
+    """Every fixed phrase and vocabulary entry, for pre-rendering"""
+    entries = list(FIXED_PHRASES)
+    entries += [words_below_hundred(n) for n in range(100)]
+    entries += [scale for _, scale in SCALES]
+    entries += ORDINALS[1:]
+    entries += [f'of {month}.' for month in MONTHS]
+    return entries
+
+
+def reminder_segments(name, bill_data):
+    """Split a voice reminder into the segments it is spoken from"""
+    greeting = bill_data.get('greeting') or 'Good morning'
+    segments = ['Hey', f'{name},', f'{greeting}.', 'This is a reminder that your', f"{bill_data.get('name')}", 'payment of']
+    segments += amount_segments(bill_data.get('amount') or 0)
+    if bill_data.get('days_overdue') is not None:
+        segments += ['was due on the'] + date_segments(bill_data['due_date'])
+        segments += ['and is now overdue. Please pay as soon as possible.']
+    else:
+        segments += ['is due on the'] + date_segments(bill_data['due_date'])
+        segments += ['Hope you have a nice day.']
+    return segments
+
+
+def _ordinal_suffix(day):
+    if 11 <= day % 100 <= 13:
+        return 'th'
+    return {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+
+
+def reminder_text(name, bill_data):
+    """
+    The written form of reminder_segments(): same words, with the amount
+    and date in digits. Used as the message whenever the call plays the
+    composed audio, so every channel says the same thing.
+    """
+    greeting = bill_data.get('greeting') or 'Good morning'
+    rupees, paise = divmod(int(round(float(bill_data.get('amount') or 0) * 100)), 100)
+    amount = f'₹{rupees}.{paise:02d}' if paise else f'₹{rupees}'
+    due_date = bill_data['due_date']
+    if isinstance(due_date, str):
+        due_date = datetime.strptime(due_date[:10], '%Y-%m-%d')
+    day = f'{due_date.day}{_ordinal_suffix(due_date.day)} of {MONTHS[due_date.month - 1]}'
+
+    text = f"Hey {name}, {greeting}. This is a reminder that your {bill_data.get('name')} payment of {amount} "
+    if bill_data.get('days_overdue') is not None:
+        return text + f'was due on the {day} and is now overdue. Please pay as soon as possible.'
+    return text + f'is due on the {day}. Hope you have a nice day.'
+
+
+# --- MP3 frame handling ----------------------------------------------------
+
+_MPEG1_L3_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0]
+_MPEG2_L3_BITRATES = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0]
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _frame_length(header):
+    """Byte length of the Layer III frame starting with `header`, or 0 if it is not one"""
+    if header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return 0
+    version = (header[1] >> 3) & 0x03
+    layer = (header[1] >> 1) & 0x03
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer != 1 or sample_rate_index == 3:
+        return 0
+    bitrate = (_MPEG1_L3_BITRATES if version == 3 else _MPEG2_L3_BITRATES)[bitrate_index] * 1000
+    if not bitrate:
+        return 0
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    return (144 if version == 3 else 72) * bitrate // sample_rate + padding
+
+
+def mp3_audio_frames(data):
+    """
+    The audio frames of an MP3 file: ID3v2/ID3v1 tags and the Xing/Info
+    header frame are dropped, so files of the same format can be joined.
+    Only the first frame can be a Xing/Info frame; later frames are audio
+    even if those bytes happen to occur in them.
+    """
+    start = 0
+    if data[:3] == b'ID3' and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        start = 10 + size
+    end = len(data) - 128 if data[-128:-125] == b'TAG' else len(data)
+
+    frames = []
+    position = start
+    first = True
+    while position + 4 <= end:
+        length = _frame_length(data[position:position + 4])
+        if not length:
+            position += 1
+            continue
+        frame = data[position:position + length]
+        header_frame = first and (b'Xing' in frame[:64] or b'Info' in frame[:64])
+        if not header_frame:
+            frames.append(frame)
+        first = False
+        position += length
+    return b''.join(frames)
+
+
+# --- Composition -----------------------------------------------------------
+
+def _segment_audio(text, voice_id, usage):
+    result = generate_voice_audio(text, voice_id)
+    if not result.get('success'):
+        raise RuntimeError(f"Segment '{text}' failed: {result.get('error')}")
+    if not result.get('cached'):
+        usage['synthesised_chars'] += len(text)
+    with open(result['audio_path'], 'rb') as f:
+        return mp3_audio_frames(f.read())
+
+
+def compose_reminder_audio(name, bill_data, voice_id=None):
+    """
+    Voice reminder audio for `bill_data`, assembled from cached segments.
+    Returns {"success", "audio_path", "segments", "synthesised_chars"}.
+    """
+    voice_id = voice_id or DEFAULT_VOICE_ID
+    segments = reminder_segments(name, bill_data)
+    composed_key = audio_cache_key(' | '.join(segments), voice_id, Config.ELEVENLABS_MODEL_ID, VOICE_SETTINGS, 'mp3-segments')
+
+    cached_path = audio_cache.get(composed_key)
+    if cached_path:
+        logger.info(f"[TTS SEGMENTS] Composed audio cache hit: {cached_path}")
+        return {"success": True, "audio_path": cached_path, "segments": len(segments), "synthesised_chars": 0}
+
+    usage = {'synthesised_chars': 0}
+    try:
+        audio = b''.join(_segment_audio(text, voice_id, usage) for text in segments)
+    except Exception as e:
+        logger.error(f"[TTS SEGMENTS ERROR] Failed to compose reminder audio: {str(e)}", exc_info=True)
+        return {"success": False, "error": str(e)}
+
+    audio_path = audio_cache.put(composed_key, audio)
+    full_chars = sum(len(text) for text in segments)
+    logger.info(
+        f"[TTS SEGMENTS] Composed {len(segments)} segments ({len(audio)} bytes); "
+        f"synthesised {usage['synthesised_chars']} of {full_chars} characters"
+    )
+    return {"success": True, "audio_path": audio_path, "segments": len(segments), **usage}
+
+
+def prerender_vocabulary(voice_id=None):
+    """Synthesise every fixed phrase and vocabulary entry for a voice ahead of time"""
+    voice_id = voice_id or DEFAULT_VOICE_ID
+    usage = {'synthesised_chars': 0}
+    entries = vocabulary()
+    failed = 0
+    for text in entries:
+        try:
+            _segment_audio(text, voice_id, usage)
+        except Exception as e:
+            failed += 1
+            logger.error(f"[TTS SEGMENTS ERROR] {str(e)}")
+    logger.info(
+        f"[TTS SEGMENTS] Pre-rendered {len(entries) - failed} of {len(entries)} entries for voice {voice_id} "
+        f"({usage['synthesised_chars']} characters synthesised)"
+    )
+    return {"entries": len(entries), "failed": failed, **usage}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Voice reminder segment cache')
+    parser.add_argument('--prerender', action='store_true', help='Synthesise the fixed phrases and vocabularies')
+    parser.add_argument('--voice-id', default=None)
+    args = parser.parse_args()
+
+    if args.prerender:
+        print(prerender_vocabulary(args.voice_id))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
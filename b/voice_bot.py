@@ -0,0 +1,103 @@
+# voice_bot.py - HTTP endpoints for conversational EMI-collection voice sessions
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models import User, Bill
+from voice_bot_service import voice_bot, build_call_context
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+voice_bot_bp = Blueprint('voice_bot', __name__)
+
+# Caller audio is read from the request body in chunks of this size
+AUDIO_READ_BYTES = 4096
+
+
+def _request_audio_chunks():
+    """Caller utterance: JSON {"text": ...} for text turns, otherwise the raw audio body"""
+    if request.is_json:
+        text = (request.get_json(silent=True) or {}).get('text') or ''
+        return [text.encode('utf-8')]
+    return iter(lambda: request.stream.read(AUDIO_READ_BYTES), b'')
+
+
+@voice_bot_bp.route('/sessions', methods=['POST'])
+@jwt_required()
+def create_session():
+    """Start a voice session about one of the user's bills"""
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    bill_id = data.get('bill_id')
+    logger.info(f"[VOICE BOT] Session request from user {user_id} for bill {bill_id}")
+
+    user = User.query.get(user_id)
+    bill = Bill.query.filter_by(id=bill_id, user_id=user_id).first() if bill_id else None
+    if not user or not bill:
+        logger.warning(f"[VOICE BOT] Bill {bill_id} not found for user {user_id}")
+        return jsonify({'message': 'Bill not found'}), 404
+
+    session = voice_bot.create_session(user_id, build_call_context(user, bill))
+    return jsonify({
+        'session_id': session.id,
+        'greeting': session.history[0][1],
+        'context': session.context
+    }), 201
+
+
+@voice_bot_bp.route('/sessions/<session_id>/turns', methods=['POST'])
+@jwt_required()
+def run_turn(session_id):
+    """
+    One dialogue turn. Send the caller's audio as the request body (or JSON
+    {"text": ...}); the reply streams back as audio/mpeg while it is being
+    generated. Per-turn metrics are available from GET /sessions/<id>.
+    """
+    user_id = get_jwt_identity()
+    session = voice_bot.get_session(session_id, user_id)
+    if not session:
+        return jsonify({'message': 'Session not found'}), 404
+
+    try:
+        audio = voice_bot.run_turn(session, _request_audio_chunks())
+        first_chunk = next(audio, b'')
+    except Exception as e:
+        logger.error(f"[VOICE BOT ERROR] Turn failed in session {session_id}: {str(e)}", exc_info=True)
+        return jsonify({'message': 'Voice turn failed', 'error': str(e)}), 502
+
+    def generate():
+        yield first_chunk
+        yield from audio
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='audio/mpeg',
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no', 'X-Turn': str(len(session.turns) + 1)}
+    )
+
+
+@voice_bot_bp.route('/sessions/<session_id>', methods=['GET'])
+@jwt_required()
+def get_session(session_id):
+    """Transcript and per-stage latency of every turn so far"""
+    session = voice_bot.get_session(session_id, get_jwt_identity())
+    if not session:
+        return jsonify({'message': 'Session not found'}), 404
+    return jsonify(session.to_dict()), 200
+
+
+@voice_bot_bp.route('/sessions/<session_id>', methods=['DELETE'])
+@jwt_required()
+def end_session(session_id):
+    if not voice_bot.end_session(session_id, get_jwt_identity()):
+        return jsonify({'message': 'Session not found'}), 404
+    return jsonify({'message': 'Session ended'}), 200
+
+
+@voice_bot_bp.route('/metrics', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    """p50/p95 latency per stage over recent turns"""
+    return jsonify(voice_bot.metrics_summary()), 200
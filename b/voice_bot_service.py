@@ -0,0 +1,482 @@
+# voice_bot_service.py - Streaming STT -> LLM -> TTS pipeline for EMI collection calls
+#
+# One dialogue turn flows through three stages that overlap:
+#
+#   caller audio --> STT (partials while audio arrives, final at end of speech)
+#                --> LLM (streams tokens on a worker thread, cut into sentences)
+#                --> TTS (synthesises each sentence as soon as it is complete)
+#
+# so the first sentence is being spoken while the LLM is still writing the
+# rest. Every stage has a local stand-in (VOICE_BOT_STT/LLM/TTS = 'local'),
+# which makes the whole loop runnable without provider keys. Turn latency is
+# measured from end of speech to the first audio chunk; when the LLM cannot
+# produce a first sentence inside its share of VOICE_BOT_TURN_BUDGET_MS, the
+# turn falls back to the rule-based reply so the caller is never left waiting.
+
+from collections import deque
+from datetime import datetime
+import json
+import queue
+import re
+import threading
+import time
+import uuid
+import logging
+
+from config import Config
+from provider_transport import BASE_URLS, get_session, get_timeout, get_elevenlabs_client
+from elevenlabs_service import stream_voice_audio
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+_SENTENCE_END = re.compile(r'[.!?](\s|$)')
+
+
+def _elapsed_ms(start):
+    return round((time.monotonic() - start) * 1000, 1)
+
+
+def _money(value):
+    return f"₹{value:,.0f}" if value is not None else None
+
+
+# --- Call context ----------------------------------------------------------
+
+def build_call_context(user, bill):
+    """What the bot knows about the borrower's bill and loan"""
+    today = datetime.now().date()
+    context = {
+        'customer_name': user.name,
+        'bill_name': bill.name,
+        'amount_due': bill.amount,
+        'due_date': bill.due_date.strftime('%Y-%m-%d'),
+        'days_until_due': (bill.due_date.date() - today).days,
+        'is_paid': bill.is_paid,
+    }
+    loan = bill.loan_details
+    if loan is not None:
+        context.update({
+            'monthly_payment': loan.monthly_payment,
+            'installments_paid': loan.installments_paid or 0,
+            'installments_left': max(0, loan.total_installments - (loan.installments_paid or 0)),
+            'amount_outstanding': loan.amount_remaining,
+            'interest_rate_percent': loan.interest_rate_percent,
+        })
+    return context
+
+
+def opening_line(context):
+    """First thing the bot says when the call connects"""
+    days = context['days_until_due']
+    when = 'today' if days == 0 else (f"in {days} days" if days > 0 else f"{-days} days ago")
+    verb = 'was due' if days < 0 else 'is due'
+    return (
+        f"Hello {context['customer_name']}, this is your payment assistant. "
+        f"Your {context['bill_name']} payment of {_money(context['amount_due'])} {verb} {when}. "
+        f"Would you like to pay it today?"
+    )
+
+
+# --- Speech to text --------------------------------------------------------
+
+class LocalSTT:
+    """
+    Stand-in recogniser: the 'audio' chunks carry UTF-8 text. Each chunk costs
+    `chunk_delay_ms`, the way a streaming recogniser keeps pace with speech,
+    and the final transcript is ready `finalize_ms` after the audio ends.
+    """
+
+    name = 'local'
+
+    def __init__(self, chunk_delay_ms=0, finalize_ms=40):
+        self.chunk_delay_ms = chunk_delay_ms
+        self.finalize_ms = finalize_ms
+
+    def transcribe(self, audio_chunks, on_partial=None):
+        text = ''
+        for chunk in audio_chunks:
+            if self.chunk_delay_ms:
+                time.sleep(self.chunk_delay_ms / 1000.0)
+            text += chunk.decode('utf-8', 'ignore') if isinstance(chunk, bytes) else chunk
+            if on_partial:
+                on_partial(text)
+        end_of_speech = time.monotonic()
+        time.sleep(self.finalize_ms / 1000.0)
+        return text.strip(), end_of_speech
+
+
+class ElevenLabsSTT:
+    """
+    ElevenLabs speech-to-text. The API transcribes a complete utterance, so
+    audio is buffered while it streams in and sent once speech ends.
+    """
+
+    name = 'elevenlabs'
+
+    def warm(self):
+        get_elevenlabs_client()
+
+    def transcribe(self, audio_chunks, on_partial=None):
+        audio = b''.join(audio_chunks)
+        end_of_speech = time.monotonic()
+        result = get_elevenlabs_client().speech_to_text.convert(
+            file=audio,
+            model_id=Config.VOICE_BOT_STT_MODEL
+        )
+        return (result.text or '').strip(), end_of_speech
+
+
+# --- Language model --------------------------------------------------------
+
+class LocalLLM:
+    """
+    Rule-based collections agent. Streams its reply word by word; also used
+    as the fallback when the real LLM misses the turn budget or fails.
+    """
+
+    name = 'local'
+
+    def __init__(self, token_delay_ms=0):
+        self.token_delay_ms = token_delay_ms
+
+    def reply(self, context, history, user_text):
+        text = user_text.lower()
+        amount = _money(context['amount_due'])
+        if context.get('is_paid'):
+            return "Our records show this bill is already paid. Thank you, have a nice day."
+        if any(word in text for word in ('installment', 'instalment', 'emi left', 'remaining', 'outstanding')):
+            if 'installments_left' in context:
+                return (
+                    f"You have {context['installments_left']} installments left, "
+                    f"and {_money(context['amount_outstanding'])} outstanding on the loan."
+                )
+            return f"This is a single payment of {amount}."
+        if any(word in text for word in ('how much', 'amount', 'kitna')):
+            return f"The amount due is {amount}, due on {context['due_date']}."
+        if any(word in text for word in ('when', 'date', 'due')):
+            return f"Your {context['bill_name']} payment is due on {context['due_date']}."
+        if any(word in text for word in ('later', 'tomorrow', 'next week', 'extension', 'cannot', "can't")):
+            return "I understand. Could you tell me the date by which you will be able to pay?"
+        if any(word in text for word in ('yes', 'pay', 'okay', 'sure', 'haan')):
+            return f"Thank you. Please pay {amount} before {context['due_date']} to avoid late fees."
+        return f"I'm calling about your {context['bill_name']} payment of {amount}. Would you like to pay it today?"
+
+    def stream(self, context, history, user_text):
+        for word in self.reply(context, history, user_text).split(' '):
+            if self.token_delay_ms:
+                time.sleep(self.token_delay_ms / 1000.0)
+            yield word + ' '
+
+
+class GeminiLLM:
+    """Gemini streamGenerateContent over server-sent events on the pooled session"""
+
+    name = 'gemini'
+
+    def warm(self):
+        get_session('gemini')
+
+    def _system_prompt(self, context, opening=None):
+        prompt = (
+            "You are a polite EMI collection agent on a phone call in India. "
+            "Answer in one or two short spoken sentences, no lists or symbols other than ₹. "
+            f"Facts about this customer's account (never invent others): {json.dumps(context, default=str)}"
+        )
+        if opening:
+            prompt += f" You opened the call by saying: \"{opening}\""
+        return prompt
+
+    def stream(self, context, history, user_text):
+        url = f"{BASE_URLS['gemini']}/v1beta/models/{Config.GEMINI_MODEL}:streamGenerateContent"
+        # Gemini wants the conversation to start with a user turn; the bot's
+        # opening line is part of the system prompt instead
+        opening = history[0][1] if history and history[0][0] == 'bot' else None
+        contents = [
+            {'role': 'model' if role == 'bot' else 'user', 'parts': [{'text': text}]}
+            for role, text in history[1 if opening else 0:]
+        ]
+        contents.append({'role': 'user', 'parts': [{'text': user_text}]})
+        body = {
+            'systemInstruction': {'parts': [{'text': self._system_prompt(context, opening)}]},
+            'contents': contents,
+            'generationConfig': {'maxOutputTokens': 120, 'temperature': 0.4},
+        }
+        response = get_session('gemini').post(
+            url,
+            params={'alt': 'sse'},
+            json=body,
+            headers={'x-goog-api-key': Config.GOOGLE_API_KEY or ''},
+            timeout=get_timeout(),
+            stream=True
+        )
+        with response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                event = json.loads(line[len('data:'):].strip())
+                for candidate in event.get('candidates') or []:
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            yield part['text']
+
+
+# --- Text to speech --------------------------------------------------------
+
+# One silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, 417 bytes, ~26 ms
+SILENT_MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC0]) + bytes(413)
+
+
+def silent_mp3(text):
+    """Silent MP3 whose duration roughly matches speaking `text`"""
+    return SILENT_MP3_FRAME * max(4, int(len(text) * 2.3))
+
+
+class LocalTTS:
+    """Stand-in synthesiser: silent MP3 of speaking length after `first_chunk_ms`"""
+
+    name = 'local'
+
+    def __init__(self, first_chunk_ms=60):
+        self.first_chunk_ms = first_chunk_ms
+
+    def stream(self, text):
+        time.sleep(self.first_chunk_ms / 1000.0)
+        audio = silent_mp3(text)
+        chunk_size = len(SILENT_MP3_FRAME) * 8
+        for start in range(0, len(audio), chunk_size):
+            yield audio[start:start + chunk_size]
+
+
+class ElevenLabsTTS:
+    """ElevenLabs streaming TTS; repeated sentences come from the audio cache"""
+
+    name = 'elevenlabs'
+
+    def warm(self):
+        get_elevenlabs_client()
+
+    def stream(self, text):
+        yield from stream_voice_audio(text)
+
+
+def _build_stage(kind, choice):
+    stages = {
+        'stt': {'local': LocalSTT, 'elevenlabs': ElevenLabsSTT},
+        'llm': {'local': LocalLLM, 'gemini': GeminiLLM},
+        'tts': {'local': LocalTTS, 'elevenlabs': ElevenLabsTTS},
+    }[kind]
+    if choice not in stages:
+        raise ValueError(f"Unknown {kind} stage '{choice}', expected one of {sorted(stages)}")
+    return stages[choice]()
+
+
+# --- Pipeline --------------------------------------------------------------
+
+class VoiceBotSession:
+    def __init__(self, user_id, context):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.context = context
+        self.history = [('bot', opening_line(context))]
+        self.turns = []
+        self.last_active = time.monotonic()
+
+    def to_dict(self):
+        return {
+            'session_id': self.id,
+            'context': self.context,
+            'history': [{'role': role, 'text': text} for role, text in self.history],
+            'turns': self.turns,
+        }
+
+
+class VoiceBotPipeline:
+    """Runs dialogue turns through the configured stages and keeps latency metrics"""
+
+    def __init__(self, stt, llm, tts, turn_budget_ms, llm_budget_share=0.6, session_ttl_seconds=1800):
+        self.stt = stt
+        self.llm = llm
+        self.tts = tts
+        self.fallback_llm = llm if isinstance(llm, LocalLLM) else LocalLLM()
+        self.turn_budget_ms = turn_budget_ms
+        self.llm_budget_ms = turn_budget_ms * llm_budget_share
+        self.session_ttl_seconds = session_ttl_seconds
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._recent_turns = deque(maxlen=500)
+
+    # Sessions
+
+    def create_session(self, user_id, context):
+        self._purge_idle()
+        # The greeting plays first, which hides client creation from the first turn
+        for stage in (self.stt, self.llm, self.tts):
+            if hasattr(stage, 'warm'):
+                stage.warm()
+        session = VoiceBotSession(user_id, context)
+        with self._lock:
+            self._sessions[session.id] = session
+        logger.info(f"[VOICE BOT] Session {session.id} started for user {user_id} ({context['bill_name']})")
+        return session
+
+    def get_session(self, session_id, user_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None or session.user_id != user_id:
+            return None
+        return session
+
+    def end_session(self, session_id, user_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.user_id != user_id:
+                return False
+            del self._sessions[session_id]
+        return True
+
+    def _purge_idle(self):
+        cutoff = time.monotonic() - self.session_ttl_seconds
+        with self._lock:
+            for session_id in [s.id for s in self._sessions.values() if s.last_active < cutoff]:
+                del self._sessions[session_id]
+
+    # Turns
+
+    def run_turn(self, session, audio_chunks):
+        """
+        Transcribe the caller's utterance (consuming `audio_chunks`), then
+        return a generator of reply audio chunks. The LLM runs on a worker
+        thread and hands over complete sentences, so TTS of the first sentence
+        overlaps generation of the next. Metrics are recorded when the
+        generator is exhausted.
+        """
+        session.last_active = time.monotonic()
+        turn_start = time.monotonic()
+        user_text, end_of_speech = self.stt.transcribe(audio_chunks)
+        transcript_ready = time.monotonic()
+        metrics = {
+            'turn': len(session.turns) + 1,
+            'transcript': user_text,
+            'stages': {'stt': self.stt.name, 'llm': self.llm.name, 'tts': self.tts.name},
+            'stt_ms': round((transcript_ready - end_of_speech) * 1000, 1),
+            'audio_in_ms': round((end_of_speech - turn_start) * 1000, 1),
+        }
+        logger.info(f"[VOICE BOT] Session {session.id} heard: {user_text!r} (final after {metrics['stt_ms']}ms)")
+        return self._respond(session, user_text, end_of_speech, metrics)
+
+    def _llm_sentences(self, llm, session, user_text, out, metrics, started):
+        """
+        Worker: stream tokens and push complete sentences onto `out`. Timings
+        go into `metrics`, which belongs to this run alone; the caller merges
+        it only when the run's reply is the one spoken.
+        """
+        buffer = ''
+        try:
+            for token in llm.stream(session.context, session.history, user_text):
+                if 'llm_first_token_ms' not in metrics:
+                    metrics['llm_first_token_ms'] = _elapsed_ms(started)
+                buffer += token
+                match = _SENTENCE_END.search(buffer)
+                while match:
+                    sentence, buffer = buffer[:match.end()].strip(), buffer[match.end():]
+                    if sentence:
+                        out.put(('sentence', sentence))
+                    match = _SENTENCE_END.search(buffer)
+            if buffer.strip():
+                out.put(('sentence', buffer.strip()))
+            metrics['llm_ms'] = _elapsed_ms(started)
+            out.put(('done', None))
+        except Exception as e:
+            logger.error(f"[VOICE BOT ERROR] {llm.name} LLM failed: {str(e)}", exc_info=True)
+            out.put(('error', str(e)))
+
+    def _respond(self, session, user_text, end_of_speech, metrics):
+        sentences = queue.Queue()
+        llm_metrics = {}
+        llm_started = time.monotonic()
+        worker = threading.Thread(
+            target=self._llm_sentences,
+            args=(self.llm, session, user_text, sentences, llm_metrics, llm_started),
+            name='voice-bot-llm', daemon=True
+        )
+        worker.start()
+
+        # The first sentence must arrive within the LLM's share of the budget,
+        # counted from when the transcript is ready (STT is measured separately)
+        try:
+            kind, value = sentences.get(timeout=self.llm_budget_ms / 1000.0)
+        except queue.Empty:
+            kind, value = 'error', f'no sentence within {self.llm_budget_ms:.0f}ms'
+
+        if kind != 'sentence':
+            logger.warning(f"[VOICE BOT] {self.llm.name} LLM missed the turn ({value}), using fallback reply")
+            metrics['llm_fallback'] = True
+            # The abandoned worker keeps writing to its own llm_metrics, never to this turn
+            sentences = queue.Queue()
+            llm_metrics = {}
+            fallback_started = time.monotonic()
+            self._llm_sentences(self.fallback_llm, session, user_text, sentences, llm_metrics, fallback_started)
+            kind, value = sentences.get()
+
+        reply = []
+        first_audio = True
+        tts_ms = 0.0
+        while kind == 'sentence':
+            reply.append(value)
+            tts_started = time.monotonic()
+            for chunk in self.tts.stream(value):
+                if first_audio:
+                    metrics['tts_first_chunk_ms'] = _elapsed_ms(tts_started)
+                    metrics['first_audio_ms'] = _elapsed_ms(end_of_speech)
+                    first_audio = False
+                yield chunk
+            tts_ms += (time.monotonic() - tts_started) * 1000
+            kind, value = sentences.get()
+
+        # The run that produced the reply has finished ('done' or 'error'), so its timings are final
+        metrics.update(llm_metrics)
+        reply_text = ' '.join(reply)
+        session.history.append(('user', user_text))
+        session.history.append(('bot', reply_text))
+        metrics.update({
+            'reply': reply_text,
+            'tts_ms': round(tts_ms, 1),
+            'total_ms': _elapsed_ms(end_of_speech),
+        })
+        metrics['within_budget'] = metrics.get('first_audio_ms', float('inf')) <= self.turn_budget_ms
+        if not metrics['within_budget']:
+            logger.warning(f"[VOICE BOT] Turn {metrics['turn']} over budget: {metrics.get('first_audio_ms')}ms to first audio")
+        session.turns.append(metrics)
+        self._recent_turns.append(metrics)
+        logger.info(
+            f"[VOICE BOT] Turn {metrics['turn']} done: stt {metrics['stt_ms']}ms, "
+            f"llm first token {metrics.get('llm_first_token_ms')}ms, first audio {metrics.get('first_audio_ms')}ms"
+        )
+
+    def metrics_summary(self):
+        """p50/p95 per stage over the most recent turns"""
+        turns = list(self._recent_turns)
+        summary = {'turns': len(turns), 'budget_ms': self.turn_budget_ms}
+        if not turns:
+            return summary
+        for key in ('stt_ms', 'llm_first_token_ms', 'tts_first_chunk_ms', 'first_audio_ms', 'total_ms'):
+            values = sorted(t[key] for t in turns if key in t)
+            if values:
+                summary[key] = {
+                    'p50': values[len(values) // 2],
+                    'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+                }
+        summary['within_budget_ratio'] = round(sum(1 for t in turns if t['within_budget']) / len(turns), 3)
+        summary['llm_fallbacks'] = sum(1 for t in turns if t.get('llm_fallback'))
+        return summary
+
+
+voice_bot = VoiceBotPipeline(
+    stt=_build_stage('stt', Config.VOICE_BOT_STT),
+    llm=_build_stage('llm', Config.VOICE_BOT_LLM),
+    tts=_build_stage('tts', Config.VOICE_BOT_TTS),
+    turn_budget_ms=Config.VOICE_BOT_TURN_BUDGET_MS
+)
@@ -0,0 +1,258 @@
+# voice_call_scheduler.py - Bland AI call queue with a cap on simultaneous calls
+
+from collections import deque
+import threading
+import time
+import uuid
+import logging
+
+from config import Config
+from provider_health import is_available, is_provider_failure
+from reminder_service import send_voice_call_reminder, get_voice_call_status
+
+# Configure logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class CallTicket:
+    """
+    One queued voice call; `wait()` blocks until it is placed or dropped, and
+    `on_result` (if given) is called with the final submission result.
+    """
+
+    def __init__(self, phone_number, message, on_result=None):
+        self.id = str(uuid.uuid4())
+        self.phone_number = phone_number
+        self.message = message
+        self.on_result = on_result
+        self.attempts = 0
+        self.call_id = None
+        self.placed_at = None
+        self.result = None
+        self._placed = threading.Event()
+
+    def resolve(self, result):
+        self.result = result
+        self._placed.set()
+        if self.on_result:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                logger.error(f"[VOICE QUEUE ERROR] Result handler for call {self.id} raised: {str(e)}", exc_info=True)
+
+    def wait(self, timeout=None):
+        """Submission result, or None if the call is still queued after `timeout`"""
+        self._placed.wait(timeout)
+        return self.result
+
+
+class VoiceCallScheduler:
+    """
+    Places queued calls from a single background thread so no more than
+    `max_concurrent` are live at the account at once. Free slots are filled in
+    batches of up to `batch_size` calls; live calls are polled every
+    `poll_interval` seconds and release their slot once Bland AI reports them
+    finished (or after `max_call_seconds`, in case a status never arrives).
+    Rate-limited or provider-failed submissions go back to the front of the
+    queue and are retried up to `max_attempts` times.
+    """
+
+    def __init__(self, max_concurrent, batch_size, poll_interval, max_call_seconds, max_queue, max_attempts):
+        self.max_concurrent = max_concurrent
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_call_seconds = max_call_seconds
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+
+        self._condition = threading.Condition()
+        self._pending = deque()
+        self._active = {}
+        self._submitting = 0
+        self._paused_until = 0.0
+        self._last_poll = 0.0
+        self._thread = None
+        self.stats = {'placed': 0, 'completed': 0, 'expired': 0, 'retried': 0, 'failed': 0, 'rejected': 0}
+
+    def enqueue(self, phone_number, message, on_result=None):
+        """Queue a call. Returns its CallTicket, or None when the queue is full."""
+        with self._condition:
+            if len(self._pending) >= self.max_queue:
+                self.stats['rejected'] += 1
+                logger.warning(f"[VOICE QUEUE] Queue full ({self.max_queue}), rejecting call to {phone_number}")
+                return None
+            ticket = CallTicket(phone_number, message, on_result)
+            self._pending.append(ticket)
+            self._ensure_worker()
+            self._condition.notify_all()
+        logger.info(f"[VOICE QUEUE] Queued call {ticket.id} to {phone_number} ({len(self._pending)} waiting)")
+        return ticket
+
+    def complete(self, call_id):
+        """Release the slot held by `call_id` (e.g. from a status webhook)"""
+        with self._condition:
+            ticket = self._active.pop(call_id, None)
+            if ticket is None:
+                return False
+            self.stats['completed'] += 1
+            self._condition.notify_all()
+        logger.info(f"[VOICE QUEUE] Call {call_id} finished, {len(self._active)} still live")
+        return True
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'pending': len(self._pending),
+                'active': len(self._active),
+                'max_concurrent': self.max_concurrent,
+                **self.stats
+            }
+
+    def _ensure_worker(self):
+        # Caller holds self._condition
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='voice-call-scheduler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._poll_active()
+                self._submit_batch()
+            except Exception as e:
+                logger.error(f"[VOICE QUEUE ERROR] Scheduler pass failed: {str(e)}", exc_info=True)
+
+            with self._condition:
+                if not self._pending and not self._active:
+                    self._condition.wait()
+                elif self._pending and self._free_slots() and time.monotonic() >= self._paused_until:
+                    continue
+                else:
+                    self._condition.wait(self.poll_interval)
+
+    def _free_slots(self):
+        # Caller holds self._condition
+        return max(0, self.max_concurrent - len(self._active) - self._submitting)
+
+    def _poll_active(self):
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return
+        self._last_poll = now
+
+        with self._condition:
+            live = list(self._active.items())
+
+        for call_id, ticket in live:
+            if now - ticket.placed_at > self.max_call_seconds:
+                with self._condition:
+                    if self._active.pop(call_id, None) is not None:
+                        self.stats['expired'] += 1
+                logger.warning(f"[VOICE QUEUE] Call {call_id} exceeded {self.max_call_seconds}s, releasing its slot")
+                continue
+            status = get_voice_call_status(call_id)
+            if status.get('success') and status.get('completed'):
+                self.complete(call_id)
+
+    def _submit_batch(self):
+        with self._condition:
+            if time.monotonic() < self._paused_until:
+                return
+            take = min(self._free_slots(), self.batch_size, len(self._pending))
+            batch = [self._pending.popleft() for _ in range(take)]
+            self._submitting += len(batch)
+
+        if not batch:
+            return
+        logger.info(f"[VOICE QUEUE] Placing {len(batch)} calls ({len(self._active)} live, {len(self._pending)} waiting)")
+
+        retry = []
+        try:
+            for position, ticket in enumerate(batch):
+                if retry:
+                    # The provider just pushed back; leave the rest of the batch for later
+                    retry.extend(batch[position:])
+                    break
+                ticket.attempts += 1
+                result = send_voice_call_reminder(ticket.phone_number, ticket.message)
+                if result.get('success'):
+                    self._mark_placed(ticket, result)
+                elif (result.get('circuit_open') or is_provider_failure(result)) and ticket.attempts < self.max_attempts:
+                    retry.append(ticket)
+                else:
+                    self._mark_failed(ticket, result)
+        finally:
+            with self._condition:
+                self._submitting -= len(batch)
+                if retry:
+                    self.stats['retried'] += len(retry)
+                    self._pending.extendleft(reversed(retry))
+                    self._paused_until = time.monotonic() + self.poll_interval
+                    logger.warning(f"[VOICE QUEUE] Provider pushed back, retrying {len(retry)} calls in {self.poll_interval}s")
+
+    def _mark_placed(self, ticket, result):
+        details = result.get('details') or {}
+        ticket.call_id = details.get('call_id')
+        ticket.placed_at = time.monotonic()
+        with self._condition:
+            # Without a call_id the call can never be polled, so it does not hold a slot
+            if ticket.call_id:
+                self._active[ticket.call_id] = ticket
+            self.stats['placed'] += 1
+        if ticket.call_id:
+            logger.info(f"[VOICE QUEUE] Placed call {ticket.call_id} to {ticket.phone_number}")
+        else:
+            logger.warning(f"[VOICE QUEUE] Placed call to {ticket.phone_number} without a call_id, not tracking it")
+        ticket.resolve(result)
+
+    def _mark_failed(self, ticket, result):
+        with self._condition:
+            self.stats['failed'] += 1
+        ticket.resolve(result)
+        logger.error(f"[VOICE QUEUE ERROR] Call to {ticket.phone_number} failed after {ticket.attempts} attempts: {result.get('error')}")
+
+
+voice_calls = VoiceCallScheduler(
+    max_concurrent=Config.BLAND_MAX_CONCURRENT_CALLS,
+    batch_size=Config.BLAND_CALL_BATCH_SIZE,
+    poll_interval=Config.BLAND_CALL_POLL_SECONDS,
+    max_call_seconds=Config.BLAND_CALL_MAX_SECONDS,
+    max_queue=Config.BLAND_CALL_QUEUE_MAX,
+    max_attempts=Config.BLAND_CALL_MAX_ATTEMPTS
+)
+
+
+def _pending_result(ticket):
+    return {"success": False, "pending": True, "queued": True, "ticket": ticket.id}
+
+
+def queue_voice_call(phone_number, message_body, on_result=None):
+    """
+    Reminder sender for the 'call' channel: queue the call behind the
+    concurrency cap instead of placing it inline. The call is reported as
+    pending; `on_result` receives Bland AI's answer once it is placed or has
+    failed for good. Fails immediately (so the dispatcher can fail over) when
+    Bland AI is down or the queue is full.
+    """
+    if not is_available('bland'):
+        return {"success": False, "error": "bland is unavailable (circuit open)", "circuit_open": True}
+    ticket = voice_calls.enqueue(phone_number, message_body, on_result)
+    if ticket is None:
+        return {"success": False, "error": "Voice call queue is full"}
+    return _pending_result(ticket)
+
+
+def place_voice_call(phone_number, message_body, timeout):
+    """
+    Queue a call and wait up to `timeout` seconds for it to be placed. Used by
+    the manual endpoints, which report the provider's answer when they can and
+    a pending result when the call is still queued.
+    """
+    ticket = voice_calls.enqueue(phone_number, message_body)
+    if ticket is None:
+        return {"success": False, "error": "Voice call queue is full"}
+    result = ticket.wait(timeout)
+    if result is None:
+        return _pending_result(ticket)
+    return result